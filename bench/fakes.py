@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+In-process stand-ins for the Calendar, Notion and OpenAI APIs used by the benchmarks.
+
+FakeCalendarService is handed to the scheduler in place of the googleapiclient
+service (common.clients.set_calendar_service). Notion and OpenAI are served
+over local HTTP so the real client code paths (requests, openai) are measured;
+point NOTION_API_URL and OPENAI_BASE_URL at their base_url.
+"""
+import collections
+import datetime
+import itertools
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from chatgpt.prompt_context import count_tokens
+
+
+class CallCounter:
+    """Thread-safe per-endpoint request and byte counts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = collections.Counter()
+        self.bytes = collections.Counter()
+
+    def count(self, endpoint, sent=0, received=0):
+        with self._lock:
+            self.calls[endpoint] += 1
+            if sent or received:
+                self.bytes[f"{endpoint}.sent"] += sent
+                self.bytes[f"{endpoint}.received"] += received
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.bytes.clear()
+
+
+# --- Google Calendar ---
+
+class FakeRequest:
+    def __init__(self, calendar, endpoint, fn):
+        self.calendar = calendar
+        self.endpoint = endpoint
+        self.fn = fn
+
+    def execute(self):
+        self.calendar.counter.count(self.endpoint)
+        return self.fn()
+
+
+class FakeBatch:
+    def __init__(self, calendar, callback):
+        self.calendar = calendar
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.requests.append((request_id or str(len(self.requests)), request, callback or self.callback))
+
+    def execute(self):
+        self.calendar.counter.count("calendar.batch")
+        for request_id, request, callback in self.requests:
+            self.calendar.counter.count(f"{request.endpoint}[batched]")
+            try:
+                response, error = request.fn(), None
+            except Exception as e:
+                response, error = None, e
+            if callback:
+                callback(request_id, response, error)
+
+
+class FakeEvents:
+    def __init__(self, calendar):
+        self.calendar = calendar
+
+    def list(self, calendarId, timeMin=None, timeMax=None, maxResults=250, pageToken=None, syncToken=None, **kwargs):
+        return FakeRequest(self.calendar, "calendar.events.list",
+                           lambda: self.calendar.list_events(timeMin, timeMax, maxResults, pageToken, syncToken))
+
+    def insert(self, calendarId, body, **kwargs):
+        return FakeRequest(self.calendar, "calendar.events.insert", lambda: self.calendar.put_event(dict(body)))
+
+    def patch(self, calendarId, eventId, body, **kwargs):
+        return FakeRequest(self.calendar, "calendar.events.patch",
+                           lambda: self.calendar.put_event({**self.calendar.get_event(eventId), **body, "id": eventId}))
+
+    def delete(self, calendarId, eventId, **kwargs):
+        return FakeRequest(self.calendar, "calendar.events.delete", lambda: self.calendar.delete_event(eventId))
+
+    def watch(self, calendarId, body, **kwargs):
+        return FakeRequest(self.calendar, "calendar.events.watch",
+                           lambda: {"id": body["id"], "resourceId": "fake-resource", "expiration": None})
+
+
+class FakeChannels:
+    def __init__(self, calendar):
+        self.calendar = calendar
+
+    def stop(self, body):
+        return FakeRequest(self.calendar, "calendar.channels.stop", lambda: "")
+
+
+class FakeCalendarService:
+    """
+    Duck-typed Calendar v3 service over an in-memory event dict. Supports
+    timeMin/timeMax windows, pagination, syncToken change feeds and batches.
+    """
+
+    def __init__(self, events=(), counter=None):
+        self.counter = counter or CallCounter()
+        self.events_by_id = {}
+        self.changes = {}             # event id -> sequence number of its last change
+        self._seq = itertools.count(1)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        for event in events:
+            self.put_event(dict(event))
+
+    def events(self):
+        return FakeEvents(self)
+
+    def channels(self):
+        return FakeChannels(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+    def get_event(self, event_id):
+        event = self.events_by_id.get(event_id)
+        if event is None:
+            raise KeyError(f"event {event_id} not found")
+        return event
+
+    def put_event(self, event):
+        with self._lock:
+            event["id"] = event.get("id") or f"fake{next(self._ids)}"
+            event.setdefault("status", "confirmed")
+            self.events_by_id[event["id"]] = event
+            self.changes[event["id"]] = next(self._seq)
+        return event
+
+    def delete_event(self, event_id):
+        with self._lock:
+            self.get_event(event_id)
+            del self.events_by_id[event_id]
+            self.changes[event_id] = next(self._seq)
+        return ""
+
+    def list_events(self, time_min, time_max, max_results, page_token, sync_token):
+        with self._lock:
+            if sync_token:
+                since = int(sync_token)
+                items = [self.events_by_id.get(event_id) or {"id": event_id, "status": "cancelled"}
+                         for event_id, seq in self.changes.items() if seq > since]
+            else:
+                time_min = time_min and datetime.datetime.fromisoformat(time_min)
+                time_max = time_max and datetime.datetime.fromisoformat(time_max)
+                items = [event for event in self.events_by_id.values()
+                         if (time_max is None or _event_time(event, "start") < time_max)
+                         and (time_min is None or _event_time(event, "end") > time_min)]
+                items.sort(key=lambda event: _event_time(event, "start"))
+            latest = max(self.changes.values(), default=0)
+        offset = int(page_token or 0)
+        result = {"items": items[offset:offset + max_results]}
+        if offset + max_results < len(items):
+            result["nextPageToken"] = str(offset + max_results)
+        else:
+            result["nextSyncToken"] = str(latest)
+        return result
+
+
+def _event_time(event, key):
+    value = event[key].get("dateTime")
+    if value:
+        return datetime.datetime.fromisoformat(value)
+    return datetime.datetime.fromisoformat(event[key]["date"]).replace(tzinfo=datetime.timezone.utc)
+
+
+# --- Local HTTP servers ---
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send_json(self, body, status=200):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        return len(payload)
+
+
+class _FakeServer:
+    handler = None
+
+    def __init__(self, counter=None):
+        self.counter = counter or CallCounter()
+        handler = type(self.handler.__name__, (self.handler,), {"fake": self})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_port}/v1"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _matches(page, condition):
+    if condition is None:
+        return True
+    if "and" in condition:
+        return all(_matches(page, part) for part in condition["and"])
+    if "or" in condition:
+        return any(_matches(page, part) for part in condition["or"])
+    if condition.get("timestamp") == "last_edited_time":
+        return page["last_edited_time"] >= condition["last_edited_time"]["on_or_after"]
+    if condition.get("property") == "Status":
+        status = page["properties"]["Status"]["status"]["name"]
+        rule = condition["status"]
+        if "equals" in rule:
+            return status == rule["equals"]
+        if "does_not_equal" in rule:
+            return status != rule["does_not_equal"]
+    return True
+
+
+class _NotionHandler(_JsonHandler):
+    def do_GET(self):
+        properties = {name: {"id": f"p{index}"} for index, name in enumerate(self.fake.property_names)}
+        sent = self._send_json({"object": "database", "properties": properties})
+        self.fake.counter.count("notion.databases.retrieve", received=sent)
+
+    def do_POST(self):
+        raw = self._read_body()
+        body = json.loads(raw or b"{}")
+        pages = [page for page in self.fake.pages if _matches(page, body.get("filter"))]
+        offset = int(body.get("start_cursor") or 0)
+        size = body.get("page_size", 100)
+        more = offset + size < len(pages)
+        sent = self._send_json({
+            "object": "list",
+            "results": pages[offset:offset + size],
+            "has_more": more,
+            "next_cursor": str(offset + size) if more else None,
+        })
+        self.fake.counter.count("notion.databases.query", sent=len(raw), received=sent)
+
+
+class FakeNotion(_FakeServer):
+    """Notion database over local HTTP: retrieve (property ids) and query (filters, cursors)."""
+    handler = _NotionHandler
+
+    def __init__(self, pages=(), property_names=(), counter=None):
+        self.pages = list(pages)
+        self.property_names = list(property_names)
+        super().__init__(counter)
+
+
+class _OpenAIHandler(_JsonHandler):
+    def do_POST(self):
+        raw = self._read_body()
+        body = json.loads(raw)
+        prompt = body["messages"][-1]["content"]
+        try:
+            tasks = json.loads(prompt.rsplit("Input:\n", 1)[1])
+        except (IndexError, ValueError):
+            tasks = []
+        output = json.dumps([self.fake.analyze(task) for task in tasks])
+        usage = {
+            "prompt_tokens": sum(count_tokens(message["content"]) for message in body["messages"]),
+            "completion_tokens": count_tokens(output),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if not body.get("stream"):
+            sent = self._send_json({"id": "fake", "object": "chat.completion", "model": body["model"], "choices": [
+                {"index": 0, "message": {"role": "assistant", "content": output}, "finish_reason": "stop"}],
+                "usage": usage})
+            self.fake.counter.count("openai.chat.completions", sent=len(raw), received=sent)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        sent = 0
+
+        def write_event(event):
+            nonlocal sent
+            data = f"data: {event}\n\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            sent += len(data)
+
+        for offset in range(0, len(output), self.fake.stream_chunk_chars):
+            write_event(json.dumps({"id": "fake", "object": "chat.completion.chunk", "created": 0,
+                                    "model": body["model"], "choices": [{"index": 0, "delta": {
+                                        "content": output[offset:offset + self.fake.stream_chunk_chars]},
+                                        "finish_reason": None}]}))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            write_event(json.dumps({"id": "fake", "object": "chat.completion.chunk", "created": 0,
+                                    "model": body["model"], "choices": [], "usage": usage}))
+        write_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.fake.counter.count("openai.chat.completions", sent=len(raw), received=sent)
+
+
+class FakeOpenAI(_FakeServer):
+    """Chat completions over local HTTP (plain or SSE streaming) that analyze every task in the prompt."""
+    handler = _OpenAIHandler
+    TASK_TYPES = ("research", "design", "focus")
+
+    def __init__(self, counter=None, stream_chunk_chars=64):
+        self.stream_chunk_chars = stream_chunk_chars
+        super().__init__(counter)
+
+    def analyze(self, task):
+        task_type = self.TASK_TYPES[sum(map(ord, task.get("name", ""))) % len(self.TASK_TYPES)]
+        return {
+            "name": task.get("name"),
+            "task_type": task_type,
+            "build_time": task.get("build_time") or {"research": 3, "design": 4, "focus": 1}[task_type],
+            "suggested_solution": f"Break '{task.get('name')}' into a checklist and start with the first item.",
+        }
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Scheduler benchmarks against local fakes.
+
+Runs schedule_tasks.schedule_tasks, chatgpt.ai_analyzer.analyze_tasks and the
+end-to-end schedule_tasks.main over synthetic backlogs and calendars, and
+writes one JSON record per run: wall time, peak traced memory, API calls and
+bytes per endpoint, and model tokens. Pass --baseline with an earlier report
+to flag regressions (non-zero exit status).
+
+    python bench/run_bench.py --tasks 10,100,1000,10000 --events 0,1000,5000 --out bench.json
+    python bench/run_bench.py --baseline bench.json
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "googlecal")]
+
+from bench.fakes import CallCounter, FakeCalendarService, FakeNotion, FakeOpenAI
+from bench.synthetic import calendar_events, notion_pages
+
+SCENARIOS = ("schedule", "analyze", "main")
+DEFAULT_TASKS = "10,100,1000,10000"
+DEFAULT_EVENTS = "0,1000,5000"
+# A run regresses when it is this much worse than the baseline...
+DEFAULT_TOLERANCE = 0.25
+# ...and worse by more than these absolute amounts (to ignore noise on tiny runs)
+MIN_WALL_SECONDS_DELTA = 0.25
+MIN_MEMORY_MB_DELTA = 1.0
+
+
+class Harness:
+    """Fake endpoints plus the scheduler modules, imported once the environment points at the fakes."""
+
+    def __init__(self, work_dir):
+        self.work_dir = work_dir
+        self.counter = CallCounter()
+        self.notion = FakeNotion(counter=self.counter)
+        self.openai = FakeOpenAI(counter=self.counter)
+        os.environ.update({
+            "NOTION_API_URL": self.notion.base_url,
+            "NOTION_API_KEY": "bench",
+            "OPENAI_BASE_URL": self.openai.base_url,
+            "OPENAI_API_KEY": "bench",
+            "NOTION_TASK_CACHE_PATH": os.path.join(work_dir, "task_cache.json"),
+            "ANALYSIS_CACHE_PATH": os.path.join(work_dir, "analysis_cache.json"),
+            "SCHEDULER_EVENT_STORE_PATH": os.path.join(work_dir, "event_cache.db"),
+            "SCHEDULER_TASK_EVENTS_PATH": os.path.join(work_dir, "task_events.db"),
+        })
+        from notion import notion_tasks
+        from chatgpt import ai_analyzer
+        from chatgpt.task_rules import classify_task
+        from common import clients, instrumentation, rate_limit
+        import schedule_tasks
+        # The fakes have no quotas: keep the limiters out of the timings
+        for service in rate_limit.SERVICE_LIMITS:
+            rate_limit.SERVICE_LIMITS[service] = {"rate": 1e6, "burst": 1e6, "max_concurrency": 1000}
+        self.notion_tasks = notion_tasks
+        self.ai_analyzer = ai_analyzer
+        self.classify_task = classify_task
+        self.clients = clients
+        self.instrumentation = instrumentation
+        self.schedule_tasks = schedule_tasks
+        self.calendar = None
+        self.notion.property_names = notion_tasks.TASK_PROPERTIES
+
+    def reset(self, task_count, event_count, seed):
+        """Fresh data and cold caches."""
+        for name in ("task_cache.json", "analysis_cache.json", "event_cache.db", "task_events.db"):
+            path = os.path.join(self.work_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
+        self.notion.pages = notion_pages(task_count, seed)
+        self.calendar = FakeCalendarService(calendar_events(event_count, seed=seed), self.counter)
+        self.clients.set_calendar_service(self.calendar)
+
+    def tasks(self):
+        return [self.notion_tasks.project_page(page) for page in self.notion.pages]
+
+    def run(self, scenario):
+        if scenario == "schedule":
+            tasks = []
+            for task in self.tasks():
+                # What the offline rules would estimate, so every task has a build_time to place
+                tasks.append({**task, **self.classify_task(task)})
+            self.schedule_tasks.schedule_tasks(self.schedule_tasks.sort_tasks(tasks))
+        elif scenario == "analyze":
+            now = datetime.datetime.now(tz=self.schedule_tasks.MST)
+            events = [{"summary": event["summary"], "start": event["start"]["dateTime"],
+                       "end": event["end"]["dateTime"]}
+                      for event in self.calendar.events_by_id.values()
+                      if event["start"]["dateTime"] < (now + datetime.timedelta(days=7)).isoformat()]
+            self.ai_analyzer.analyze_tasks(self.tasks(), events)
+        else:
+            self.schedule_tasks.main()
+
+
+def measure(harness, scenario, trace_memory, verbose, instrument=False):
+    """Runs one scenario and returns its wall time, memory, call and token figures."""
+    harness.counter.reset()
+    if instrument:
+        harness.instrumentation.enable()
+    tokens_before = harness.ai_analyzer.usage_log.totals()
+    if trace_memory:
+        tracemalloc.start()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if verbose else devnull):
+        started = time.perf_counter()
+        harness.run(scenario)
+        wall = time.perf_counter() - started
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    tokens_after = harness.ai_analyzer.usage_log.totals()
+    record = {
+        "wall_seconds": round(wall, 4),
+        "peak_memory_mb": round(peak, 2) if peak is not None else None,
+        "api_calls": dict(sorted(harness.counter.calls.items())),
+        "bytes": dict(sorted(harness.counter.bytes.items())),
+        "tokens": {key: tokens_after[key] - tokens_before[key] for key in tokens_after},
+    }
+    if instrument:
+        record["instrumentation"] = harness.instrumentation.summary()
+        harness.instrumentation.disable()
+    return record
+
+
+def run_matrix(args):
+    work_dir = tempfile.mkdtemp(prefix="scheduler-bench-")
+    try:
+        harness = Harness(work_dir)
+        harness.schedule_tasks.DRY_RUN = args.dry_run
+        harness.schedule_tasks.SCHEDULER_MODE = args.mode
+        results = []
+        for scenario in args.scenarios:
+            for task_count in args.tasks:
+                for event_count in args.events:
+                    harness.reset(task_count, event_count, args.seed)
+                    for cache in ("cold", "warm") if args.warm else ("cold",):
+                        record = {"scenario": scenario, "tasks": task_count, "events": event_count, "cache": cache,
+                                  "mode": args.mode, "traced": not args.no_memory, "instrumented": args.instrument}
+                        record.update(measure(harness, scenario, not args.no_memory, args.verbose, args.instrument))
+                        requests = sum(calls for endpoint, calls in record["api_calls"].items()
+                                       if not endpoint.endswith("[batched]"))
+                        print(f"⏱ {scenario:8} {task_count:>6} tasks {event_count:>5} events {cache:4}: "
+                              f"{record['wall_seconds']:.3f}s, {requests} requests, "
+                              f"{record['tokens']['input_tokens']} input tokens", file=sys.stderr)
+                        results.append(record)
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, tolerance):
+    """Returns a list of human-readable regressions of `report` against `baseline`."""
+    def key(record):
+        return (record["scenario"], record["tasks"], record["events"], record["cache"], record.get("mode"))
+
+    previous = {key(record): record for record in baseline["results"]}
+    regressions = []
+    for record in report["results"]:
+        old = previous.get(key(record))
+        if old is None:
+            continue
+        label = "{} {} tasks {} events {}".format(*key(record)[:4])
+        if (record["wall_seconds"] > old["wall_seconds"] * (1 + tolerance)
+                and record["wall_seconds"] - old["wall_seconds"] > MIN_WALL_SECONDS_DELTA):
+            regressions.append(f"{label}: wall {old['wall_seconds']}s → {record['wall_seconds']}s")
+        if (record["peak_memory_mb"] is not None and old.get("peak_memory_mb") is not None
+                and record["peak_memory_mb"] > old["peak_memory_mb"] * (1 + tolerance)
+                and record["peak_memory_mb"] - old["peak_memory_mb"] > MIN_MEMORY_MB_DELTA):
+            regressions.append(f"{label}: peak memory {old['peak_memory_mb']}MB → {record['peak_memory_mb']}MB")
+        for endpoint, calls in record["api_calls"].items():
+            if calls > old["api_calls"].get(endpoint, 0):
+                regressions.append(f"{label}: {endpoint} calls {old['api_calls'].get(endpoint, 0)} → {calls}")
+        if record["tokens"]["input_tokens"] > old["tokens"]["input_tokens"] * (1 + tolerance):
+            regressions.append(f"{label}: input tokens {old['tokens']['input_tokens']} → "
+                               f"{record['tokens']['input_tokens']}")
+    return regressions
+
+
+def _sizes(value):
+    return [int(size) for size in value.split(",") if size.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", type=lambda v: v.split(","), default=list(SCENARIOS),
+                        help=f"comma-separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--tasks", type=_sizes, default=_sizes(DEFAULT_TASKS), help="backlog sizes")
+    parser.add_argument("--events", type=_sizes, default=_sizes(DEFAULT_EVENTS), help="calendar sizes")
+    parser.add_argument("--mode", choices=("greedy", "optimize"), default="greedy", help="SCHEDULER_MODE")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--warm", action="store_true", help="repeat each run with warm caches")
+    parser.add_argument("--dry-run", action="store_true", help="keep DRY_RUN on (no calendar writes)")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (faster, untraced timings)")
+    parser.add_argument("--instrument", action="store_true", help="enable common.instrumentation and include its summary")
+    parser.add_argument("--verbose", action="store_true", help="show the scheduler's own output")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "results": run_matrix(args),
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"❌ Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("✅ No regressions against baseline.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Deterministic synthetic Notion backlogs and calendars for the benchmarks."""
+import datetime
+import random
+
+from dateutil import tz
+
+MST = tz.gettz("America/Phoenix")
+
+# Name patterns: the first three hit task_rules keywords, the rest leave the call to the model
+NAME_PATTERNS = (
+    "Investigate {topic} options",
+    "Create {topic} prototype",
+    "Fix {topic} regression",
+    "{topic} follow-up",
+    "Plan {topic} rollout",
+)
+TOPICS = ("billing", "search", "onboarding", "calendar sync", "reporting", "auth", "export", "alerts")
+PRIORITIES = ("🔹 High", "🔹 Medium", "🔹 No Priority")
+STATUSES = ("In progress", "Planning", "Backlog")
+TAGS = ("research", "feature", "bug", "maintenance", "ops")
+COMPLEXITIES = ("Low", "Medium", "High")
+BUILD_TIMES = (0, 0.16667, 0.5, 1, 2, 3, 4, 6)
+# Share of tasks that depend on an earlier task
+DEPENDENCY_RATE = 0.1
+
+
+def notion_pages(count, seed=0, today=None):
+    """Notion database query results for `count` tasks, shaped like the real API."""
+    rng = random.Random(seed)
+    today = today or datetime.datetime.now(tz=MST).date()
+    pages = []
+    for index in range(count):
+        page_id = f"00000000-0000-0000-0000-{index:012d}"
+        name = rng.choice(NAME_PATTERNS).format(topic=rng.choice(TOPICS)) + f" #{index}"
+        properties = {
+            "Project name": {"type": "title", "title": [{"plain_text": name}]},
+            "Priority": {"type": "select", "select": {"name": rng.choice(PRIORITIES)}},
+            "Status": {"type": "status", "status": {"name": rng.choice(STATUSES)}},
+            "Total Build Time": {"type": "number", "number": rng.choice(BUILD_TIMES)},
+            "Description": {"type": "rich_text", "rich_text": [
+                {"plain_text": f"Synthetic task {index}. " + "Details. " * rng.randint(0, 40)}]},
+            "Tags": {"type": "multi_select", "multi_select": [{"name": tag} for tag in rng.sample(TAGS, rng.randint(0, 2))]},
+            "Complexity": {"type": "select", "select": {"name": rng.choice(COMPLEXITIES)}},
+            "Dependencies": {"type": "relation", "relation": []},
+            "Assigned To": {"type": "people", "people": []},
+        }
+        if rng.random() < 0.8:
+            due = today + datetime.timedelta(days=rng.randint(1, 45))
+            properties["Dates"] = {"type": "date", "date": {"start": due.isoformat()}}
+        if index and rng.random() < DEPENDENCY_RATE:
+            properties["Dependencies"]["relation"] = [{"id": pages[rng.randrange(index)]["id"]}]
+        pages.append({
+            "object": "page",
+            "id": page_id,
+            "url": f"https://www.notion.so/{page_id.replace('-', '')}",
+            "last_edited_time": "2025-01-01T00:00:00.000Z",
+            "properties": properties,
+        })
+    return pages
+
+
+def calendar_events(count, days=30, seed=0, today=None):
+    """`count` meetings of 15 minutes to 2 hours spread over the working hours of the next `days` days."""
+    rng = random.Random(seed)
+    today = today or datetime.datetime.now(tz=MST).date()
+    events = []
+    for index in range(count):
+        day = today + datetime.timedelta(days=rng.randrange(days))
+        start = datetime.datetime.combine(day, datetime.time(8, 0)).replace(tzinfo=MST)
+        start += datetime.timedelta(minutes=15 * rng.randrange(36))
+        end = start + datetime.timedelta(minutes=15 * rng.randint(1, 8))
+        events.append({
+            "id": f"synthetic{index}",
+            "summary": f"Meeting {index}",
+            "start": {"dateTime": start.isoformat(), "timeZone": "America/Phoenix"},
+            "end": {"dateTime": end.isoformat(), "timeZone": "America/Phoenix"},
+        })
+    return events
@@ -1,71 +1,204 @@
 #!/usr/bin/env python3
-import os
 import json
-import datetime
+import asyncio
 from dateutil import tz
-from openai import OpenAI
+
+from chatgpt.analysis_cache import AnalysisCache
+from chatgpt.task_rules import classify_task, default_build_time
+from chatgpt.prompt_context import (
+    UsageLog, count_tokens, encode_json, fit_task, format_calendar_summary, summarize_calendar,
+)
+from common.clients import create_openai_client
+from common import instrumentation, rate_limit
 
 # Time zone for MST
 MST = tz.gettz("America/Phoenix")
 
-# OpenAI client setup
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY") or "your-api-key-here")
-
-def sanitize_json_output(s):
-    """Fix incomplete JSON by ensuring it’s a valid array."""
-    s = s.strip()
-    if not s.startswith("["):
-        s = "[" + s
-    if not s.endswith("]"):
-        last_brace = s.rfind("}")
-        if last_brace != -1:
-            s = s[:last_brace + 1] + "]"
-        else:
-            s += "]"
-    return s
-
-def analyze_tasks(tasks, calendar_events):
-    """Analyze tasks with ChatGPT, adding useful fields."""
-    tasks_serializable = []
-    for t in tasks:
-        t_copy = t.copy()
-        if isinstance(t_copy.get("due"), datetime.datetime):
-            t_copy["due"] = t_copy["due"].isoformat()
-        tasks_serializable.append(t_copy)
-    
-    tasks_json = json.dumps(tasks_serializable, indent=2)
-    calendar_events_json = json.dumps(calendar_events, indent=2)
-
-    # Count events per day over the next 7 days
-    now = datetime.datetime.now(tz=MST).date()
-    event_counts = {now + datetime.timedelta(days=i): 0 for i in range(7)}
-    for event in calendar_events:
-        start_str = event.get("start")
-        if start_str:
-            try:
-                event_date = datetime.datetime.fromisoformat(start_str).astimezone(MST).date()
-                if event_date in event_counts:
-                    event_counts[event_date] += 1
-            except ValueError:
+# OpenAI model setup (the client itself is built on first use by common.clients)
+AI_MODEL = "gpt-4"
+MAX_OUTPUT_TOKENS = 3000
+# Upper bound on input tokens per request (instructions + calendar summary + tasks)
+INPUT_TOKEN_BUDGET = 3000
+# Expected output tokens per analyzed task, used to size chunks so answers are not truncated
+OUTPUT_TOKENS_PER_TASK = 150
+# Number of chunk requests in flight at once
+AI_MAX_CONCURRENCY = 4
+# Extra attempts for a chunk whose request failed or whose output was cut short
+CHUNK_RETRIES = 2
+# Tasks the local rules classify with at least this confidence skip the model
+AI_CONFIDENCE_THRESHOLD = 0.7
+# Send every task to the model (or the cache) so each one gets a suggested_solution
+SUGGEST_SOLUTIONS = False
+
+# Input/output token counts for every model call made by this process
+usage_log = UsageLog()
+
+class JsonObjectStream:
+    """
+    Incremental parser for a streamed JSON array of objects.
+    feed() returns each top-level object as soon as its closing brace arrives,
+    so a truncated response only loses the object that was being written.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text):
+        objects = []
+        for ch in text:
+            if self._depth == 0:
+                # Anything between objects ("[", ",", code fences, prose) is skipped
+                if ch == "{":
+                    self._depth = 1
+                    self._buffer = [ch]
                 continue
-    event_count_str = "\n".join([f"{date}: {count} events" for date, count in event_counts.items()])
-    min_event_date = min(event_counts, key=event_counts.get)
-    min_event_count = event_counts[min_event_date]
-    
+            self._buffer.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        objects.append(json.loads("".join(self._buffer)))
+                    except ValueError as e:
+                        print("Error parsing AI response object:", e)
+        return objects
+
+def chunk_tasks(tasks, token_budget, max_tasks):
+    """
+    Splits tasks into consecutive chunks that each fit the input token budget
+    and hold at most `max_tasks` tasks.
+    """
+    chunks = []
+    current = []
+    used = 0
+    for task in tasks:
+        cost = count_tokens(encode_json(task))
+        if current and (used + cost > token_budget or len(current) >= max_tasks):
+            chunks.append(current)
+            current = []
+            used = 0
+        current.append(task)
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _triage(tasks, cache):
+    """
+    Answers what it can offline. Returns (analyzed {index: task} from the
+    rules or the cache, rule results by index, [(index, task)] for the model).
+    """
+    analyzed = {}
+    rule_results = {}
+    misses = []
+    offline = 0
+    for index, task in enumerate(tasks):
+        rule = classify_task(task)
+        rule_results[index] = {"task_type": rule["task_type"], "build_time": rule["build_time"]}
+        if rule["confidence"] >= AI_CONFIDENCE_THRESHOLD and not SUGGEST_SOLUTIONS:
+            analyzed[index] = {**task, **rule_results[index]}
+            offline += 1
+            continue
+        cached = cache.get(task)
+        if cached is not None:
+            analyzed[index] = {**task, **cached}
+        else:
+            misses.append((index, task))
+    print(f"🧮 Rules classified {offline}/{len(tasks)} tasks offline.")
+    instrumentation.count("cache_requests", value=offline, cache="task_rules", result="hit")
+    instrumentation.count("cache_requests", value=len(tasks) - offline, cache="task_rules", result="miss")
+    return analyzed, rule_results, misses
+
+async def analyze_tasks_stream(tasks, calendar_events, cache=None):
+    """
+    Streaming form of analyze_tasks: an async generator yielding analyzed
+    tasks in input order, in batches, each as soon as every task before it is
+    done. Rule and cache answers come out right away; the rest follow as
+    their model chunks complete.
+    """
+    cache = cache if cache is not None else AnalysisCache()
+    analyzed, rule_results, misses = _triage(tasks, cache)
+    released = 0
+
+    def ready():
+        nonlocal released
+        start = released
+        while released < len(tasks) and released in analyzed:
+            released += 1
+        return [analyzed[index] for index in range(start, released)]
+
+    if misses:
+        batch = ready()
+        if batch:
+            yield batch
+        async for positions, updated_tasks in request_analysis_stream([task for _, task in misses], calendar_events):
+            updated_by_name = {task.get("name"): task for task in updated_tasks}
+            for position in positions:
+                index, task = misses[position]
+                updated = updated_by_name.get(task["name"])
+                if updated is None:
+                    # Model unavailable or task missing from its answer: fall back to the rules
+                    analyzed[index] = {**task, **rule_results[index]}
+                    continue
+                analyzed[index] = {**task, **updated}
+                cache.put(task, updated)
+            batch = ready()
+            if batch:
+                yield batch
+        cache.save()
+
+    stats = cache.stats()
+    print(f"🗃 Analysis cache: {stats['hits']} hits, {stats['misses']} misses "
+          f"({stats['hit_rate']:.0%} hit rate, {stats['entries']} entries).")
+    batch = ready()
+    if batch:
+        yield batch
+
+@instrumentation.traced("analyze_tasks")
+def analyze_tasks(tasks, calendar_events, cache=None):
+    """
+    Analyze tasks with ChatGPT, adding useful fields.
+    Tasks the local rules classify confidently are handled offline. Of the rest,
+    tasks whose inputs are unchanged since an earlier run are served from the
+    analysis cache; only cache misses are sent to the model.
+    """
+    async def collect():
+        return [task async for batch in analyze_tasks_stream(tasks, calendar_events, cache) for task in batch]
+    return asyncio.run(collect())
+
+def build_prompt(tasks, calendar_summary):
+    """
+    Builds the analysis prompt from compact tasks (see prompt_context.compact_task)
+    and the per-day calendar summary.
+    """
+    min_day = min(calendar_summary, key=lambda day: day["events"])
+    min_event_date = min_day["date"]
+    min_event_count = min_day["events"]
+
     prompt = f"""
-You are an AI scheduling assistant with expertise in project management and technical development. I provide a list of tasks in JSON format with:
-- priority (string, e.g., "High", "Medium", "No Priority")
-- due (ISO datetime string or "No Due Date")
+You are an AI scheduling assistant with expertise in project management and technical development. I provide a list of tasks in compact JSON with:
 - name (string, detailed task info)
+- description, tags, complexity (strings, when present)
+- priority (string, e.g., "High", "Medium", "No Priority")
+- due (ISO datetime string, omitted when there is no due date)
 - status (string, e.g., "In progress", "Planning", "Backlog")
 - build_time (float, hours)
-- url (string)
 
-Here are my upcoming calendar events for the next 7 days:
-{calendar_events_json}
-
-Event counts per day:
-{event_count_str}
+My availability for the next 7 days (working hours 09:00-17:00, lunch 12:00-13:00):
+{format_calendar_summary(calendar_summary)}
 
 The date with the fewest events is {min_event_date} with {min_event_count} events.
 
@@ -83,43 +216,116 @@ For each task:
 5. Respect due dates and priority for timing (e.g., urgent tasks suggest immediate steps).
 6. Suggest grouping heavy focus tasks on days with fewer events (e.g., "Schedule on {min_event_date} with {min_event_count} events" if it’s a focus task).
 
-Return a valid JSON array (start with '[', end with ']') with all original fields plus "task_type" and "suggested_solution". Ensure complete objects—no partial outputs.
+Return a valid JSON array (start with '[', end with ']') with one object per task containing only "name" (exactly as given), "task_type", "build_time" and "suggested_solution". Ensure complete objects—no partial outputs.
 
 Input:
-{tasks_json}
+{encode_json(tasks)}
 """
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are an AI scheduling assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=3000
-        )
-    except Exception as e:
-        print("Error calling OpenAI API:", e)
-        return tasks
-
-    answer = response.choices[0].message.content.strip()
-    answer = sanitize_json_output(answer)
-    try:
-        updated_tasks = json.loads(answer)
-        # Fallback: Ensure no non-"Done" task has build_time of 0
-        for task in updated_tasks:
-            if task["status"].lower() != "done" and task["build_time"] <= 0:
-                if task["task_type"] == "research":
-                    task["build_time"] = 3
-                elif task["task_type"] == "design":
-                    task["build_time"] = 4
-                else:  # focus
-                    task["build_time"] = 1
-        return updated_tasks
-    except Exception as e:
-        print("Error parsing AI response:", e)
-        print("AI response was:", answer)
-        return tasks
+    return prompt
+
+def apply_build_time_fallback(task):
+    """Ensures no non-"Done" task comes back with a build_time of 0."""
+    if task.get("status", "").lower() != "done" and (task.get("build_time") or 0) <= 0:
+        task["build_time"] = default_build_time(task.get("task_type"))
+    return task
+
+async def _stream_chunk(client, tasks, calendar_summary, label):
+    """Streams one chunk's completion, parsing task objects as they arrive."""
+    prompt = build_prompt(tasks, calendar_summary)
+    stream = await client.chat.completions.create(
+        model=AI_MODEL,
+        messages=[
+            {"role": "system", "content": "You are an AI scheduling assistant."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.7,
+        max_tokens=MAX_OUTPUT_TOKENS,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    parser = JsonObjectStream()
+    objects = []
+    output = []
+    usage = None
+    async for chunk in stream:
+        if chunk.usage:
+            usage = chunk.usage
+        if chunk.choices and chunk.choices[0].delta.content:
+            output.append(chunk.choices[0].delta.content)
+            objects.extend(parser.feed(chunk.choices[0].delta.content))
+    estimated_input = count_tokens(prompt)
+    if usage is not None:
+        usage_log.record(label, usage.prompt_tokens, usage.completion_tokens, estimated_input)
+    else:
+        usage_log.record(label, estimated_input, count_tokens("".join(output)), estimated_input)
+    instrumentation.count("api_requests", service="openai", endpoint="chat.completions")
+    instrumentation.count("bytes", len(prompt.encode()), service="openai", direction="sent")
+    instrumentation.count("bytes", len("".join(output).encode()), service="openai", direction="received")
+    instrumentation.count("llm_tokens", usage_log.calls[-1]["input_tokens"] or 0, kind="input")
+    instrumentation.count("llm_tokens", usage_log.calls[-1]["output_tokens"] or 0, kind="output")
+    return objects
+
+async def _analyze_chunk(client, semaphore, tasks, calendar_summary, originals, label):
+    """Analyzes one chunk, retrying only the tasks missing from earlier attempts."""
+    found = {}
+    remaining = tasks
+    for attempt in range(CHUNK_RETRIES + 1):
+        try:
+            async with semaphore:
+                objects = await rate_limit.call_async("openai", _stream_chunk, client, remaining,
+                                                      calendar_summary, f"{label}.{attempt}")
+        except Exception as e:
+            print(f"Error calling OpenAI API (attempt {attempt + 1}):", e)
+            objects = []
+        names = {task["name"] for task in remaining}
+        for obj in objects:
+            if isinstance(obj, dict) and obj.get("name") in names:
+                found[obj["name"]] = apply_build_time_fallback({**originals[obj["name"]], **obj})
+        remaining = [task for task in remaining if task["name"] not in found]
+        if not remaining:
+            break
+        if attempt < CHUNK_RETRIES:
+            print(f"⚠️ {len(remaining)} tasks missing from AI response. Retrying them.")
+            instrumentation.count("api_retries", service="openai")
+    return list(found.values())
+
+async def request_analysis_stream(tasks, calendar_events):
+    """
+    Sends `tasks` to the model in chunks that fit INPUT_TOKEN_BUDGET, at most
+    AI_MAX_CONCURRENCY at a time, and yields (positions in `tasks`, analyzed
+    tasks) for each chunk as soon as it completes. Tasks the model never
+    returned are left out.
+    """
+    calendar_summary = summarize_calendar(calendar_events)
+    task_budget = max(INPUT_TOKEN_BUDGET - count_tokens(build_prompt([], calendar_summary)), 1)
+    originals = {task["name"]: task for task in tasks}
+    compact = [fit_task(task, task_budget) for task in tasks]
+    chunks = chunk_tasks(compact, task_budget, max(MAX_OUTPUT_TOKENS // OUTPUT_TOKENS_PER_TASK, 1))
+
+    semaphore = asyncio.Semaphore(AI_MAX_CONCURRENCY)
+    returned = 0
+    async with create_openai_client() as client:
+        pending = {}
+        offset = 0
+        for index, chunk in enumerate(chunks):
+            future = asyncio.ensure_future(
+                _analyze_chunk(client, semaphore, chunk, calendar_summary, originals, f"chunk{index}"))
+            pending[future] = range(offset, offset + len(chunk))
+            offset += len(chunk)
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    positions = pending.pop(future)
+                    result = future.result()
+                    returned += len(result)
+                    yield positions, result
+        finally:
+            for future in pending:
+                future.cancel()
+    totals = usage_log.totals()
+    print(f"🤖 Analyzed {returned}/{len(tasks)} tasks in {len(chunks)} chunks "
+          f"({totals['input_tokens']} input / {totals['output_tokens']} output tokens so far).")
 
 if __name__ == "__main__":
     sample_tasks = [
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import threading
+import time
+
+from chatgpt.prompt_context import PROMPT_TASK_FIELDS
+from common import instrumentation
+
+# Persistent store of AI analysis results, keyed by a hash of the task's inputs
+ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", "/home/moneybot/scheduler/chatgpt/analysis_cache.json")
+# Entries older than this are re-analyzed
+CACHE_TTL_HOURS = 24 * 7
+# Least recently used entries beyond this count are evicted on save
+CACHE_MAX_ENTRIES = 2000
+
+# Task fields that change what the model would answer: every field that reaches the prompt
+KEY_FIELDS = PROMPT_TASK_FIELDS
+# Fields the model adds or rewrites, which are what gets cached
+CACHED_FIELDS = ("task_type", "build_time", "suggested_solution")
+
+
+def content_hash(task):
+    """Content hash of the fields the analysis depends on."""
+    payload = json.dumps({field: task.get(field) for field in KEY_FIELDS}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """
+    JSON-backed cache of analyze_tasks results with TTL and size-based (LRU)
+    eviction. Tracks hits and misses so each run can report its hit rate.
+    Safe to share between the per-calendar worker threads.
+    """
+
+    def __init__(self, path=ANALYSIS_CACHE_PATH, ttl_hours=CACHE_TTL_HOURS, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, task):
+        """Returns the cached analysis fields for `task`, or None on a miss."""
+        key = content_hash(task)
+        with self._lock:
+            entry = self.entries.get(key)
+            now = time.time()
+            if entry is None or now - entry["created"] > self.ttl_seconds:
+                self.misses += 1
+                instrumentation.count("cache_requests", cache="analysis", result="miss")
+                return None
+            entry["used"] = now
+            self.hits += 1
+            instrumentation.count("cache_requests", cache="analysis", result="hit")
+            return dict(entry["result"])
+
+    def put(self, task, analyzed):
+        now = time.time()
+        result = {field: analyzed[field] for field in CACHED_FIELDS if field in analyzed}
+        with self._lock:
+            self.entries[content_hash(task)] = {"result": result, "created": now, "used": now}
+
+    def save(self):
+        now = time.time()
+        with self._lock:
+            live = {key: entry for key, entry in self.entries.items() if now - entry["created"] <= self.ttl_seconds}
+            if len(live) > self.max_entries:
+                newest = sorted(live, key=lambda key: live[key]["used"], reverse=True)[:self.max_entries]
+                live = {key: live[key] for key in newest}
+            self.evictions += len(self.entries) - len(live)
+            self.entries = live
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump(live, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"⚠️ Could not save analysis cache: {e}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.entries),
+            "evictions": self.evictions,
+        }
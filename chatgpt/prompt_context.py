@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+import json
+import datetime
+from dateutil import tz
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character-based estimate
+    tiktoken = None
+
+# Time zone for MST
+MST = tz.gettz("America/Phoenix")
+# Working hours and lunch break, matching free_slots in googlecal/planner.py
+WORK_START = datetime.time(9, 0)
+WORK_END = datetime.time(17, 0)
+LUNCH_START = datetime.time(12, 0)
+LUNCH_END = datetime.time(13, 0)
+# Task fields the model needs to classify and estimate a task
+PROMPT_TASK_FIELDS = ("name", "description", "priority", "due", "status", "build_time", "tags", "complexity")
+# Descriptions are cut to this many characters before a task is sent
+MAX_DESCRIPTION_CHARS = 400
+
+_encoding = None
+
+
+def count_tokens(text, model="gpt-4"):
+    """Counts tokens with tiktoken when it is installed, otherwise estimates ~4 characters per token."""
+    global _encoding
+    if tiktoken is None:
+        return len(text) // 4 + 1
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+    return len(_encoding.encode(text))
+
+
+def encode_json(value):
+    """JSON without indentation or spaces after separators."""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def compact_task(task, max_description=MAX_DESCRIPTION_CHARS):
+    """Keeps only the fields in PROMPT_TASK_FIELDS, dropping empty and placeholder values."""
+    compact = {}
+    for field in PROMPT_TASK_FIELDS:
+        value = task.get(field)
+        if value in (None, "", "Unknown", "No Due Date"):
+            continue
+        if isinstance(value, datetime.datetime):
+            value = value.isoformat()
+        if field == "description" and len(value) > max_description:
+            value = value[:max_description] + "…"
+        compact[field] = value
+    return compact
+
+
+def fit_task(task, token_budget):
+    """Returns the compact form of `task`, shortening its description until it fits the budget."""
+    for limit in (MAX_DESCRIPTION_CHARS, 120, 0):
+        compact = compact_task(task, limit)
+        if limit == 0:
+            compact.pop("description", None)
+        if count_tokens(encode_json(compact)) <= token_budget:
+            break
+    return compact
+
+
+def _parse_time(value):
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=MST)
+    return parsed.astimezone(MST)
+
+
+def summarize_calendar(calendar_events, days=7, today=None):
+    """
+    Reduces calendar events to one entry per day: event count, busy hours inside
+    working hours, and the free windows left (lunch excluded).
+    """
+    today = today or datetime.datetime.now(tz=MST).date()
+    busy = {today + datetime.timedelta(days=i): [] for i in range(days)}
+    counts = dict.fromkeys(busy, 0)
+    for event in calendar_events:
+        try:
+            start, end = _parse_time(event["start"]), _parse_time(event["end"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if start.date() in counts:
+            counts[start.date()] += 1
+        for day in busy:
+            day_start = datetime.datetime.combine(day, WORK_START).replace(tzinfo=MST)
+            day_end = datetime.datetime.combine(day, WORK_END).replace(tzinfo=MST)
+            if start < day_end and end > day_start:
+                busy[day].append((max(start, day_start), min(end, day_end)))
+
+    summary = []
+    for day, intervals in busy.items():
+        lunch = (datetime.datetime.combine(day, LUNCH_START).replace(tzinfo=MST),
+                 datetime.datetime.combine(day, LUNCH_END).replace(tzinfo=MST))
+        busy_hours = 0.0
+        free = []
+        cursor = datetime.datetime.combine(day, WORK_START).replace(tzinfo=MST)
+        day_end = datetime.datetime.combine(day, WORK_END).replace(tzinfo=MST)
+        # The zero-length interval at day_end closes the last free window
+        for start, end in sorted(intervals) + [(day_end, day_end)]:
+            if start > cursor:
+                for window_start, window_end in ((cursor, min(start, lunch[0])), (max(cursor, lunch[1]), start)):
+                    if window_end > window_start:
+                        free.append(f"{window_start:%H:%M}-{window_end:%H:%M}")
+            if end > cursor:
+                busy_hours += (end - max(start, cursor)).total_seconds() / 3600.0
+                cursor = end
+        summary.append({"date": day, "events": counts[day], "busy_hours": round(busy_hours, 2), "free": free})
+    return summary
+
+
+def format_calendar_summary(summary):
+    """One short line per day, e.g. "2025-02-17 Mon: 3 events, 2.5h busy, free 09:00-10:00 13:00-17:00"."""
+    lines = []
+    for day in summary:
+        free = " ".join(day["free"]) or "none"
+        lines.append(f"{day['date']:%Y-%m-%d %a}: {day['events']} events, {day['busy_hours']}h busy, free {free}")
+    return "\n".join(lines)
+
+
+class UsageLog:
+    """Input and output token counts for each model call."""
+
+    def __init__(self):
+        self.calls = []
+
+    def record(self, label, input_tokens, output_tokens, estimated_input=None):
+        self.calls.append({
+            "label": label,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "estimated_input_tokens": estimated_input,
+        })
+
+    def totals(self):
+        return {
+            "calls": len(self.calls),
+            "input_tokens": sum(call["input_tokens"] or 0 for call in self.calls),
+            "output_tokens": sum(call["output_tokens"] or 0 for call in self.calls),
+        }
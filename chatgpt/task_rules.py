@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+import re
+
+# Keywords in a task name and the task_type they imply ("Investigate" → research, "Create" → design)
+NAME_KEYWORDS = {
+    "research": ("investigate", "research", "explore", "evaluate", "compare"),
+    "design": ("create", "design", "prototype", "architect"),
+    "focus": ("review", "fix", "refine", "update", "test", "document", "clean"),
+}
+# Notion tags and the task_type they imply
+TAG_TYPES = {
+    "research": "research",
+    "investigation": "research",
+    "design": "design",
+    "feature": "design",
+    "bug": "focus",
+    "review": "focus",
+    "maintenance": "focus",
+}
+# (low, default, high) build_time in hours per task_type, as given in the analyze_tasks prompt
+BUILD_TIME_RANGES = {
+    "research": (2, 3, 4),
+    "design": (3, 4, 6),
+    "focus": (0.5, 1, 2),
+}
+# Notion complexity → position in BUILD_TIME_RANGES
+COMPLEXITY_INDEX = {"low": 0, "medium": 1, "high": 2}
+# build_time values that mean "not estimated yet" (0 and the 10-minute Notion default)
+PLACEHOLDER_BUILD_TIMES = (0, 0.16667)
+
+
+def _name_type(name):
+    words = set(re.findall(r"[a-z]+", name.lower()))
+    for task_type, keywords in NAME_KEYWORDS.items():
+        if words.intersection(keywords):
+            return task_type
+    return None
+
+
+def _tag_type(tags):
+    for tag in (tags or "").split(","):
+        task_type = TAG_TYPES.get(tag.strip().lower())
+        if task_type:
+            return task_type
+    return None
+
+
+def classify_task(task):
+    """
+    Applies the scheduling rules locally. Returns task_type, build_time and a
+    confidence between 0 and 1 for the task_type:
+    name keyword and tag agree 0.95, name keyword only 0.85, tag only 0.8,
+    name and tag disagree 0.5, no signal (default "focus") 0.4.
+    """
+    by_name = _name_type(task.get("name", ""))
+    by_tag = _tag_type(task.get("tags"))
+    if by_name and by_tag:
+        task_type, confidence = by_name, 0.95 if by_name == by_tag else 0.5
+    elif by_name:
+        task_type, confidence = by_name, 0.85
+    elif by_tag:
+        task_type, confidence = by_tag, 0.8
+    else:
+        task_type, confidence = "focus", 0.4
+
+    build_time = task.get("build_time") or 0
+    if build_time in PLACEHOLDER_BUILD_TIMES or build_time <= 0:
+        index = COMPLEXITY_INDEX.get(str(task.get("complexity", "")).lower(), 1)
+        build_time = BUILD_TIME_RANGES[task_type][index]
+    return {"task_type": task_type, "build_time": build_time, "confidence": confidence}
+
+
+def default_build_time(task_type):
+    """Default estimate for a task_type, used when the model leaves build_time at 0."""
+    return BUILD_TIME_RANGES.get(task_type, BUILD_TIME_RANGES["focus"])[1]
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Lazily constructed API clients shared by googlecal/, chatgpt/ and notion/.
+
+Nothing here touches credentials, discovery documents or the heavy client
+libraries until a client is first requested, so every module can be imported
+(e.g. for DRY_RUN planning or tests) without credentials present.
+"""
+import json
+import os
+import threading
+
+SERVICE_ACCOUNT_FILE = "/home/moneybot/scheduler/googlecal/service.json"
+SCOPES = ["https://www.googleapis.com/auth/calendar"]
+# Locally cached Calendar discovery document; the copy bundled with googleapiclient is used when absent
+DISCOVERY_DOC_PATH = "/home/moneybot/scheduler/googlecal/calendar_v3_discovery.json"
+# Optional Calendar API endpoint override (e.g. a local fake Calendar server for testing)
+CALENDAR_API_ENDPOINT = os.getenv("GOOGLE_CALENDAR_API_ENDPOINT")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") or "your-api-key-here"
+
+_lock = threading.Lock()
+_credentials = None
+_discovery_doc = None
+_calendar_override = None
+# googleapiclient services are not thread-safe, so each thread gets its own
+_local = threading.local()
+
+
+def _get_credentials():
+    global _credentials
+    with _lock:
+        if _credentials is None:
+            from google.oauth2.service_account import Credentials
+            _credentials = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+        return _credentials
+
+
+def _get_discovery_doc():
+    global _discovery_doc
+    with _lock:
+        if _discovery_doc is None and os.path.exists(DISCOVERY_DOC_PATH):
+            with open(DISCOVERY_DOC_PATH) as f:
+                _discovery_doc = json.load(f)
+        return _discovery_doc
+
+
+def build_calendar_service(credentials=None):
+    """Builds a new Calendar v3 client from a static discovery document (no discovery request)."""
+    from googleapiclient.discovery import build, build_from_document
+
+    credentials = credentials or _get_credentials()
+    client_options = {"api_endpoint": CALENDAR_API_ENDPOINT} if CALENDAR_API_ENDPOINT else None
+    discovery_doc = _get_discovery_doc()
+    if discovery_doc is not None:
+        return build_from_document(discovery_doc, credentials=credentials, client_options=client_options)
+    return build("calendar", "v3", credentials=credentials, client_options=client_options,
+                 static_discovery=True, cache_discovery=False)
+
+
+def get_calendar_service():
+    """Returns this thread's Calendar client, building it on first use."""
+    if _calendar_override is not None:
+        return _calendar_override
+    service = getattr(_local, "calendar_service", None)
+    if service is None:
+        service = build_calendar_service()
+        _local.calendar_service = service
+    return service
+
+
+def set_calendar_service(service):
+    """
+    Makes every thread use `service` as its Calendar client (local fakes,
+    benchmarks); None goes back to per-thread clients. The service must be
+    thread-safe when the scheduler runs calendars in parallel.
+    """
+    global _calendar_override
+    _calendar_override = service
+
+
+def create_openai_client():
+    """
+    Returns a new AsyncOpenAI client. The openai package is imported on first
+    call; OPENAI_BASE_URL is honoured by the client itself. The client's own
+    retries are off because common.rate_limit retries every call.
+    """
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=0)
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Run instrumentation: span timings, API request/retry/byte counters, LLM token
+usage and cache hit rates, exported at the end of a run as a JSON trace
+(Chrome trace-event format, loadable in Perfetto / chrome://tracing) and a
+Prometheus text-format metrics file (for the node_exporter textfile collector).
+
+Off unless SCHEDULER_INSTRUMENTATION=1. When off, span() returns a shared
+no-op object, count() returns immediately and @traced functions make one
+extra call and a None check.
+"""
+import asyncio
+import contextvars
+import datetime
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+
+INSTRUMENTATION_ENABLED = os.getenv("SCHEDULER_INSTRUMENTATION", "0").lower() in ("1", "true", "yes", "on")
+TRACE_DIR = os.getenv("SCHEDULER_TRACE_DIR", "/home/moneybot/scheduler/traces")
+# Individual spans kept in the trace; timings past this are still aggregated in the metrics
+MAX_TRACE_SPANS = 20000
+METRIC_PREFIX = "scheduler"
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Recorder:
+    """Spans and counters for one run."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.dropped_spans = 0
+        self.span_totals = {}   # name -> [count, total seconds, max seconds, errors]
+        self.counters = {}      # (name, sorted label items) -> value
+        self.ids = itertools.count(1)
+
+    def finish_span(self, span, duration, error):
+        with self.lock:
+            totals = self.span_totals.setdefault(span.name, [0, 0.0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += duration
+            totals[2] = max(totals[2], duration)
+            totals[3] += 1 if error else 0
+            if len(self.spans) >= MAX_TRACE_SPANS:
+                self.dropped_spans += 1
+                return
+            args = dict(span.attrs, id=span.id, parent=span.parent)
+            if error:
+                args["error"] = error
+            self.spans.append({
+                "name": span.name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                "ts": round((span.start - self.origin) * 1e6), "dur": round(duration * 1e6), "args": args,
+            })
+
+    def add(self, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+
+_recorder = Recorder() if INSTRUMENTATION_ENABLED else None
+
+
+def enabled():
+    return _recorder is not None
+
+
+def enable():
+    """Turns instrumentation on for the rest of the process (e.g. from the benchmarks)."""
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder()
+
+
+def disable():
+    global _recorder
+    _recorder = None
+
+
+class _Span:
+    __slots__ = ("recorder", "name", "attrs", "id", "parent", "start", "_token")
+
+    def __init__(self, recorder, name, attrs):
+        self.recorder = recorder
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.id = next(self.recorder.ids)
+        self.parent = _current_span.get()
+        self._token = _current_span.set(self.id)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        _current_span.reset(self._token)
+        self.recorder.finish_span(self, duration, exc_type.__name__ if exc_type else None)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, **attrs):
+    """Context manager timing a block: `with span("plan", mode="greedy") as s: ...; s.set(tasks=3)`."""
+    recorder = _recorder
+    if recorder is None:
+        return _NULL_SPAN
+    return _Span(recorder, name, attrs)
+
+
+def traced(name=None):
+    """Decorator recording a span around every call of a function or coroutine function."""
+    def decorate(fn):
+        span_name = name or fn.__name__
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                recorder = _recorder
+                if recorder is None:
+                    return await fn(*args, **kwargs)
+                with _Span(recorder, span_name, {}):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            recorder = _recorder
+            if recorder is None:
+                return fn(*args, **kwargs)
+            with _Span(recorder, span_name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name, value=1, **labels):
+    """
+    Adds to a labelled counter. Names in use: api_requests (service, endpoint),
+    api_retries (service), api_throttled (service), bytes (service, direction), llm_tokens (kind),
+    cache_requests (cache, result), calendar_writes (op, result).
+    """
+    recorder = _recorder
+    if recorder is None or not value:
+        return
+    recorder.add(name, value, labels)
+
+
+def summary():
+    """Aggregated spans, counters and cache hit rates for the current run, or None when disabled."""
+    recorder = _recorder
+    if recorder is None:
+        return None
+    with recorder.lock:
+        spans = {name: {"count": c, "total_seconds": round(total, 6), "max_seconds": round(peak, 6), "errors": errors}
+                 for name, (c, total, peak, errors) in sorted(recorder.span_totals.items())}
+        counters = [{"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(recorder.counters.items())]
+    return {"spans": spans, "counters": counters, "cache_hit_rates": _cache_hit_rates(counters)}
+
+
+def _cache_hit_rates(counters):
+    lookups = {}
+    for counter in counters:
+        if counter["name"] != "cache_requests":
+            continue
+        hits_total = lookups.setdefault(counter["labels"].get("cache", ""), [0, 0])
+        hits_total[1] += counter["value"]
+        if counter["labels"].get("result") == "hit":
+            hits_total[0] += counter["value"]
+    return {cache: round(hits / total, 4) for cache, (hits, total) in lookups.items() if total}
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def prometheus_text():
+    """The current run's metrics in the Prometheus text exposition format."""
+    data = summary()
+    if data is None:
+        return ""
+    lines = [
+        f"# HELP {METRIC_PREFIX}_span_seconds Time spent in each instrumented phase.",
+        f"# TYPE {METRIC_PREFIX}_span_seconds summary",
+    ]
+    for name, stats in data["spans"].items():
+        lines.append(f'{METRIC_PREFIX}_span_seconds_sum{{span="{name}"}} {stats["total_seconds"]}')
+        lines.append(f'{METRIC_PREFIX}_span_seconds_count{{span="{name}"}} {stats["count"]}')
+    lines.append(f"# TYPE {METRIC_PREFIX}_span_seconds_max gauge")
+    for name, stats in data["spans"].items():
+        lines.append(f'{METRIC_PREFIX}_span_seconds_max{{span="{name}"}} {stats["max_seconds"]}')
+
+    by_name = {}
+    for counter in data["counters"]:
+        by_name.setdefault(counter["name"], []).append(counter)
+    for name, counters in by_name.items():
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name}_total counter")
+        for counter in counters:
+            lines.append(f"{METRIC_PREFIX}_{name}_total{_labels(sorted(counter['labels'].items()))} {counter['value']}")
+
+    lines.append(f"# TYPE {METRIC_PREFIX}_cache_hit_ratio gauge")
+    for cache, ratio in data["cache_hit_rates"].items():
+        lines.append(f'{METRIC_PREFIX}_cache_hit_ratio{{cache="{cache}"}} {ratio}')
+    lines.append(f"# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge")
+    lines.append(f"{METRIC_PREFIX}_last_run_timestamp_seconds {round(time.time(), 3)}")
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def export(trace_dir=None, reset=True):
+    """
+    Writes trace-<UTC time>.json and scheduler.prom into `trace_dir`
+    (TRACE_DIR by default) and, with `reset`, starts a new run. Does nothing
+    when instrumentation is off. Returns (trace path, metrics path).
+    """
+    global _recorder
+    recorder = _recorder
+    if recorder is None:
+        return None
+    trace_dir = trace_dir or TRACE_DIR
+    data = summary()
+    with recorder.lock:
+        trace = {
+            "traceEvents": list(recorder.spans),
+            "displayTimeUnit": "ms",
+            "otherData": {"started_at": recorder.started_at.isoformat(), "dropped_spans": recorder.dropped_spans},
+            "summary": data,
+        }
+    metrics = prometheus_text()
+    try:
+        os.makedirs(trace_dir, exist_ok=True)
+        trace_path = os.path.join(trace_dir, f"trace-{recorder.started_at:%Y%m%dT%H%M%S}.json")
+        metrics_path = os.path.join(trace_dir, f"{METRIC_PREFIX}.prom")
+        _write_atomic(trace_path, json.dumps(trace, default=str))
+        _write_atomic(metrics_path, metrics)
+    except OSError as e:
+        print(f"⚠️ Could not write instrumentation output to {trace_dir}: {e}")
+        return None
+    finally:
+        if reset:
+            _recorder = Recorder()
+    print(f"📈 Wrote trace {trace_path} and metrics {metrics_path}.")
+    return trace_path, metrics_path
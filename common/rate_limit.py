@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Per-service rate limiting and retries for the Calendar, Notion and OpenAI calls.
+
+Each service gets one process-wide RateLimiter shared by every thread and
+event loop:
+  - a token bucket caps the request rate (Notion allows about 3 req/s),
+  - an AIMD concurrency limit: +1 slot after a window of successes without
+    throttling, halved (and the bucket paused for Retry-After) when the
+    service throttles, so parallel and batched modes settle at the highest
+    rate the service sustains.
+
+call() / call_async() run a request under the limiter and retry throttling
+(Calendar 403 rateLimitExceeded / 429, Notion 429, OpenAI RateLimitError),
+5xx and connection errors with jittered exponential backoff, honouring
+Retry-After when the service sends it.
+"""
+import asyncio
+import random
+import threading
+import time
+
+from common import instrumentation
+
+# requests per second, bucket size, most requests in flight at once
+SERVICE_LIMITS = {
+    "calendar": {"rate": 10.0, "burst": 10, "max_concurrency": 8},
+    "notion": {"rate": 3.0, "burst": 3, "max_concurrency": 3},
+    "openai": {"rate": 5.0, "burst": 5, "max_concurrency": 8},
+}
+DEFAULT_LIMITS = {"rate": 5.0, "burst": 5, "max_concurrency": 4}
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+# Google reasons (403/429 error bodies) that mean "slow down" rather than "forbidden"
+THROTTLE_REASONS = ("rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded")
+# Connection-level failures worth retrying, matched by exception class name
+TRANSIENT_ERRORS = ("ConnectionError", "Timeout", "ReadTimeout", "ConnectTimeout", "APIConnectionError",
+                    "APITimeoutError", "RemoteDisconnected", "TimeoutError", "ServerNotFoundError")
+
+
+class RateLimiter:
+    """Token bucket plus an adaptive (AIMD) concurrency limit for one service."""
+
+    def __init__(self, name, rate, burst, max_concurrency):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self.tokens = float(burst)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.throttle_count = 0
+        self._successes = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, cost):
+        """
+        Takes `cost` tokens and a slot and returns 0, or returns how long to
+        wait before trying again. A cost above the bucket size waits for a full
+        bucket and leaves the rest as debt, so the average rate still holds.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if now < self.paused_until:
+                return self.paused_until - now
+            if self.in_flight >= self.concurrency:
+                return 0.05
+            needed = min(cost, self.burst)
+            if self.tokens < needed:
+                return (needed - self.tokens) / self.rate
+            self.tokens -= cost
+            self.in_flight += 1
+            return 0
+
+    def acquire(self, cost=1):
+        """Blocks until the request (worth `cost` calls against the quota) may be sent."""
+        while True:
+            wait = self._try_acquire(cost)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, cost=1):
+        while True:
+            wait = self._try_acquire(cost)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def release(self, throttled=False, retry_after=None):
+        with self._lock:
+            self.in_flight -= 1
+            if throttled:
+                self._throttled(retry_after)
+                return
+            self._successes += 1
+            if self._successes >= self.concurrency and self.concurrency < self.max_concurrency:
+                self.concurrency += 1
+                self._successes = 0
+
+    def _throttled(self, retry_after):
+        self.throttle_count += 1
+        self.concurrency = max(1, self.concurrency // 2)
+        self._successes = 0
+        self.tokens = 0.0
+        if retry_after:
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        instrumentation.count("api_throttled", service=self.name)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(service):
+    with _limiters_lock:
+        if service not in _limiters:
+            _limiters[service] = RateLimiter(service, **SERVICE_LIMITS.get(service, DEFAULT_LIMITS))
+        return _limiters[service]
+
+
+def _status_and_headers(error):
+    """HTTP status and response headers from googleapiclient, requests and openai errors."""
+    resp = getattr(error, "resp", None)              # googleapiclient HttpError (httplib2 response)
+    if resp is not None and hasattr(resp, "status"):
+        return resp.status, resp
+    response = getattr(error, "response", None)      # requests HTTPError, openai APIStatusError
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    return status, getattr(response, "headers", None) or {}
+
+
+def http_status(error):
+    """HTTP status of an API exception, or None for connection-level errors."""
+    status = _status_and_headers(error)[0]
+    return int(status) if status is not None else None
+
+
+def _retry_after(headers):
+    value = (headers.get("retry-after") or headers.get("Retry-After")) if headers else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None  # HTTP-date form: fall back to exponential backoff
+
+
+def classify_error(error):
+    """Returns (retryable, throttled, retry_after seconds or None) for an API exception."""
+    status, headers = _status_and_headers(error)
+    if status is None:
+        transient = any(name in TRANSIENT_ERRORS for name in (cls.__name__ for cls in type(error).__mro__))
+        return transient, False, None
+    status = int(status)
+    retry_after = _retry_after(headers)
+    if status == 429:
+        return True, True, retry_after
+    if status == 403:
+        text = str(getattr(error, "content", b"") or "") + str(error)
+        throttled = any(reason in text for reason in THROTTLE_REASONS)
+        return throttled, throttled, retry_after
+    if status >= 500:
+        return True, False, retry_after
+    return False, False, None
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, never shorter than Retry-After."""
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after + random.uniform(0, BACKOFF_BASE_SECONDS / 2))
+    return delay
+
+
+def _next_attempt(service, error, attempt):
+    """Returns the delay before retrying `error`, or raises it when it should not be retried."""
+    retryable, _, retry_after = classify_error(error)
+    if not retryable or attempt >= MAX_RETRIES:
+        raise error
+    delay = backoff_delay(attempt, retry_after)
+    instrumentation.count("api_retries", service=service)
+    print(f"⏳ {service} request failed ({type(error).__name__}); retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s.")
+    return delay
+
+
+def call(service, fn, *args, **kwargs):
+    """Runs fn(*args, **kwargs) under the service's limiter, retrying throttling and transient errors."""
+    limiter = get_limiter(service)
+    attempt = 0
+    while True:
+        limiter.acquire()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            retryable, throttled, retry_after = classify_error(e)
+            limiter.release(throttled, retry_after)
+            time.sleep(_next_attempt(service, e, attempt))
+            attempt += 1
+            continue
+        limiter.release()
+        return result
+
+
+async def call_async(service, fn, *args, **kwargs):
+    """Awaits fn(*args, **kwargs) under the service's limiter with the same retry policy as call()."""
+    limiter = get_limiter(service)
+    attempt = 0
+    while True:
+        await limiter.acquire_async()
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception as e:
+            retryable, throttled, retry_after = classify_error(e)
+            limiter.release(throttled, retry_after)
+            await asyncio.sleep(_next_attempt(service, e, attempt))
+            attempt += 1
+            continue
+        limiter.release()
+        return result
@@ -1,43 +1,34 @@
 #!/usr/bin/env python3
-import os
 import json
 import datetime
-from dateutil import parser as dt_parser
 from dateutil import tz
-from googleapiclient.discovery import build
-from google.oauth2.service_account import Credentials
+import repo_path  # noqa: F401  (must precede the chatgpt and common imports)
 from chatgpt.ai_analyzer import analyze_tasks  # Import from new module
+from calendar_snapshot import CalendarSnapshot
+from event_store import EventStore
+from scheduler_config import CALENDAR_ID
+from common.clients import get_calendar_service
 
 # --- Configuration and Constants ---
-TODO_SCRIPT_PATH = "/home/moneybot/scheduler/notion/api/generate_todo_list.sh"
-SERVICE_ACCOUNT_FILE = "/home/moneybot/scheduler/googlecal/service.json"
-CALENDAR_ID = "a252aec5fae47d681a372f6e37da3ccf0d9d352c3c8e31bde70b3b666a198da3@group.calendar.google.com"
-
 # Time zone for MST
 MST = tz.gettz("America/Phoenix")
 
-# Google Calendar API setup
-SCOPES = ["https://www.googleapis.com/auth/calendar"]
-creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-service = build("calendar", "v3", credentials=creds)
-
 # --- Helper Functions ---
 
-def fetch_calendar_events():
+def fetch_calendar_events(snapshot=None, store=None):
     """
     Retrieves upcoming calendar events from now until 7 days ahead.
+    Reads from the run's CalendarSnapshot (and the EventStore behind it) when
+    one is given; otherwise loads the next 8 days through `store`, opening an
+    EventStore only when none is passed in.
     Returns a list of events with summary, start, and end.
     """
     now = datetime.datetime.now(tz=MST)
     end_time = now + datetime.timedelta(days=7)
-    events_result = service.events().list(
-        calendarId=CALENDAR_ID,
-        timeMin=now.isoformat(),
-        timeMax=end_time.isoformat(),
-        singleEvents=True,
-        orderBy="startTime"
-    ).execute()
-    events = events_result.get("items", [])
+    if snapshot is None:
+        store = store if store is not None else EventStore()
+        snapshot = CalendarSnapshot(get_calendar_service(), CALENDAR_ID, horizon_days=8, store=store).load()
+    events = snapshot.events_between(now, end_time)
     formatted_events = []
     for event in events:
         summary = event.get("summary", "No Title")
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+import bisect
+import datetime
+import itertools
+from dateutil import parser as dt_parser
+from dateutil import tz
+
+from common import instrumentation, rate_limit
+
+# Time zone for MST
+MST = tz.gettz("America/Phoenix")
+# Number of days fetched up front for a scheduling run
+PLANNING_HORIZON_DAYS = 30
+# Largest page size the Calendar API accepts for events().list
+PAGE_SIZE = 2500
+
+
+def parse_event_times(event):
+    """
+    Returns (start, end) for a Calendar event as MST-aware datetimes.
+    All-day events ("date" instead of "dateTime") start at midnight MST.
+    """
+    times = []
+    for key in ("start", "end"):
+        value = event[key].get("dateTime")
+        if value:
+            times.append(dt_parser.isoparse(value).astimezone(MST))
+        else:
+            day = dt_parser.isoparse(event[key]["date"]).date()
+            times.append(datetime.datetime.combine(day, datetime.time(0, 0)).replace(tzinfo=MST))
+    return times[0], times[1]
+
+
+def days_spanned(start, end):
+    """Dates an event from `start` to `end` overlaps (at least the start date)."""
+    days = [start.date()]
+    while datetime.datetime.combine(days[-1] + datetime.timedelta(days=1), datetime.time(0, 0)).replace(tzinfo=MST) < end:
+        days.append(days[-1] + datetime.timedelta(days=1))
+    return days
+
+
+class CalendarSnapshot:
+    """
+    In-memory copy of one calendar over the planning horizon, indexed by day.
+
+    The whole horizon is loaded with a single paginated events().list call, so
+    free-slot lookups, duplicate detection and the AI calendar context all read
+    from memory instead of querying the API per task or per day.
+
+    When an EventStore (see event_store.py) is given, load() refreshes it with
+    an incremental sync and the horizon is read from the local copy instead.
+    """
+
+    def __init__(self, service, calendar_id, start_date=None, horizon_days=PLANNING_HORIZON_DAYS, store=None):
+        self.service = service
+        self.calendar_id = calendar_id
+        self.store = store
+        self.horizon_days = horizon_days
+        start_date = start_date or datetime.datetime.now(tz=MST).date()
+        self.time_min = datetime.datetime.combine(start_date, datetime.time(0, 0)).replace(tzinfo=MST)
+        self.time_max = self.time_min
+        self.api_calls = 0
+        self._events = {}   # event id -> (start, end, event)
+        self._by_day = {}   # date -> sorted list of (start, end, event id)
+        self._local_ids = itertools.count(1)
+
+    @instrumentation.traced("calendar_snapshot.load")
+    def load(self):
+        if self.store is not None:
+            api_calls, _ = self.store.sync(self.service, self.calendar_id)
+            self.api_calls += api_calls
+        self._fetch(self.time_min, self.time_min + datetime.timedelta(days=self.horizon_days))
+        print(f"🔍 Loaded {len(self._events)} events for {self.horizon_days} days "
+              f"({self.api_calls} API calls).")
+        return self
+
+    def _fetch(self, time_min, time_max):
+        if self.store is not None:
+            for event in self.store.load(self.calendar_id, time_min, time_max):
+                if event["id"] not in self._events:
+                    self.add_event(event)
+            self.time_max = max(self.time_max, time_max)
+            return
+        page_token = None
+        while True:
+            request = self.service.events().list(
+                calendarId=self.calendar_id,
+                timeMin=time_min.isoformat(),
+                timeMax=time_max.isoformat(),
+                singleEvents=True,
+                orderBy="startTime",
+                maxResults=PAGE_SIZE,
+                pageToken=page_token,
+            )
+            events_result = rate_limit.call("calendar", request.execute)
+            self.api_calls += 1
+            instrumentation.count("api_requests", service="calendar", endpoint="events.list")
+            for event in events_result.get("items", []):
+                self.add_event(event)
+            page_token = events_result.get("nextPageToken")
+            if not page_token:
+                break
+        self.time_max = max(self.time_max, time_max)
+
+    def refresh(self):
+        """
+        Applies calendar changes made since load() (or the last refresh) and
+        returns the set of days whose events changed. With an EventStore only
+        the events changed since the last sync are re-indexed; otherwise the
+        covered range is fetched again and compared.
+        """
+        changed_days = set()
+        if self.store is None:
+            previous = self._events
+            self._events, self._by_day = {}, {}
+            self._fetch(self.time_min, self.time_max)
+            for event_id in set(previous) | set(self._events):
+                before, after = previous.get(event_id), self._events.get(event_id)
+                if before is not None and event_id.startswith("local-") and after is None:
+                    # Keep blocks reserved locally (e.g. DRY_RUN inserts) across refreshes
+                    self._events[event_id] = before
+                    for day in days_spanned(before[0], before[1]):
+                        bisect.insort(self._by_day.setdefault(day, []), (before[0], before[1], event_id))
+                    continue
+                if before is None or after is None or before[2] != after[2]:
+                    for entry in (before, after):
+                        if entry is not None:
+                            changed_days.update(days_spanned(entry[0], entry[1]))
+            return changed_days
+
+        api_calls, changed = self.store.sync(self.service, self.calendar_id)
+        self.api_calls += api_calls
+        for event in changed:
+            entry = self._events.get(event["id"])
+            if entry is not None:
+                changed_days.update(days_spanned(entry[0], entry[1]))
+                self.remove_event(event["id"])
+            if event.get("status") == "cancelled":
+                continue
+            try:
+                start, end = parse_event_times(event)
+            except Exception:
+                continue
+            if start < self.time_max and end > self.time_min:
+                self.add_event(event)
+                changed_days.update(days_spanned(start, end))
+        return changed_days
+
+    def _ensure_covered(self, until):
+        # Planning past the horizon extends the snapshot by another horizon in one fetch.
+        if until > self.time_max:
+            new_max = max(until, self.time_max + datetime.timedelta(days=self.horizon_days))
+            self._fetch(self.time_max, new_max)
+
+    def add_event(self, event):
+        """
+        Indexes an event (fetched or newly inserted) under every day it overlaps.
+        Returns the id it was stored under.
+        """
+        try:
+            start, end = parse_event_times(event)
+        except Exception as e:
+            print(f"❌ Error parsing event times: {e}")
+            return
+        event_id = event.get("id")
+        if not event_id:
+            # Local reservation (not on the calendar yet): keep its id on the event for later lookups
+            event_id = f"local-{next(self._local_ids)}"
+            event = {**event, "id": event_id}
+        if event_id in self._events:
+            self.remove_event(event_id)
+        self._events[event_id] = (start, end, event)
+        for day in days_spanned(start, end):
+            bisect.insort(self._by_day.setdefault(day, []), (start, end, event_id))
+        return event_id
+
+    def remove_event(self, event_id):
+        entry = self._events.pop(event_id, None)
+        if entry is None:
+            return
+        start, end, _ = entry
+        for day_events in self._by_day.values():
+            if (start, end, event_id) in day_events:
+                day_events.remove((start, end, event_id))
+
+    def busy_intervals_for_day(self, day_date, exclude=()):
+        """Returns sorted (start, end) pairs for events overlapping the given day, skipping ids in `exclude`."""
+        day_end = datetime.datetime.combine(day_date + datetime.timedelta(days=1), datetime.time(0, 0)).replace(tzinfo=MST)
+        self._ensure_covered(day_end)
+        return [(start, end) for start, end, event_id in self._by_day.get(day_date, []) if event_id not in exclude]
+
+    def events_between(self, start, end):
+        """Returns events overlapping [start, end), ordered by start time."""
+        self._ensure_covered(end)
+        matches = [entry for entry in self._events.values() if entry[0] < end and entry[1] > start]
+        return [event for _, _, event in sorted(matches, key=lambda entry: entry[0])]
+
+    def entries_after(self, after):
+        """Returns (start, end, event) for every event ending after `after`, ordered by start time."""
+        return sorted((entry for entry in self._events.values() if entry[1] > after), key=lambda entry: entry[0])
+
+    def has_event(self, event_id):
+        return event_id in self._events
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+import time
+
+from common import instrumentation, rate_limit
+
+# Calendar API limit on calls per batch request
+BATCH_LIMIT = 50
+
+
+class CalendarWriteBatch:
+    """
+    Queues event inserts, patches and deletes for one calendar and sends them
+    as googleapiclient batch requests of up to BATCH_LIMIT calls each.
+
+    Every queued write takes an optional `on_done(response, error)` callback so
+    callers still get per-item success/failure once the batch has run.
+
+    Inserts whose body carries its own event id are idempotent: a 409 means an
+    earlier attempt already created the event and counts as success.
+    """
+
+    def __init__(self, service, calendar_id, batch_size=BATCH_LIMIT):
+        self.service = service
+        self.calendar_id = calendar_id
+        self.batch_size = min(batch_size, BATCH_LIMIT)
+        self.api_calls = 0
+        self._pending = []
+
+    def __len__(self):
+        return len(self._pending)
+
+    def insert(self, body, on_done=None):
+        request = self.service.events().insert(calendarId=self.calendar_id, body=body)
+        self._pending.append(("insert", request, on_done, body.get("id"), body))
+
+    def patch(self, event_id, body, on_done=None):
+        request = self.service.events().patch(calendarId=self.calendar_id, eventId=event_id, body=body)
+        self._pending.append(("patch", request, on_done, event_id, body))
+
+    def delete(self, event_id, on_done=None):
+        request = self.service.events().delete(calendarId=self.calendar_id, eventId=event_id)
+        self._pending.append(("delete", request, on_done, event_id, None))
+
+    @instrumentation.traced("calendar_writer.flush")
+    def flush(self):
+        """
+        Sends every queued write and returns a list of
+        {"op", "event_id", "ok", "response", "error"} results in queue order
+        (event_id is None for inserts that let Google pick the id).
+
+        Items the API throttled or failed transiently inside a batch are resent
+        in a later batch (with backoff) up to rate_limit.MAX_RETRIES times;
+        on_done only sees each item's final outcome.
+        """
+        pending, self._pending = self._pending, []
+        results = [None] * len(pending)
+        limiter = rate_limit.get_limiter("calendar")
+        batches = 0
+        attempt = 0
+        retry = []
+        throttle = {}
+
+        def finish(index, response, exception):
+            op, _, on_done, event_id, body = pending[index]
+            if op == "insert" and event_id and exception is not None and rate_limit.http_status(exception) == 409:
+                response, exception = body, None
+            results[index] = {"op": op, "event_id": event_id, "ok": exception is None, "response": response,
+                              "error": exception}
+            instrumentation.count("calendar_writes", op=op, result="ok" if exception is None else "failed")
+            if on_done:
+                on_done(response, exception)
+
+        def callback(request_id, response, exception):
+            index = int(request_id)
+            if exception is not None and attempt < rate_limit.MAX_RETRIES:
+                retryable, throttled, retry_after = rate_limit.classify_error(exception)
+                if retryable:
+                    retry.append(index)
+                    if throttled:
+                        throttle["retry_after"] = max(throttle.get("retry_after") or 0, retry_after or 0)
+                    return
+            finish(index, response, exception)
+
+        queue = list(range(len(pending)))
+        while queue:
+            for offset in range(0, len(queue), self.batch_size):
+                chunk = queue[offset:offset + self.batch_size]
+                batch = self.service.new_batch_http_request(callback=callback)
+                for index in chunk:
+                    batch.add(pending[index][1], request_id=str(index))
+                throttle.clear()
+                # Google counts every call inside a batch against the quota, not the batch itself
+                limiter.acquire(len(chunk))
+                try:
+                    batch.execute()
+                except Exception as e:
+                    # The whole batch failed to send; report it against every item that has no outcome yet.
+                    for index in chunk:
+                        if results[index] is None and index not in retry:
+                            callback(str(index), None, e)
+                limiter.release("retry_after" in throttle, throttle.get("retry_after"))
+                batches += 1
+                instrumentation.count("api_requests", service="calendar", endpoint="batch")
+            if retry:
+                delay = rate_limit.backoff_delay(attempt)
+                instrumentation.count("api_retries", len(retry), service="calendar")
+                print(f"⏳ Resending {len(retry)} throttled calendar writes in {delay:.1f}s.")
+                time.sleep(delay)
+            queue, retry = sorted(retry), []
+            attempt += 1
+        self.api_calls += batches
+
+        if results:
+            failed = sum(1 for result in results if not result["ok"])
+            print(f"📤 Sent {len(results)} calendar writes in {batches} batch requests "
+                  f"({len(results) - failed} succeeded, {failed} failed).")
+        return results
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+import datetime
+import json
+import os
+import sqlite3
+
+from calendar_snapshot import MST, PAGE_SIZE, parse_event_times
+from common import instrumentation, rate_limit
+
+# Local copy of the calendar, refreshed incrementally with the Calendar API syncToken
+EVENT_STORE_PATH = os.getenv("SCHEDULER_EVENT_STORE_PATH", "/home/moneybot/scheduler/googlecal/event_cache.db")
+# Events that ended longer ago than this are pruned from the local copy
+RETENTION_DAYS = 7
+# Seconds a connection waits for another connection's write to finish
+BUSY_TIMEOUT_SECONDS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    calendar_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    start_ts REAL NOT NULL,
+    end_ts REAL NOT NULL,
+    body TEXT NOT NULL,
+    PRIMARY KEY (calendar_id, event_id)
+);
+CREATE INDEX IF NOT EXISTS events_by_start ON events (calendar_id, start_ts);
+CREATE INDEX IF NOT EXISTS events_by_end ON events (calendar_id, end_ts);
+CREATE TABLE IF NOT EXISTS sync_state (
+    calendar_id TEXT PRIMARY KEY,
+    sync_token TEXT,
+    synced_at TEXT
+);
+"""
+
+
+def connect(path, schema):
+    """
+    Opens the SQLite database at `path` and creates `schema` in it.
+    Per-calendar worker threads each open their own connection, so writers
+    wait out each other's transactions instead of failing.
+    """
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS)
+    conn.executescript(schema)
+    return conn
+
+
+class EventStore:
+    """
+    SQLite copy of the events on one or more calendars.
+
+    sync() refreshes a calendar through the Calendar API's incremental syncToken
+    (falling back to a full resync when Google answers 410 Gone); load() answers
+    time-range queries from the local copy without touching the network.
+    """
+
+    def __init__(self, path=EVENT_STORE_PATH):
+        self.conn = connect(path, SCHEMA)
+
+    def _apply_change(self, calendar_id, event):
+        if event.get("status") == "cancelled":
+            self.conn.execute("DELETE FROM events WHERE calendar_id = ? AND event_id = ?", (calendar_id, event["id"]))
+            return
+        try:
+            start, end = parse_event_times(event)
+        except Exception as e:
+            print(f"❌ Error parsing event times: {e}")
+            return
+        self.conn.execute(
+            "INSERT OR REPLACE INTO events (calendar_id, event_id, start_ts, end_ts, body) VALUES (?, ?, ?, ?, ?)",
+            (calendar_id, event["id"], start.timestamp(), end.timestamp(), json.dumps(event)),
+        )
+
+    def _list_all(self, service, calendar_id, sync_token):
+        """
+        Pages through events().list, applying each change to the store.
+        Returns (next sync token, API calls, changed events).
+        """
+        page_token = None
+        api_calls = 0
+        changed = []
+        while True:
+            params = {"calendarId": calendar_id, "singleEvents": True, "maxResults": PAGE_SIZE, "pageToken": page_token}
+            if sync_token:
+                params["syncToken"] = sync_token
+            events_result = rate_limit.call("calendar", service.events().list(**params).execute)
+            api_calls += 1
+            instrumentation.count("api_requests", service="calendar", endpoint="events.list")
+            for event in events_result.get("items", []):
+                self._apply_change(calendar_id, event)
+                changed.append(event)
+            page_token = events_result.get("nextPageToken")
+            if not page_token:
+                return events_result.get("nextSyncToken"), api_calls, changed
+
+    @instrumentation.traced("event_store.sync")
+    def sync(self, service, calendar_id):
+        """
+        Brings the local copy of `calendar_id` up to date.
+        Returns (API calls, changed events).
+        """
+        from googleapiclient.errors import HttpError
+
+        conn = self.conn
+        row = conn.execute("SELECT sync_token FROM sync_state WHERE calendar_id = ?", (calendar_id,)).fetchone()
+        sync_token = row[0] if row else None
+        try:
+            with conn:
+                next_token, api_calls, changed = self._list_all(service, calendar_id, sync_token)
+        except HttpError as e:
+            if sync_token is None or e.resp.status != 410:
+                raise
+            print("ℹ️ Calendar sync token expired. Running a full resync.")
+            sync_token = None
+            with conn:
+                conn.execute("DELETE FROM events WHERE calendar_id = ?", (calendar_id,))
+                next_token, api_calls, changed = self._list_all(service, calendar_id, None)
+            api_calls += 1
+
+        cutoff = datetime.datetime.now(tz=MST) - datetime.timedelta(days=RETENTION_DAYS)
+        with conn:
+            conn.execute("DELETE FROM events WHERE calendar_id = ? AND end_ts < ?", (calendar_id, cutoff.timestamp()))
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (calendar_id, sync_token, synced_at) VALUES (?, ?, ?)",
+                (calendar_id, next_token, datetime.datetime.now(tz=MST).isoformat()),
+            )
+        kind = "Incremental" if sync_token else "Full"
+        instrumentation.count("cache_requests", cache="calendar_sync_token", result="hit" if sync_token else "miss")
+        print(f"🔄 {kind} calendar sync: {len(changed)} changed events ({api_calls} API calls).")
+        return api_calls, changed
+
+    def load(self, calendar_id, time_min, time_max):
+        """Returns stored events overlapping [time_min, time_max), ordered by start time."""
+        rows = self.conn.execute(
+            "SELECT body FROM events WHERE calendar_id = ? AND start_ts < ? AND end_ts > ? ORDER BY start_ts",
+            (calendar_id, time_max.timestamp(), time_min.timestamp()),
+        )
+        return [json.loads(body) for (body,) in rows]
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+import datetime
+import heapq
+import random
+import time
+
+from planner import FAR_FUTURE, MST, PRIORITY_MAP, WORK_END, parse_due, task_key
+
+# Wall-clock budget for searching task orders in optimize mode
+OPTIMIZE_TIME_BUDGET = 2.0
+# Upper bound on orders tried, whatever the time budget
+OPTIMIZE_MAX_ATTEMPTS = 200
+# Spread (in hours) of the random deadline perturbation used to explore other orders
+JITTER_HOURS = 24
+
+
+def task_deadline(task):
+    """Due datetime for a task; a date-only due means the end of that working day."""
+    due = task.get("due")
+    parsed = parse_due(due)
+    if parsed is FAR_FUTURE:
+        return None
+    if isinstance(due, str) and "T" not in due:
+        parsed = datetime.datetime.combine(parsed.date(), WORK_END).replace(tzinfo=MST)
+    return parsed
+
+
+def dependency_ids(task):
+    return [dep.strip() for dep in (task.get("dependencies") or "").split(",") if dep.strip()]
+
+
+def dependency_order(tasks, sort_key):
+    """
+    Topologically orders tasks so every task follows the tasks it depends on,
+    picking the smallest `sort_key` among the ready tasks at each step.
+    Dependencies outside `tasks` (done or unknown pages) are ignored; tasks
+    caught in a cycle are appended in `sort_key` order.
+    """
+    by_key = {task_key(task): task for task in tasks}
+    blockers = {key: {dep for dep in dependency_ids(task) if dep in by_key and dep != key}
+                for key, task in by_key.items()}
+    dependents = {key: [] for key in by_key}
+    for key, deps in blockers.items():
+        for dep in deps:
+            dependents[dep].append(key)
+
+    ready = [(sort_key(task), seq, task_key(task)) for seq, task in enumerate(tasks) if not blockers[task_key(task)]]
+    heapq.heapify(ready)
+    seq_of = {task_key(task): seq for seq, task in enumerate(tasks)}
+    order = []
+    while ready:
+        _, _, key = heapq.heappop(ready)
+        order.append(by_key[key])
+        for dependent in dependents[key]:
+            blockers[dependent].discard(key)
+            if not blockers[dependent]:
+                heapq.heappush(ready, (sort_key(by_key[dependent]), seq_of[dependent], dependent))
+
+    if len(order) < len(by_key):
+        placed = {task_key(task) for task in order}
+        cyclic = sorted((task for task in tasks if task_key(task) not in placed), key=sort_key)
+        print(f"⚠️ Dependency cycle among {len(cyclic)} tasks; ordering them by deadline.")
+        order.extend(cyclic)
+    return order
+
+
+def booked_finish(fixed):
+    """Maps task key -> end of its last block among `fixed` chunks."""
+    finish = {}
+    for chunk in fixed:
+        key = task_key(chunk["task"])
+        finish[key] = max(finish.get(key, chunk["end"]), chunk["end"])
+    return finish
+
+
+def pack(order, ledger, fixed=()):
+    """
+    Places tasks in `order`, each no earlier than the end of its dependencies.
+    A task goes into a single unbroken block that meets its deadline when one
+    exists, otherwise into the earliest chunks available. `fixed` chunks are
+    blocks already on the calendar: a dependency's booked blocks count towards
+    when it finishes. Mutates `ledger`. Returns (chunks, unplaced) like
+    planner.plan_tasks.
+    """
+    chunks = []
+    unplaced = {}
+    finish = booked_finish(fixed)
+    blocked = set()
+    for task in order:
+        minutes = int(round(float(task.get("build_time") or 0) * 60))
+        if minutes <= 0:
+            continue
+        deps = [dep for dep in dependency_ids(task) if dep in finish or dep in blocked]
+        if any(dep in blocked for dep in deps):
+            # A dependency did not fit, so this task cannot start inside the horizon either
+            unplaced[task_key(task)] = minutes / 60.0
+            blocked.add(task_key(task))
+            continue
+        not_before = max((finish[dep] for dep in deps), default=None)
+
+        block = ledger.allocate_whole(minutes, not_before, task_deadline(task))
+        if block is not None:
+            chunks.append({"task": task, "start": block[0], "end": block[1]})
+            finish[task_key(task)] = max(finish.get(task_key(task), block[1]), block[1])
+            continue
+
+        remaining = minutes
+        end = None
+        while remaining > 0:
+            block = ledger.allocate(remaining, not_before)
+            if block is None:
+                unplaced[task_key(task)] = remaining / 60.0
+                blocked.add(task_key(task))
+                break
+            chunks.append({"task": task, "start": block[0], "end": block[1]})
+            remaining -= int((block[1] - block[0]).total_seconds() // 60)
+            end = block[1]
+        if remaining <= 0:
+            finish[task_key(task)] = max(finish.get(task_key(task), end), end)
+    return chunks, unplaced
+
+
+def plan_metrics(tasks, chunks, unplaced, capacity_minutes):
+    """
+    Lateness, fragmentation, dependency and utilization figures for a plan,
+    so greedy and optimize mode results can be compared.
+    """
+    finish = {}
+    start = {}
+    blocks = {}
+    for chunk in chunks:
+        key = task_key(chunk["task"])
+        finish[key] = max(finish.get(key, chunk["end"]), chunk["end"])
+        start[key] = min(start.get(key, chunk["start"]), chunk["start"])
+        blocks[key] = blocks.get(key, 0) + 1
+
+    late = 0
+    total_lateness = 0.0
+    max_lateness = 0.0
+    violations = 0
+    keys = {task_key(task) for task in tasks}
+    for task in tasks:
+        key = task_key(task)
+        deadline = task_deadline(task)
+        if deadline is not None and key in unplaced:
+            # Not finished inside the horizon: a miss, with lateness unknown
+            late += 1
+        elif deadline is not None and key in finish and finish[key] > deadline:
+            hours = (finish[key] - deadline).total_seconds() / 3600.0
+            late += 1
+            total_lateness += hours
+            max_lateness = max(max_lateness, hours)
+        for dep in dependency_ids(task):
+            if key in start and dep in keys and (dep not in finish or finish[dep] > start[key]):
+                violations += 1
+
+    scheduled = sum((chunk["end"] - chunk["start"]).total_seconds() / 60.0 for chunk in chunks)
+    return {
+        "tasks": len(tasks),
+        "scheduled_hours": round(scheduled / 60.0, 2),
+        "unplaced_tasks": len(unplaced),
+        "unplaced_hours": round(sum(unplaced.values()), 2),
+        "late_tasks": late,
+        "total_lateness_hours": round(total_lateness, 2),
+        "max_lateness_hours": round(max_lateness, 2),
+        "fragments": sum(count - 1 for count in blocks.values()),
+        "dependency_violations": violations,
+        "utilization": round(scheduled / capacity_minutes, 3) if capacity_minutes else 0.0,
+    }
+
+
+def _score(metrics):
+    return (metrics["late_tasks"], metrics["total_lateness_hours"], metrics["unplaced_hours"], metrics["fragments"])
+
+
+def optimize_plan(tasks, ledger, time_budget=OPTIMIZE_TIME_BUDGET, seed=0, fixed=()):
+    """
+    Searches dependency-respecting task orders for the plan with the fewest
+    deadline misses, then the least lateness and fragmentation, within
+    `time_budget` seconds. Starts from earliest-deadline-first and
+    priority-first orders, then tries randomly perturbed deadlines.
+    Each order is packed into a copy of `ledger`, which is left untouched.
+    `fixed` chunks are blocks already booked (see pack); they bound when
+    their tasks' dependents may start and count towards lateness.
+    Returns (chunks, unplaced), without the fixed chunks.
+    """
+    fixed = list(fixed)
+    rng = random.Random(seed)
+    capacity = ledger.capacity_minutes()
+    far = FAR_FUTURE.timestamp()
+
+    def deadline_ts(task):
+        deadline = task_deadline(task)
+        return deadline.timestamp() if deadline else far
+
+    def priority(task):
+        return -PRIORITY_MAP.get(task.get("priority"), 0)
+
+    strategies = [
+        lambda task: (deadline_ts(task), priority(task)),
+        lambda task: (priority(task), deadline_ts(task)),
+    ]
+    started = time.monotonic()
+    best = None
+    attempts = 0
+    while attempts < OPTIMIZE_MAX_ATTEMPTS:
+        if attempts < len(strategies):
+            sort_key = strategies[attempts]
+        else:
+            if time.monotonic() - started > time_budget:
+                break
+            jitter = {task_key(task): rng.gauss(0, JITTER_HOURS * 3600) for task in tasks}
+            sort_key = lambda task, jitter=jitter: (deadline_ts(task) + jitter[task_key(task)], priority(task))
+        trial = ledger.copy()
+        chunks, unplaced = pack(dependency_order(tasks, sort_key), trial, fixed)
+        score = _score(plan_metrics(tasks, fixed + chunks, unplaced, capacity))
+        if best is None or score < best[0]:
+            best = (score, chunks, unplaced)
+        attempts += 1
+
+    _, chunks, unplaced = best
+    print(f"🧠 Optimizer tried {attempts} orders in {time.monotonic() - started:.2f}s.")
+    return chunks, unplaced
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+import bisect
+import datetime
+import heapq
+import re
+from dateutil import parser as dt_parser
+from dateutil import tz
+
+# Time zone for MST
+MST = tz.gettz("America/Phoenix")
+# Working hours and lunch break
+WORK_START = datetime.time(9, 0)
+WORK_END = datetime.time(17, 0)
+LUNCH_START = datetime.time(12, 0)
+LUNCH_END = datetime.time(13, 0)
+# Maximum scheduling per day in hours
+DAILY_MAX_HOURS = 6.5
+# Free gaps shorter than this are not worth a calendar block
+MIN_CHUNK_MINUTES = 15
+
+PRIORITY_MAP = {
+    "🔹 High": 3,
+    "High": 3,
+    "🔹 Medium": 2,
+    "Medium": 2,
+    "🔹 No Priority": 1,
+    "No Priority": 1
+}
+
+FAR_FUTURE = datetime.datetime.max.replace(tzinfo=MST)
+# Notion page URLs end in the page id without dashes
+NOTION_URL_ID = re.compile(r"([0-9a-f]{32})(?:[?#]|$)")
+
+
+def get_next_weekday(date):
+    while date.weekday() >= 5:
+        date += datetime.timedelta(days=1)
+    return date
+
+
+def parse_due(value):
+    """Parses a task's due date; missing or unparseable dues sort last."""
+    if isinstance(value, datetime.datetime):
+        return value if value.tzinfo else value.replace(tzinfo=MST)
+    try:
+        due = dt_parser.isoparse(value)
+    except (TypeError, ValueError):
+        return FAR_FUTURE
+    return due if due.tzinfo else due.replace(tzinfo=MST)
+
+
+def page_id_from_url(url):
+    match = NOTION_URL_ID.search(url or "")
+    if match is None:
+        return None
+    hex_id = match.group(1)
+    return f"{hex_id[:8]}-{hex_id[8:12]}-{hex_id[12:16]}-{hex_id[16:20]}-{hex_id[20:]}"
+
+
+def task_key(task):
+    """Identity of a task across runs: its Notion page id, else the id in its URL, else its name."""
+    return task.get("id") or page_id_from_url(task.get("url")) or task["name"]
+
+
+def task_sort_key(task):
+    """Highest priority first, then earliest due date."""
+    return (-PRIORITY_MAP.get(task.get("priority"), 0), parse_due(task.get("due")))
+
+
+def free_slots(day_date, busy_intervals):
+    """
+    Returns the free {"start", "end"} slots inside working hours for one day,
+    given the sorted (start, end) busy intervals overlapping it. Lunch is never free.
+    """
+    start_of_day = datetime.datetime.combine(day_date, WORK_START).replace(tzinfo=MST)
+    end_of_day = datetime.datetime.combine(day_date, WORK_END).replace(tzinfo=MST)
+
+    slots = []
+    last_end = start_of_day
+    for event_start, event_end in busy_intervals:
+        if event_end <= start_of_day or event_start >= end_of_day:
+            continue
+        if last_end < event_start:
+            slots.append({"start": last_end, "end": event_start})
+        last_end = max(last_end, event_end)
+
+    if last_end < end_of_day:
+        slots.append({"start": last_end, "end": end_of_day})
+
+    lunch_start = datetime.datetime.combine(day_date, LUNCH_START).replace(tzinfo=MST)
+    lunch_end = datetime.datetime.combine(day_date, LUNCH_END).replace(tzinfo=MST)
+    slots_adjusted = []
+    for slot in slots:
+        if slot["end"] <= lunch_start or slot["start"] >= lunch_end:
+            slots_adjusted.append(slot)
+        else:
+            if slot["start"] < lunch_start:
+                slots_adjusted.append({"start": slot["start"], "end": lunch_start})
+            if slot["end"] > lunch_end:
+                slots_adjusted.append({"start": lunch_end, "end": slot["end"]})
+    return slots_adjusted
+
+
+class CapacityLedger:
+    """
+    Free intervals and remaining DAILY_MAX_HOURS capacity for every working day
+    over the horizon. Built once from a CalendarSnapshot, then updated purely in
+    memory as chunks are allocated.
+    """
+
+    def __init__(self, days, free, capacity):
+        self.days = days            # ordered working days
+        self.free = free            # day -> sorted list of [start, end]
+        self.capacity = capacity    # day -> remaining minutes
+        self._first_open = 0        # days before this index are full
+
+    @classmethod
+    def from_snapshot(cls, snapshot, horizon_days=None, now=None, daily_max_hours=DAILY_MAX_HOURS, exclude=(),
+                      booked=()):
+        """
+        `exclude` holds event ids to treat as free (e.g. blocks about to be
+        reconciled); `booked` holds ids of events that stay busy and also use
+        up their day's capacity (e.g. blocks of tasks not being replanned).
+        """
+        now = now or datetime.datetime.now(tz=MST)
+        horizon_days = horizon_days or snapshot.horizon_days
+        days, free, capacity = [], {}, {}
+        for offset in range(horizon_days):
+            day = now.date() + datetime.timedelta(days=offset)
+            if day.weekday() >= 5:
+                continue
+            slots = []
+            for slot in free_slots(day, snapshot.busy_intervals_for_day(day, exclude)):
+                start = max(slot["start"], now)
+                if slot["end"] > start:
+                    slots.append([start, slot["end"]])
+            days.append(day)
+            free[day] = slots
+            capacity[day] = int(daily_max_hours * 60)
+        if booked:
+            for start, end, event in snapshot.entries_after(now):
+                day = start.date()
+                if event.get("id") in booked and day in capacity:
+                    capacity[day] -= int((end - max(start, now)).total_seconds() // 60)
+        return cls(days, free, capacity)
+
+    def copy(self):
+        ledger = CapacityLedger(list(self.days), {day: [list(s) for s in slots] for day, slots in self.free.items()},
+                                dict(self.capacity))
+        ledger._first_open = self._first_open
+        return ledger
+
+    def allocate(self, minutes, not_before=None, min_minutes=MIN_CHUNK_MINUTES):
+        """
+        Books the earliest block of up to `minutes` (at least `min_minutes`, or
+        all of `minutes` when that is smaller) starting no earlier than `not_before`.
+        Returns (start, end) or None when nothing fits in the horizon.
+        """
+        needed = min(minutes, min_minutes)
+        for index in range(self._first_open, len(self.days)):
+            day = self.days[index]
+            if not_before is not None and day < not_before.date():
+                continue
+            if self.capacity[day] < needed:
+                continue
+            for slot in self.free[day]:
+                start = slot[0] if not_before is None else max(slot[0], not_before)
+                length = int((slot[1] - start).total_seconds() // 60)
+                if length < needed:
+                    continue
+                booked = min(minutes, length, self.capacity[day])
+                end = start + datetime.timedelta(minutes=booked)
+                self._book(day, start, end)
+                return start, end
+        return None
+
+    def allocate_whole(self, minutes, not_before=None, deadline=None):
+        """
+        Books the earliest single block of exactly `minutes` that starts no
+        earlier than `not_before` and ends by `deadline`. Returns (start, end)
+        or None when no unfragmented block fits.
+        """
+        for index in range(self._first_open, len(self.days)):
+            day = self.days[index]
+            if deadline is not None and day > deadline.date():
+                break
+            if (not_before is not None and day < not_before.date()) or self.capacity[day] < minutes:
+                continue
+            for slot in self.free[day]:
+                start = slot[0] if not_before is None else max(slot[0], not_before)
+                end = start + datetime.timedelta(minutes=minutes)
+                if end > slot[1]:
+                    continue
+                if deadline is not None and end > deadline:
+                    return None
+                self._book(day, start, end)
+                return start, end
+        return None
+
+    def fits(self, start, end):
+        """True when [start, end) lies inside one free slot of a working day with capacity to spare."""
+        day = start.date()
+        if day not in self.free or self.capacity[day] < int((end - start).total_seconds() // 60):
+            return False
+        return any(slot_start <= start and end <= slot_end for slot_start, slot_end in self.free[day])
+
+    def reserve(self, start, end):
+        """Marks an existing block (e.g. an event we keep) as used."""
+        self._book(start.date(), start, end)
+
+    def release(self, start, end):
+        """Returns a reserved block (e.g. a held event that is no longer needed) to the free time."""
+        day = start.date()
+        if day not in self.free:
+            return
+        merged = []
+        for slot in sorted(self.free[day] + [[start, end]]):
+            if merged and slot[0] <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], slot[1])
+            else:
+                merged.append(list(slot))
+        self.free[day] = merged
+        self.capacity[day] += int((end - start).total_seconds() // 60)
+        self._first_open = min(self._first_open, bisect.bisect_left(self.days, day))
+
+    def _book(self, day, start, end):
+        if day not in self.free:
+            return
+        slots = []
+        for slot_start, slot_end in self.free[day]:
+            if slot_end <= start or slot_start >= end:
+                slots.append([slot_start, slot_end])
+                continue
+            if slot_start < start:
+                slots.append([slot_start, start])
+            if slot_end > end:
+                slots.append([end, slot_end])
+        self.free[day] = slots
+        self.capacity[day] -= int((end - start).total_seconds() // 60)
+        while self._first_open < len(self.days):
+            first = self.days[self._first_open]
+            if self.capacity[first] > 0 and self.free[first]:
+                break
+            self._first_open += 1
+
+    def capacity_minutes(self):
+        """Total bookable minutes left (free time capped by daily capacity)."""
+        total = 0
+        for day in self.days:
+            free = sum(int((end - start).total_seconds() // 60) for start, end in self.free[day])
+            total += max(0, min(free, self.capacity[day]))
+        return total
+
+
+def plan_tasks(tasks, ledger):
+    """
+    Assigns task chunks to the ledger in priority order (priority, then parsed
+    due date). Returns (chunks, unplaced) where chunks are
+    {"task", "start", "end"} dicts and unplaced maps task keys (see task_key) to the hours
+    that did not fit in the horizon. Does no I/O.
+    """
+    queue = []
+    for seq, task in enumerate(tasks):
+        minutes = int(round(float(task.get("build_time") or 0) * 60))
+        if minutes > 0:
+            queue.append((task_sort_key(task), seq, minutes, task))
+    heapq.heapify(queue)
+
+    chunks = []
+    unplaced = {}
+    while queue:
+        key, seq, minutes, task = heapq.heappop(queue)
+        block = ledger.allocate(minutes)
+        if block is None:
+            unplaced[task_key(task)] = minutes / 60.0
+            continue
+        start, end = block
+        chunks.append({"task": task, "start": start, "end": end})
+        remaining = minutes - int((end - start).total_seconds() // 60)
+        if remaining > 0:
+            heapq.heappush(queue, (key, seq, remaining, task))
+    return chunks, unplaced
@@ -1,52 +1,248 @@
-from googleapiclient.discovery import build
-from google.oauth2.service_account import Credentials
+#!/usr/bin/env python3
+"""
+Availability queries across calendars and weeks.
+
+Busy time is held as per-minute occupancy bitmaps: one numpy row per
+calendar and one column per minute of the horizon from midnight MST today,
+each holding how many events cover that minute. Free-window, overlap and
+earliest-fit questions then come down to a few vectorized array operations
+over the rows involved, instead of walking events one by one:
+
+    python googlecal/query_calendar.py free --calendars Ann,Bob --min-minutes 60
+    python googlecal/query_calendar.py fit --calendars Ann,Bob,Cat --minutes 120 --weeks 6
+    python googlecal/query_calendar.py overlap --calendars Ann,Bob
+
+Calendars are given by id or by assignee name (see SCHEDULER_ASSIGNEE_CALENDARS).
+Working hours and lunch match the planner. America/Phoenix has no DST, so a
+minute offset maps to one wall-clock minute.
+"""
+import argparse
+import contextlib
 import datetime
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from dateutil import parser as dt_parser
+
+import repo_path  # noqa: F401  (must precede the common imports)
+from calendar_snapshot import MST, CalendarSnapshot
+from event_store import EventStore
+from planner import LUNCH_END, LUNCH_START, MIN_CHUNK_MINUTES, WORK_END, WORK_START
+from scheduler_config import CALENDAR_ID, MAX_CALENDAR_WORKERS, USE_EVENT_STORE, load_assignee_calendars
+from common.clients import get_calendar_service
+
+# How far ahead the CLI loads and queries
+DEFAULT_HORIZON_WEEKS = 6
+# Earliest-fit starts are rounded up to a multiple of this many minutes past midnight
+DEFAULT_ALIGN_MINUTES = 15
+MINUTES_PER_DAY = 24 * 60
+
+
+def _minute_of_day(value):
+    return value.hour * 60 + value.minute
+
+
+class AvailabilityIndex:
+    """
+    Per-minute occupancy of a set of calendars over `days` days from `start`
+    (midnight MST). Rows are added with add_calendar(); every query takes the
+    calendar ids to combine and returns (start, end) datetime windows.
+    Building a row costs O(events + minutes); queries are O(calendars x minutes)
+    in numpy.
+    """
+
+    def __init__(self, start, days):
+        self.start = start
+        self.days = days
+        self.minutes = days * MINUTES_PER_DAY
+        self.occupancy = {}  # calendar id -> uint8 events-per-minute row
+        self._working = {}
+
+    @classmethod
+    def from_snapshots(cls, snapshots, days=None):
+        """Builds the index from loaded CalendarSnapshots that share a start date."""
+        index = cls(snapshots[0].time_min, days or snapshots[0].horizon_days)
+        for snapshot in snapshots:
+            index.add_calendar(snapshot.calendar_id,
+                               [(start, end) for start, end, _ in snapshot.entries_after(index.start)])
+        return index
+
+    def _offset(self, value):
+        return (value - self.start).total_seconds() / 60
+
+    def _time(self, offset):
+        return self.start + datetime.timedelta(minutes=int(offset))
+
+    def add_calendar(self, calendar_id, intervals):
+        """Sets the row of `calendar_id` from its (start, end) busy intervals."""
+        base = self.start.timestamp()
+        bounds = np.array([(start.timestamp(), end.timestamp()) for start, end in intervals],
+                          dtype=np.float64).reshape(-1, 2)
+        starts = np.clip(np.floor((bounds[:, 0] - base) / 60), 0, self.minutes).astype(np.int64)
+        ends = np.clip(np.ceil((bounds[:, 1] - base) / 60), 0, self.minutes).astype(np.int64)
+        keep = ends > starts
+        # +1 where an event starts, -1 where it ends; the running sum is the occupancy
+        steps = (np.bincount(starts[keep], minlength=self.minutes + 1)
+                 - np.bincount(ends[keep], minlength=self.minutes + 1))
+        self.occupancy[calendar_id] = np.minimum(np.cumsum(steps[:-1]), np.iinfo(np.uint8).max).astype(np.uint8)
+
+    def _rows(self, calendar_ids):
+        missing = [calendar_id for calendar_id in calendar_ids if calendar_id not in self.occupancy]
+        if missing:
+            raise KeyError(f"Calendars not in the index: {', '.join(missing)}")
+        return np.stack([self.occupancy[calendar_id] for calendar_id in calendar_ids])
+
+    def _bounds(self, not_before, until):
+        lo = 0 if not_before is None else int(np.ceil(self._offset(not_before)))
+        hi = self.minutes if until is None else int(np.floor(self._offset(until)))
+        return max(lo, 0), min(hi, self.minutes)
+
+    def working_mask(self, weekends=False):
+        """True for minutes inside working hours (lunch excluded), on weekdays unless `weekends`."""
+        if weekends not in self._working:
+            minute = np.arange(MINUTES_PER_DAY)
+            day = ((minute >= _minute_of_day(WORK_START)) & (minute < _minute_of_day(WORK_END))
+                   & ~((minute >= _minute_of_day(LUNCH_START)) & (minute < _minute_of_day(LUNCH_END))))
+            workday = (self.start.weekday() + np.arange(self.days)) % 7 < 5
+            if weekends:
+                workday[:] = True
+            self._working[weekends] = (workday[:, None] & day[None, :]).ravel()
+        return self._working[weekends]
+
+    def free_mask(self, calendar_ids, working_hours=True, weekends=False):
+        """True for minutes free on every calendar in `calendar_ids` (and inside working hours)."""
+        free = ~self._rows(calendar_ids).any(axis=0)
+        if working_hours:
+            free &= self.working_mask(weekends)
+        return free
+
+    @staticmethod
+    def _runs(mask, lo, hi):
+        """(starts, ends) offsets of the runs of True in mask[lo:hi]."""
+        edges = np.flatnonzero(np.diff(np.concatenate(([False], mask[lo:hi], [False])).astype(np.int8)))
+        return edges[::2] + lo, edges[1::2] + lo
+
+    def _windows(self, starts, ends):
+        return [(self._time(start), self._time(end)) for start, end in zip(starts.tolist(), ends.tolist())]
+
+    def free_windows(self, calendar_ids, min_minutes=1, not_before=None, until=None, working_hours=True,
+                     weekends=False):
+        """Windows of at least `min_minutes` when every calendar in `calendar_ids` is free."""
+        lo, hi = self._bounds(not_before, until)
+        starts, ends = self._runs(self.free_mask(calendar_ids, working_hours, weekends), lo, hi)
+        keep = ends - starts >= min_minutes
+        return self._windows(starts[keep], ends[keep])
+
+    def earliest_fit(self, calendar_ids, minutes, not_before=None, until=None, align=1, working_hours=True,
+                     weekends=False):
+        """
+        First (start, end) block of `minutes` free on every calendar in
+        `calendar_ids`, starting a multiple of `align` minutes past midnight;
+        None when nothing fits before `until` (or the end of the horizon).
+        """
+        lo, hi = self._bounds(not_before, until)
+        starts, ends = self._runs(self.free_mask(calendar_ids, working_hours, weekends), lo, hi)
+        aligned = -(-starts // align) * align
+        fits = np.flatnonzero(aligned + minutes <= ends)
+        if not fits.size:
+            return None
+        start = aligned[fits[0]]
+        return self._time(start), self._time(start + minutes)
+
+    def overlaps(self, calendar_ids, min_events=2, not_before=None, until=None):
+        """
+        Windows when at least `min_events` events across `calendar_ids` run at
+        once: double bookings on one calendar, or people busy at the same time.
+        """
+        lo, hi = self._bounds(not_before, until)
+        count = self._rows(calendar_ids).sum(axis=0, dtype=np.int32)
+        return self._windows(*self._runs(count >= min_events, lo, hi))
+
+    def is_free(self, calendar_ids, start, end, working_hours=False, weekends=False):
+        """True when [start, end) is free on every calendar in `calendar_ids`."""
+        lo, hi = int(np.floor(self._offset(start))), int(np.ceil(self._offset(end)))
+        if lo < 0 or hi > self.minutes:
+            raise ValueError(f"{start} - {end} is outside the indexed {self.days} days")
+        return bool(self.free_mask(calendar_ids, working_hours, weekends)[lo:hi].all())
+
+
+def resolve_calendars(names, assignee_calendars=None):
+    """Maps assignee names to their calendar ids; anything else is taken as a calendar id."""
+    if assignee_calendars is None:
+        assignee_calendars = load_assignee_calendars()
+    return list(dict.fromkeys(assignee_calendars.get(name, name) for name in names))
+
+
+def load_index(calendar_ids, weeks=DEFAULT_HORIZON_WEEKS):
+    """Loads every calendar's snapshot (in parallel, one worker thread each) into an AvailabilityIndex."""
+    days = weeks * 7
+
+    def load(calendar_id):
+        store = EventStore() if USE_EVENT_STORE else None
+        return CalendarSnapshot(get_calendar_service(), calendar_id, horizon_days=days, store=store).load()
+
+    with ThreadPoolExecutor(max_workers=min(MAX_CALENDAR_WORKERS, len(calendar_ids))) as pool:
+        snapshots = list(pool.map(load, calendar_ids))
+    return AvailabilityIndex.from_snapshots(snapshots, days)
+
+
+def _datetime(value):
+    parsed = dt_parser.isoparse(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=MST)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", nargs="?", choices=("free", "fit", "overlap"), default="free")
+    parser.add_argument("--calendars", type=lambda v: [name.strip() for name in v.split(",") if name.strip()],
+                        default=[CALENDAR_ID], help="comma-separated calendar ids or assignee names")
+    parser.add_argument("--weeks", type=int, default=DEFAULT_HORIZON_WEEKS, help="horizon to load")
+    parser.add_argument("--from", dest="not_before", type=_datetime, help="ignore time before this (default: now)")
+    parser.add_argument("--until", type=_datetime, help="ignore time after this")
+    parser.add_argument("--any-time", action="store_true", help="do not limit free time to working hours")
+    parser.add_argument("--weekends", action="store_true", help="count weekends as working days")
+    parser.add_argument("--min-minutes", type=int, default=MIN_CHUNK_MINUTES, help="free: shortest window")
+    parser.add_argument("--minutes", type=int, default=60, help="fit: length of the block to place")
+    parser.add_argument("--align", type=int, default=DEFAULT_ALIGN_MINUTES, help="fit: start-time granularity")
+    parser.add_argument("--min-events", type=int, default=2, help="overlap: events running at once")
+    parser.add_argument("--json", action="store_true", help="print the windows as JSON")
+    args = parser.parse_args()
+
+    calendar_ids = resolve_calendars(args.calendars)
+    # Keep load progress off stdout when it carries JSON
+    with contextlib.redirect_stdout(sys.stderr) if args.json else contextlib.nullcontext():
+        index = load_index(calendar_ids, args.weeks)
+    not_before = args.not_before or datetime.datetime.now(tz=MST)
+    working_hours = not args.any_time
+
+    started = time.perf_counter()
+    if args.command == "free":
+        windows = index.free_windows(calendar_ids, args.min_minutes, not_before, args.until, working_hours,
+                                     args.weekends)
+        title = f"Free windows of {args.min_minutes}+ min on {len(calendar_ids)} calendar(s):"
+    elif args.command == "fit":
+        fit = index.earliest_fit(calendar_ids, args.minutes, not_before, args.until, args.align, working_hours,
+                                 args.weekends)
+        windows = [fit] if fit else []
+        title = f"Earliest common {args.minutes} min block on {len(calendar_ids)} calendar(s):"
+    else:
+        windows = index.overlaps(calendar_ids, args.min_events, not_before, args.until)
+        title = f"Times with {args.min_events}+ overlapping events on {len(calendar_ids)} calendar(s):"
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    if args.json:
+        print(json.dumps([{"start": start.isoformat(), "end": end.isoformat()} for start, end in windows], indent=2))
+        return
+    print(title)
+    for start, end in windows:
+        print(f"From {start} to {end} ({int((end - start).total_seconds() // 60)} min)")
+    if not windows:
+        print("ℹ️ Nothing found in the horizon.")
+    print(f"⏱ Answered in {elapsed_ms:.1f} ms over {index.days} days.")
 
-# Load credentials
-SCOPES = ["https://www.googleapis.com/auth/calendar"]
-SERVICE_ACCOUNT_FILE = "./service.json"
-
-creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-service = build("calendar", "v3", credentials=creds)
-
-# Define working hours
-WORK_HOURS_START = 9
-WORK_HOURS_END = 17
-
-# Get today's date
-now = datetime.datetime.utcnow()
-start_of_day = now.replace(hour=WORK_HOURS_START, minute=0, second=0).isoformat() + "Z"
-end_of_day = now.replace(hour=WORK_HOURS_END, minute=0, second=0).isoformat() + "Z"
-
-# Query events for today
-events_result = service.events().list(
-    calendarId="primary",
-    timeMin=start_of_day,
-    timeMax=end_of_day,
-    singleEvents=True,
-    orderBy="startTime",
-).execute()
-events = events_result.get("items", [])
-
-# Find open slots
-free_slots = []
-last_end_time = start_of_day
-
-for event in events:
-    start = event["start"].get("dateTime", event["start"].get("date"))
-    end = event["end"].get("dateTime", event["end"].get("date"))
-
-    if last_end_time < start:
-        free_slots.append({"start": last_end_time, "end": start})
-    
-    last_end_time = end
-
-# Check if there is time after the last event
-if last_end_time < end_of_day:
-    free_slots.append({"start": last_end_time, "end": end_of_day})
-
-# Print free slots
-print("Available Slots:")
-for slot in free_slots:
-    print(f"From {slot['start']} to {slot['end']}")
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Reconciles the desired plan with the blocks already on the calendar.
+
+Scheduler-owned events (the ones insert_calendar_event creates) are matched
+back to their task by Notion page id: the extendedProperties tag on the
+event, else the TaskEventStore index, else (for blocks written before events
+were tagged) the page id in the "Task URL:" description. Blocks that are
+still valid are kept as they are, and only the difference becomes calendar
+writes:
+
+  - keep    the block is in the future, fits the working hours, does not
+            overlap another event and is still needed by the task's estimate
+  - resize  (patch) the estimate shrank below what is booked: the last kept
+            block is shortened
+  - rename  (patch) the task was renamed in Notion (or an untagged block
+            is tagged with its page id)
+  - move    (patch) a block that is no longer valid (overlap, surplus) is
+            moved to a newly planned slot of the same task
+  - insert  a newly planned slot with no block left to move
+  - delete  a block nobody needs any more (task done or gone, estimate shrank)
+"""
+import datetime
+
+from planner import MIN_CHUNK_MINUTES, MST, page_id_from_url, task_key, task_sort_key
+
+# insert_calendar_event writes this before the Notion URL in every block's description
+TASK_URL_PREFIX = "Task URL: "
+# Private extended property holding the Notion page id of a scheduler-owned event
+PAGE_ID_PROPERTY = "notion_page_id"
+
+def event_page_id(event):
+    return ((event.get("extendedProperties") or {}).get("private") or {}).get(PAGE_ID_PROPERTY)
+
+
+def event_task_key(event, event_pages=None):
+    """Page id of the task a scheduler-owned event belongs to, or None for other events."""
+    page_id = event_page_id(event)
+    if page_id:
+        return page_id
+    if event_pages and event.get("id") in event_pages:
+        return event_pages[event["id"]]
+    description = event.get("description") or ""
+    if not description.startswith(TASK_URL_PREFIX):
+        return None
+    words = description[len(TASK_URL_PREFIX):].split()
+    return page_id_from_url(words[0]) if words else None
+
+
+def _minutes(start, end):
+    return int((end - start).total_seconds() // 60)
+
+
+def owned_events(snapshot, now, event_pages=None):
+    """Maps page id -> [(start, end, event)] for scheduler-owned events ending after `now`, by start time."""
+    owned = {}
+    for start, end, event in snapshot.entries_after(now):
+        key = event_task_key(event, event_pages)
+        if key is not None:
+            owned.setdefault(key, []).append((start, end, event))
+    return owned
+
+
+class Reconciliation:
+    """
+    Keep/move/insert/delete decisions for the scheduler-owned blocks of
+    `tasks` on one calendar. Build the capacity ledger with
+    exclude=movable_ids() and booked=booked_ids() and hold() it, then for each task (in any number
+    of batches, as analysis finishes) settle() it, plan what settle()
+    returns and turn the new chunks into writes with ops_for(). Blocks of
+    tasks that are never settled stay held and untouched.
+
+    Blocks of tasks outside `tasks` are left alone, except that when
+    `active_keys` (the page ids of every active task) is given, blocks of
+    tasks that are no longer active are deleted (see orphan_ops()).
+    `event_pages` is the TaskEventStore's event id -> page id index.
+    """
+
+    def __init__(self, tasks, snapshot, now=None, active_keys=None, event_pages=None):
+        self.now = now or datetime.datetime.now(tz=MST)
+        self.tasks = tasks
+        self.owned = owned_events(snapshot, self.now, event_pages)
+        self.active_keys = active_keys
+        self.held = {}         # task key -> [(start, end, event)] valid blocks reserved until the task settles
+        self.in_progress = {}  # task key -> minutes of blocks already under way
+        self.patches = {}      # task key -> [{"task", "event", "start", "end"}] resizes and renames of kept blocks
+        self.surplus = {}      # task key -> [event] blocks to move or delete
+        self.kept = {}         # task key -> [(start, end)] blocks staying on the calendar (in-progress ones from now)
+        self.counts = {"kept": 0}
+
+    def _reconciled_keys(self):
+        keys = {task_key(task) for task in self.tasks}
+        if self.active_keys is None:
+            return keys
+        return keys | {key for key in self.owned if key not in self.active_keys}
+
+    def movable_ids(self):
+        """Ids of the future blocks this reconciliation may move or delete; the ledger treats them as free."""
+        keys = self._reconciled_keys()
+        return {event["id"] for key, entries in self.owned.items() if key in keys
+                for start, _, event in entries if start >= self.now}
+
+    def booked_ids(self):
+        """
+        Ids of the blocks that stay where they are (already under way, or of
+        tasks not being reconciled); the ledger charges them to their day's
+        capacity so a partial replan does not overbook it.
+        """
+        keys = self._reconciled_keys()
+        return {event["id"] for key, entries in self.owned.items()
+                for start, _, event in entries if key not in keys or start < self.now}
+
+    def hold(self, ledger):
+        """
+        Reserves every still-valid future block of the reconciled tasks in
+        `ledger` (highest priority task first), so nothing is planned over a
+        block before its task has settled. Invalid blocks (overlapping,
+        outside working hours) and blocks of done or inactive tasks become
+        surplus.
+        """
+        for task in sorted(self.tasks, key=task_sort_key):
+            key = task_key(task)
+            if key in self.held:
+                continue
+            held = self.held[key] = []
+            for start, end, event in self.owned.get(key, []):
+                if start < self.now:
+                    # Already under way: counts towards the estimate but is never touched
+                    self.in_progress[key] = self.in_progress.get(key, 0) + _minutes(self.now, end)
+                    self.kept.setdefault(key, []).append((self.now, end))
+                elif task["status"].lower() != "done" and ledger.fits(start, end):
+                    ledger.reserve(start, end)
+                    held.append((start, end, event))
+                else:
+                    self.surplus.setdefault(key, []).append(event)
+        for key in self._reconciled_keys() - set(self.held):
+            self.surplus.setdefault(key, []).extend(
+                event for start, _, event in self.owned.get(key, []) if start >= self.now)
+
+    def settle(self, task, ledger):
+        """
+        Keeps as many of the task's held blocks as its (analyzed) estimate
+        needs, releasing the rest back to `ledger`. Returns the task with
+        build_time reduced to the hours not covered by kept blocks, or None
+        when nothing is left to plan.
+        """
+        key = task_key(task)
+        held = self.held.pop(key, [])
+        needed = int(round(float(task.get("build_time") or 0) * 60)) if task["status"].lower() != "done" else 0
+        booked = self.in_progress.get(key, 0)
+        for start, end, event in held:
+            remaining = needed - booked
+            if remaining <= 0 or (_minutes(start, end) > remaining and remaining < min(MIN_CHUNK_MINUTES, needed)):
+                ledger.release(start, end)
+                self.surplus.setdefault(key, []).append(event)
+                continue
+            if _minutes(start, end) > remaining:
+                new_end = start + datetime.timedelta(minutes=remaining)
+                ledger.release(new_end, end)
+                self.patches.setdefault(key, []).append({"task": task, "event": event, "start": start, "end": new_end})
+                end = new_end
+            elif event.get("summary") != task["name"] or event_page_id(event) != key:
+                self.patches.setdefault(key, []).append({"task": task, "event": event, "start": start, "end": end})
+            else:
+                self.counts["kept"] += 1
+            self.kept.setdefault(key, []).append((start, end))
+            booked += _minutes(start, end)
+        if booked >= needed:
+            return None
+        return {**task, "build_time": (needed - booked) / 60.0}
+
+    def kept_chunks(self):
+        """
+        {"task", "start", "end"} for every block that stays on the calendar, so
+        the optimizer and plan_metrics see work that is already booked.
+        """
+        tasks_by_key = {task_key(task): task for task in self.tasks}
+        return [{"task": tasks_by_key.get(key) or {"id": key, "name": key}, "start": start, "end": end}
+                for key, blocks in self.kept.items() for start, end in blocks]
+
+    def _count(self, ops):
+        for op in ops:
+            self.counts[op["op"]] = self.counts.get(op["op"], 0) + 1
+        return ops
+
+    def ops_for(self, tasks, chunks):
+        """
+        Write operations for settled `tasks` and their newly planned
+        `chunks`: {"op": "insert" | "patch" | "delete", "task", "event" (None
+        for inserts), "start", "end"}. Surplus blocks of a task are moved onto
+        its new chunks before anything is inserted; the rest are deleted.
+        """
+        tasks_by_key = {task_key(task): task for task in tasks}
+        ops = [dict(patch, op="patch") for key in tasks_by_key for patch in self.patches.pop(key, [])]
+        for chunk in chunks:
+            key = task_key(chunk["task"])
+            task = tasks_by_key.get(key, chunk["task"])
+            spare = self.surplus.get(key)
+            if spare:
+                ops.append({"op": "patch", "task": task, "event": spare.pop(0),
+                            "start": chunk["start"], "end": chunk["end"]})
+            else:
+                ops.append({"op": "insert", "task": task, "event": None,
+                            "start": chunk["start"], "end": chunk["end"]})
+        for key, task in tasks_by_key.items():
+            for event in self.surplus.pop(key, []):
+                ops.append({"op": "delete", "task": task, "event": event, "start": None, "end": None})
+        return self._count(ops)
+
+    def orphan_ops(self):
+        """Deletes for every block of done, inactive or removed tasks not handled by ops_for()."""
+        keys = {task_key(task) for task in self.tasks}
+        ops = []
+        for key in [key for key in self.surplus if key not in keys]:
+            for event in self.surplus.pop(key):
+                ops.append({"op": "delete", "task": {"id": key, "name": event.get("summary", "")}, "event": event,
+                            "start": None, "end": None})
+        return self._count(ops)
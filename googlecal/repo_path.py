@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+"""
+Puts the repository root on sys.path, so the scripts in this directory can
+be run directly (python googlecal/schedule_tasks.py) and still import the
+notion, chatgpt and common packages next to googlecal/. Entry points import
+it before any of those packages.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
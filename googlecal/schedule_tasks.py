@@ -1,252 +1,306 @@
 #!/usr/bin/env python3
-import subprocess
 import json
-import datetime
-from dateutil import parser as dt_parser
+import asyncio
+import contextvars
 from dateutil import tz
-import re
-
-from googleapiclient.discovery import build
-from google.oauth2.service_account import Credentials
-
-# --- Configuration and Paths ---
-TODO_SCRIPT_PATH = "/home/moneybot/scheduler/notion/api/generate_todo_list.sh"
-SERVICE_ACCOUNT_FILE = "/home/moneybot/scheduler/googlecal/service.json"
-CALENDAR_ID = "a252aec5fae47d681a372f6e37da3ccf0d9d352c3c8e31bde70b3b666a198da3@group.calendar.google.com"
+from concurrent.futures import ThreadPoolExecutor
+
+import repo_path  # noqa: F401  (must precede the notion, chatgpt and common imports)
+from scheduler_config import (
+    CALENDAR_ID, MAX_CALENDAR_WORKERS, USE_EVENT_STORE, load_assignee_calendars,
+)
+from calendar_snapshot import CalendarSnapshot
+from event_store import EventStore
+from calendar_writer import CalendarWriteBatch
+from planner import DAILY_MAX_HOURS, CapacityLedger, plan_tasks, task_key, task_sort_key
+from reconcile import PAGE_ID_PROPERTY, Reconciliation
+from task_event_store import TaskEventStore, event_id_for
+from optimizer import optimize_plan, plan_metrics
+from notion.notion_tasks import fetch_active_tasks
+from chatgpt.analysis_cache import AnalysisCache
+from common.clients import get_calendar_service
+from common import instrumentation, rate_limit
 
 # Global flags:
 DRY_RUN = True             # Set to True for a dry run (no actual calendar changes)
 USE_AI_MODE = True         # Set to True to run tasks through AI analysis
+USE_TASK_EVENT_STORE = True  # Index written blocks by Notion page id and resume interrupted runs
+SCHEDULER_MODE = "greedy"  # "greedy" (priority order) or "optimize" (dependency/deadline-aware search)
 
 # Time zone for MST
 MST = tz.gettz("America/Phoenix")
-# Maximum scheduling per day in hours
-DAILY_MAX_HOURS = 6.5
-
-# Google Calendar API setup
-SCOPES = ["https://www.googleapis.com/auth/calendar"]
-creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-service = build("calendar", "v3", credentials=creds)
 
 # --- Helper Functions ---
 
-def get_next_weekday(date):
-    while date.weekday() >= 5:
-        date += datetime.timedelta(days=1)
-    return date
+def sort_tasks(tasks):
+    return sorted(tasks, key=task_sort_key)
 
-def parse_tasks(output):
+@instrumentation.traced()
+def insert_calendar_event(task_name, start_time, end_time, url, snapshot=None, writer=None, page_id=None,
+                          event_id=None):
     """
-    Updated to simply parse raw JSON output from generate_todo_list.sh.
+    Schedules one task block. Outside DRY_RUN the insert is queued on `writer`
+    (sent when the writer is flushed) or sent immediately when no writer is given.
+    The block is tagged with the task's Notion `page_id`; a given `event_id`
+    makes the insert safe to repeat.
     """
-    try:
-        tasks = json.loads(output)
-        return tasks
-    except Exception as e:
-        print("Error parsing tasks:", e)
-        return []
-
-PRIORITY_MAP = {
-    "🔹 High": 3,
-    "High": 3,
-    "🔹 Medium": 2,
-    "Medium": 2,
-    "🔹 No Priority": 1,
-    "No Priority": 1
-}
-
-def sort_tasks(tasks):
-    def sort_key(task):
-        prio = PRIORITY_MAP.get(task["priority"], 0)
-        return (-prio, task["due"])
-    return sorted(tasks, key=sort_key)
-
-def get_free_slots_for_day(day_date):
-    start_of_day = datetime.datetime.combine(day_date, datetime.time(9, 0)).replace(tzinfo=MST)
-    end_of_day = datetime.datetime.combine(day_date, datetime.time(17, 0)).replace(tzinfo=MST)
-
-    events_result = service.events().list(
-        calendarId=CALENDAR_ID,
-        timeMin=start_of_day.isoformat(),
-        timeMax=end_of_day.isoformat(),
-        singleEvents=True,
-        orderBy="startTime",
-    ).execute()
-    events = events_result.get("items", [])
-    print(f"🔍 Retrieved {len(events)} existing events for {day_date.isoformat()}.")
-
-    free_slots = []
-    last_end = start_of_day
-    for event in events:
-        start_str = event["start"].get("dateTime", event["start"].get("date"))
-        end_str = event["end"].get("dateTime", event["end"].get("date"))
-        try:
-            event_start = dt_parser.isoparse(start_str).astimezone(MST)
-            event_end = dt_parser.isoparse(end_str).astimezone(MST)
-        except Exception as e:
-            print(f"❌ Error parsing event times: {e}")
-            continue
-
-        if last_end < event_start:
-            free_slots.append({"start": last_end, "end": event_start})
-        last_end = max(last_end, event_end)
-
-    if last_end < end_of_day:
-        free_slots.append({"start": last_end, "end": end_of_day})
-
-    lunch_start = datetime.datetime.combine(day_date, datetime.time(12, 0)).replace(tzinfo=MST)
-    lunch_end = datetime.datetime.combine(day_date, datetime.time(13, 0)).replace(tzinfo=MST)
-    free_slots_adjusted = []
-    for slot in free_slots:
-        if slot["end"] <= lunch_start or slot["start"] >= lunch_end:
-            free_slots_adjusted.append(slot)
-        else:
-            if slot["start"] < lunch_start:
-                free_slots_adjusted.append({"start": slot["start"], "end": lunch_start})
-            if slot["end"] > lunch_end:
-                free_slots_adjusted.append({"start": lunch_end, "end": slot["end"]})
-    return free_slots_adjusted
-
-def insert_calendar_event(task_name, start_time, end_time, url):
     event = {
         "summary": task_name,
         "description": f"Task URL: {url}",
         "start": {"dateTime": start_time.isoformat(), "timeZone": "America/Phoenix"},
         "end": {"dateTime": end_time.isoformat(), "timeZone": "America/Phoenix"},
     }
+    if page_id:
+        event["extendedProperties"] = {"private": {PAGE_ID_PROPERTY: page_id}}
+    if event_id:
+        event["id"] = event_id
+    # Reserve the block locally right away so later free-slot lookups see it
+    local_id = snapshot.add_event({**event, "id": None}) if snapshot is not None else None
     if DRY_RUN:
         print(f"DRY RUN: Would schedule '{task_name}' from {start_time} to {end_time} with URL: {url}")
         return {"id": "dry-run", "summary": task_name}
-    else:
-        created_event = service.events().insert(calendarId=CALENDAR_ID, body=event).execute()
-        if created_event.get("id"):
+
+    def on_done(created_event, error):
+        if error is None and created_event and created_event.get("id"):
             print(f"✅ Scheduled '{task_name}' from {start_time} to {end_time}")
+            if snapshot is not None:
+                snapshot.remove_event(local_id)
+                snapshot.add_event(created_event)
         else:
-            print(f"❌ Failed to schedule '{task_name}'")
-        return created_event
-
-def handle_existing_events_for_task(task):
-    now_mst = datetime.datetime.now(tz=MST)
-    events_result = service.events().list(
-        calendarId=CALENDAR_ID,
-        timeMin=now_mst.isoformat(),
-        singleEvents=True,
-        q=task["name"],
-        orderBy="startTime"
-    ).execute()
-    future_events = events_result.get("items", [])
-    matching_events = [event for event in future_events if event.get("summary", "") == task["name"]]
-    if matching_events:
-        if task["status"].lower() == "done":
-            for event in matching_events:
-                if DRY_RUN:
-                    print(f"DRY RUN: Would delete event '{event['id']}' for task '{task['name']}'.")
-                else:
-                    try:
-                        service.events().delete(calendarId=CALENDAR_ID, eventId=event["id"]).execute()
-                        print(f"🗑 Removed scheduled event for completed task '{task['name']}'.")
-                    except Exception as e:
-                        print(f"❌ Error deleting event {event['id']}: {e}")
-            return True
-        else:
-            print(f"ℹ️ Task '{task['name']}' is already scheduled in the future. Skipping.")
-            return True
-    return False
-
-def schedule_tasks(tasks):
-    current_day = get_next_weekday(datetime.datetime.now(tz=MST).date())
-    daily_scheduled_hours = 0.0
+            print(f"❌ Failed to schedule '{task_name}'" + (f": {error}" if error else ""))
+            if snapshot is not None:
+                snapshot.remove_event(local_id)
 
-    # Group tasks by type if provided by AI
-    tasks_by_type = {}
-    for task in tasks:
-        if task["status"].lower() == "done":  # Skip Done tasks
-            continue
-        task_type = task.get("task_type", "focus")  # Default to "focus"
-        tasks_by_type.setdefault(task_type, []).append(task)
-
-    for task_type, type_tasks in tasks_by_type.items():
-        print(f"\n📋 Scheduling {task_type} tasks")
-        for task in type_tasks:
-            if handle_existing_events_for_task(task):
-                continue
-
-            remaining_time = task["build_time"]
-            print(f"\n📋 Scheduling task: {task['name']} (Total: {remaining_time} hrs, Status: {task['status']})")
-            while remaining_time > 0:
-                if daily_scheduled_hours >= DAILY_MAX_HOURS:
-                    print(f"ℹ️ Daily limit reached ({DAILY_MAX_HOURS} hrs). Moving to next day.")
-                    current_day = get_next_weekday(current_day + datetime.timedelta(days=1))
-                    daily_scheduled_hours = 0.0
-
-                free_slots = get_free_slots_for_day(current_day)
-                now_mst = datetime.datetime.now(tz=MST)
-                if current_day == now_mst.date():
-                    free_slots = [s for s in free_slots if s["end"] > now_mst]
-                    if free_slots and free_slots[0]["start"] < now_mst:
-                        free_slots[0]["start"] = now_mst
-
-                if not free_slots:
-                    print(f"⚠️ No free slots on {current_day}. Moving to next day.")
-                    current_day = get_next_weekday(current_day + datetime.timedelta(days=1))
-                    daily_scheduled_hours = 0.0
-                    continue
-
-                slot_found = False
-                for slot in free_slots:
-                    slot_start = slot["start"]
-                    slot_end = slot["end"]
-                    available_slot_duration = (slot_end - slot_start).total_seconds() / 3600.0
-                    available_slot_duration = min(available_slot_duration, DAILY_MAX_HOURS - daily_scheduled_hours)
-                    if available_slot_duration <= 0:
-                        continue
-
-                    scheduled_duration = min(remaining_time, available_slot_duration)
-                    event_end = slot_start + datetime.timedelta(hours=scheduled_duration)
-                    insert_calendar_event(task["name"], slot_start, event_end, task["url"])
-                    daily_scheduled_hours += scheduled_duration
-                    remaining_time -= scheduled_duration
-                    slot_found = True
-                    break
+    if writer is not None:
+        writer.insert(event, on_done)
+        return event
+    try:
+        calendar_id = snapshot.calendar_id if snapshot is not None else CALENDAR_ID
+        request = get_calendar_service().events().insert(calendarId=calendar_id, body=event)
+        created_event = rate_limit.call("calendar", request.execute)
+        instrumentation.count("api_requests", service="calendar", endpoint="events.insert")
+    except Exception as e:
+        if not (event_id and rate_limit.http_status(e) == 409):
+            on_done(None, e)
+            return {}
+        created_event = event  # An earlier attempt already created it
+    on_done(created_event, None)
+    return created_event
+
+def delete_calendar_event(task, event, snapshot, writer=None):
+    if DRY_RUN:
+        print(f"DRY RUN: Would delete event '{event['id']}' for task '{task['name']}'.")
+        return
 
-                if not slot_found:
-                    print(f"⚠️ No suitable slot found on {current_day}. Moving to next day.")
-                    current_day = get_next_weekday(current_day + datetime.timedelta(days=1))
-                    daily_scheduled_hours = 0.0
+    def on_done(response, error):
+        if error is None:
+            snapshot.remove_event(event["id"])
+            print(f"🗑 Removed scheduled event for '{task['name']}'.")
+        else:
+            print(f"❌ Error deleting event {event['id']}: {error}")
 
-def main():
+    if writer is not None:
+        writer.delete(event["id"], on_done)
+        return
     try:
-        task_output = subprocess.run([TODO_SCRIPT_PATH], capture_output=True, text=True, check=True)
-        raw_tasks = parse_tasks(task_output.stdout)
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Error running task script: {e}")
+        request = get_calendar_service().events().delete(calendarId=snapshot.calendar_id, eventId=event["id"])
+        rate_limit.call("calendar", request.execute)
+        instrumentation.count("api_requests", service="calendar", endpoint="events.delete")
+    except Exception as e:
+        on_done(None, e)
         return
+    on_done("", None)
 
-    if not raw_tasks:
-        print("ℹ️ No tasks retrieved.")
+def patch_calendar_event(task, event, start_time, end_time, snapshot, writer=None):
+    """Moves, resizes or renames one of the task's existing blocks in place (tagging it with the page id)."""
+    body = {
+        "summary": task["name"],
+        "start": {"dateTime": start_time.isoformat(), "timeZone": "America/Phoenix"},
+        "end": {"dateTime": end_time.isoformat(), "timeZone": "America/Phoenix"},
+    }
+    if task.get("id"):
+        body["extendedProperties"] = {"private": {PAGE_ID_PROPERTY: task["id"]}}
+    # Update the local copy right away so later free-slot lookups see the new times
+    snapshot.add_event({**event, **body})
+    if DRY_RUN:
+        print(f"DRY RUN: Would move '{task['name']}' block {event['id']} to {start_time} - {end_time}")
         return
 
-    unique_tasks = {}
-    for t in raw_tasks:
-        if t["name"] not in unique_tasks and t["status"].lower() !="done":
-            unique_tasks[t["name"]] = t
-            print(t["name"])
-    tasks = list(unique_tasks.values())
+    def on_done(patched_event, error):
+        if error is None and patched_event:
+            snapshot.add_event(patched_event)
+            print(f"🔁 Updated '{task['name']}' block to {start_time} - {end_time}")
+        else:
+            snapshot.add_event(event)
+            print(f"❌ Error updating event {event['id']}: {error}")
 
-    tasks = sort_tasks(tasks)
-    print(f"📋 Retrieved and sorted {len(tasks)} tasks.")
+    if writer is not None:
+        writer.patch(event["id"], body, on_done)
+        return
+    try:
+        request = get_calendar_service().events().patch(calendarId=snapshot.calendar_id, eventId=event["id"], body=body)
+        patched_event = rate_limit.call("calendar", request.execute)
+        instrumentation.count("api_requests", service="calendar", endpoint="events.patch")
+    except Exception as e:
+        on_done(None, e)
+        return
+    on_done(patched_event, None)
+
+def load_calendar_snapshot(calendar_id=CALENDAR_ID):
+    """Fetches the whole planning horizon for one calendar once per run."""
+    store = EventStore() if USE_EVENT_STORE else None
+    return CalendarSnapshot(get_calendar_service(), calendar_id, store=store).load()
 
-    # Filter out "Done" tasks before AI analysis
-    active_tasks = [task for task in tasks if task["status"].lower() != "done"]
+class CalendarScheduler:
+    """
+    Plans and writes one calendar's tasks as they arrive. The capacity ledger
+    is built from the snapshot once; every still-valid block of `tasks` is
+    held in it, so tasks can be added in any number of batches (e.g. as AI
+    analysis streams in) and each batch only takes the time left over.
+
+        scheduler = CalendarScheduler(snapshot, tasks)
+        scheduler.add(batch)   # repeatedly; flush() whenever ready_to_flush()
+        scheduler.finish()
+
+    In "optimize" mode the search needs the whole backlog, so add() only
+    collects tasks and finish() plans them. When `active_tasks` (every active
+    task for this calendar) is given, blocks of tasks that are no longer
+    active are deleted.
+    """
 
+    def __init__(self, snapshot, tasks, active_tasks=None):
+        self.snapshot = snapshot
+        self.calendar_id = snapshot.calendar_id
+        # Inserts, patches and deletes are queued during planning and sent as batches
+        self.writer = CalendarWriteBatch(get_calendar_service(), self.calendar_id)
+        self.store = TaskEventStore() if USE_TASK_EVENT_STORE and not DRY_RUN else None
+        self.run_id = None
+        if self.store is not None:
+            self.run_id, resumed = self.store.start_run(self.calendar_id)
+            if resumed:
+                unconfirmed = self.store.pending(self.run_id)
+                landed = [event_id for event_id in unconfirmed if snapshot.has_event(event_id)]
+                self.store.confirm(self.calendar_id, landed)
+                print(f"♻️ Resuming an interrupted run: {len(landed)} of {len(unconfirmed)} unconfirmed inserts landed.")
+        active_keys = {task_key(task) for task in active_tasks} if active_tasks is not None else None
+        event_pages = self.store.event_pages(self.calendar_id) if self.store is not None else None
+        self.reconciliation = Reconciliation(tasks, snapshot, active_keys=active_keys, event_pages=event_pages)
+        self.ledger = CapacityLedger.from_snapshot(snapshot, daily_max_hours=DAILY_MAX_HOURS,
+                                                   exclude=self.reconciliation.movable_ids(),
+                                                   booked=self.reconciliation.booked_ids())
+        # Taken before hold(), so kept blocks count against the same capacity as new ones
+        self.capacity = self.ledger.capacity_minutes()
+        self.reconciliation.hold(self.ledger)
+        self.settled = []   # every task added so far
+        self.pending = []   # what is left of them to plan once kept blocks are counted
+        self.chunks = []
+        self.unplaced = {}
+        self.new_blocks = []
+        self.current_task = None
+        self._apply(self.reconciliation.orphan_ops())
+
+    def add(self, tasks):
+        """Settles `tasks` against their existing blocks, plans the rest and queues the writes."""
+        settled = []
+        pending = []
+        for task in tasks:
+            settled.append(task)
+            remaining = self.reconciliation.settle(task, self.ledger)
+            if remaining is not None:
+                pending.append(remaining)
+        self.settled.extend(settled)
+        self.pending.extend(pending)
+        if SCHEDULER_MODE == "optimize":
+            return
+        with instrumentation.span("plan", mode=SCHEDULER_MODE, tasks=len(settled), pending=len(pending)):
+            chunks, unplaced = plan_tasks(pending, self.ledger)
+        self.chunks.extend(chunks)
+        self.unplaced.update(unplaced)
+        self._apply(self.reconciliation.ops_for(settled, chunks))
+
+    def _apply(self, ops):
+        for op in ops:
+            task = op["task"]
+            if op["op"] == "delete":
+                delete_calendar_event(task, op["event"], self.snapshot, self.writer)
+                continue
+            if task is not self.current_task:
+                print(f"\n📋 Scheduling task: {task['name']} (Total: {task['build_time']} hrs, "
+                      f"Status: {task['status']}, Type: {task.get('task_type', 'focus')})")
+                self.current_task = task
+            if op["op"] == "insert":
+                page_id = task.get("id")
+                event_id = (event_id_for(self.calendar_id, page_id, op["start"], op["end"], self.run_id)
+                            if self.run_id and page_id else None)
+                if event_id:
+                    self.new_blocks.append((event_id, page_id, op["start"], op["end"]))
+                insert_calendar_event(task["name"], op["start"], op["end"], task["url"], self.snapshot,
+                                      self.writer, page_id=page_id, event_id=event_id)
+            else:
+                patch_calendar_event(task, op["event"], op["start"], op["end"], self.snapshot, self.writer)
+
+    def ready_to_flush(self):
+        """True once a full batch of writes is queued."""
+        return len(self.writer) >= self.writer.batch_size
+
+    def flush(self):
+        """Sends the queued writes."""
+        if self.store is None:
+            self.writer.flush()
+            return
+        # Recorded before sending, so a crash mid-flush can be resumed with the same event ids
+        self.store.record_pending(self.calendar_id, self.run_id, self.new_blocks)
+        self.new_blocks = []
+        self.store.apply_results(self.calendar_id, self.writer.flush())
+
+    def finish(self):
+        """Plans anything still buffered, sends the remaining writes and closes the run."""
+        if SCHEDULER_MODE == "optimize":
+            with instrumentation.span("plan", mode=SCHEDULER_MODE, tasks=len(self.settled),
+                                      pending=len(self.pending)):
+                self.chunks, self.unplaced = optimize_plan(self.pending, self.ledger,
+                                                           fixed=self.reconciliation.kept_chunks())
+            self._apply(self.reconciliation.ops_for(self.settled, self.chunks))
+        self.flush()
+        if self.store is not None:
+            self.store.finish_run(self.run_id)
+        # Over every task and every block it will have, not just what was planned this run
+        metrics = plan_metrics(self.settled, self.reconciliation.kept_chunks() + self.chunks, self.unplaced,
+                               self.capacity)
+        print(f"📊 {SCHEDULER_MODE} plan: {json.dumps(metrics)}")
+        print(f"🧮 Reconciled with calendar: {json.dumps(self.reconciliation.counts)}")
+        names = {task_key(task): task["name"] for task in self.settled}
+        for key, hours in self.unplaced.items():
+            print(f"⚠️ No room for {hours:.2f} hrs of '{names.get(key, key)}' in the next "
+                  f"{self.snapshot.horizon_days} days.")
+
+@instrumentation.traced()
+def schedule_tasks(tasks, snapshot=None, active_tasks=None):
+    """
+    Plans `tasks` against an in-memory capacity ledger built from the snapshot
+    and reconciles the plan with the blocks already on the calendar: valid
+    blocks are kept, and only the inserts, moves and deletes that differ are
+    written. When `active_tasks` (every active task for this calendar) is
+    given, blocks of tasks that are no longer active are deleted too.
+    """
+    if snapshot is None:
+        snapshot = load_calendar_snapshot()
+    scheduler = CalendarScheduler(snapshot, tasks, active_tasks)
+    scheduler.add(tasks)
+    scheduler.finish()
+
+@instrumentation.traced()
+def analyze_active_tasks(active_tasks, snapshot, cache=None):
+    """Runs active tasks through AI analysis when USE_AI_MODE is on; returns them unchanged otherwise."""
     # If AI mode is enabled, process only active tasks
+    analyzed_tasks = active_tasks
     if USE_AI_MODE:
         try:
             from chatgpt.ai_analyzer import analyze_tasks
             from ai_task_scheduler import fetch_calendar_events
-            calendar_events = fetch_calendar_events()
+            calendar_events = fetch_calendar_events(snapshot)
             if active_tasks:  # Only call AI if there are active tasks
-                analyzed_tasks = analyze_tasks(active_tasks, calendar_events)
+                analyzed_tasks = analyze_tasks(active_tasks, calendar_events, cache)
                 print("🤖 AI analysis complete. Updated tasks:")
                 print(json.dumps(analyzed_tasks, indent=2))
             else:
@@ -255,9 +309,171 @@ def main():
         except Exception as e:
             print(f"❌ Error running AI analysis: {e}")
             analyzed_tasks = active_tasks  # Fallback to unanalyzed active tasks
+    return analyzed_tasks
+
+def group_tasks_by_calendar(tasks, assignee_calendars):
+    """
+    Maps calendar id -> tasks. A task goes on the calendar of every mapped
+    assignee; tasks with no mapped assignee go on CALENDAR_ID. Every mapped
+    calendar and CALENDAR_ID get a group, empty when none of `tasks` belong
+    there, so their blocks of finished or removed tasks are still cleaned up.
+    """
+    groups = {calendar_id: [] for calendar_id in dict.fromkeys([CALENDAR_ID, *assignee_calendars.values()])}
+    for task in tasks:
+        assignees = [name.strip() for name in (task.get("assigned_to") or "").split(",") if name.strip()]
+        calendar_ids = [assignee_calendars[name] for name in assignees if name in assignee_calendars] or [CALENDAR_ID]
+        for calendar_id in dict.fromkeys(calendar_ids):
+            groups.setdefault(calendar_id, []).append(task)
+    return groups
+
+def _run_on(executor, fn, *args):
+    """Runs fn(*args) on `executor` under the caller's instrumentation span."""
+    context = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(executor, context.run, fn, *args)
+
+def _calendar_executor(executors, calendar_id):
+    # One thread per calendar: its Calendar service (httplib2) and SQLite connections stay on it
+    if calendar_id not in executors:
+        executors[calendar_id] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"calendar{len(executors)}")
+    return executors[calendar_id]
+
+def _prefetch_snapshot(snapshots, executors, calendar_id):
+    if calendar_id not in snapshots:
+        snapshots[calendar_id] = asyncio.ensure_future(
+            _run_on(_calendar_executor(executors, calendar_id), load_calendar_snapshot, calendar_id))
+    return snapshots[calendar_id]
+
+async def _close_calendars(snapshots, executors):
+    # Wait out prefetches nobody used, so no thread outlives the event loop
+    await asyncio.gather(*snapshots.values(), return_exceptions=True)
+    for executor in executors.values():
+        executor.shutdown()
+
+async def schedule_calendar(calendar_id, tasks, snapshot, executor, cache=None):
+    """
+    Analyze, plan and write pipeline for one calendar. Tasks are planned batch
+    by batch as their analysis streams in, and full write batches go out while
+    later chunks are still with the model. `snapshot` is the (possibly still
+    running) prefetch of the calendar; calendar work runs on `executor`.
+    """
+    with instrumentation.span("schedule_calendar", calendar=calendar_id, tasks=len(tasks)):
+        # One calendar fetch for the whole run, shared by AI context, dedupe and free slots
+        snapshot = await snapshot
+        scheduler = await _run_on(executor, CalendarScheduler, snapshot, tasks, tasks)
+        added = 0
+        if USE_AI_MODE and tasks:
+            try:
+                from chatgpt.ai_analyzer import analyze_tasks_stream
+                from ai_task_scheduler import fetch_calendar_events
+                stream = analyze_tasks_stream(tasks, calendar_events=fetch_calendar_events(snapshot), cache=cache)
+            except Exception as e:
+                print(f"❌ Error running AI analysis: {e}")
+                stream = None
+            while stream is not None:
+                try:
+                    batch = await stream.__anext__()
+                except StopAsyncIteration:
+                    print(f"🤖 AI analysis complete: {added} tasks analyzed.")
+                    break
+                except Exception as e:
+                    # The rest are planned unanalyzed
+                    print(f"❌ Error running AI analysis: {e}")
+                    break
+                await _run_on(executor, scheduler.add, batch)
+                added += len(batch)
+                if scheduler.ready_to_flush():
+                    await _run_on(executor, scheduler.flush)
+        if added < len(tasks):
+            await _run_on(executor, scheduler.add, tasks[added:])
+        await _run_on(executor, scheduler.finish)
+
+async def schedule_calendars(tasks, assignee_calendars=None, snapshots=None, executors=None):
+    """
+    Schedules every calendar's share of `tasks` concurrently (at most
+    MAX_CALENDAR_WORKERS at a time), so a run takes about as long as its
+    slowest calendar. A failure on one calendar is reported and does not
+    stop the others. `snapshots` and `executors` hold calendar fetches
+    already started by run_pipeline().
+    Returns {calendar id: None on success, or the exception}.
+    """
+    if assignee_calendars is None:
+        assignee_calendars = load_assignee_calendars()
+    snapshots = {} if snapshots is None else snapshots
+    executors = {} if executors is None else executors
+    groups = group_tasks_by_calendar(tasks, assignee_calendars)
+    # One analysis cache shared by all calendars, so a task analyzed for one calendar is a hit for the rest
+    cache = AnalysisCache() if USE_AI_MODE else None
+    if len(groups) > 1:
+        print(f"🗂 Scheduling {len(tasks)} tasks across {len(groups)} calendars.")
+    semaphore = asyncio.Semaphore(MAX_CALENDAR_WORKERS)
+
+    async def run(calendar_id, calendar_tasks):
+        async with semaphore:
+            try:
+                await schedule_calendar(calendar_id, calendar_tasks, _prefetch_snapshot(snapshots, executors, calendar_id),
+                                        _calendar_executor(executors, calendar_id), cache)
+            except Exception as e:
+                if len(groups) == 1:
+                    raise
+                print(f"❌ Scheduling failed for calendar {calendar_id}: {e}")
+                return e
+
+    outcomes = dict(zip(groups, await asyncio.gather(*(run(calendar_id, calendar_tasks)
+                                                        for calendar_id, calendar_tasks in groups.items()))))
+    if len(groups) > 1:
+        failed = sum(1 for error in outcomes.values() if error is not None)
+        print(f"🗂 {len(groups) - failed}/{len(groups)} calendars scheduled.")
+    return outcomes
+
+async def run_pipeline():
+    """
+    The whole run as overlapping stages: the Notion fetch and the snapshot of
+    every configured calendar start together, and each calendar plans its
+    tasks as their analysis streams in. Every configured calendar is
+    reconciled, including those left without active tasks (even when Notion
+    has none at all), so blocks of finished tasks do not linger.
+    """
+    assignee_calendars = load_assignee_calendars()
+    snapshots, executors = {}, {}
+    try:
+        for calendar_id in group_tasks_by_calendar([], assignee_calendars):
+            _prefetch_snapshot(snapshots, executors, calendar_id)
+        try:
+            raw_tasks = await asyncio.to_thread(fetch_active_tasks)
+        except Exception as e:
+            print(f"❌ Error fetching Notion tasks: {e}")
+            return
+
+        if not raw_tasks:
+            # Still reconciled below: every block left on the calendars belongs to a finished task
+            print("ℹ️ No tasks retrieved.")
+
+        unique_tasks = {}
+        for t in raw_tasks:
+            # Same-named tasks are duplicates only when they belong to the same assignees
+            key = (t["name"], t.get("assigned_to", ""))
+            if key not in unique_tasks and t["status"].lower() !="done":
+                unique_tasks[key] = t
+                print(t["name"])
+        tasks = list(unique_tasks.values())
+
+        tasks = sort_tasks(tasks)
+        print(f"📋 Retrieved and sorted {len(tasks)} tasks.")
 
-    schedule_tasks(analyzed_tasks)
+        # Filter out "Done" tasks before AI analysis
+        active_tasks = [task for task in tasks if task["status"].lower() != "done"]
+
+        await schedule_calendars(active_tasks, assignee_calendars, snapshots, executors)
+    finally:
+        await _close_calendars(snapshots, executors)
+
+@instrumentation.traced()
+def main():
+    asyncio.run(run_pipeline())
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        instrumentation.export()
 
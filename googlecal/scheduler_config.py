@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Calendar settings shared by the scheduler (schedule_tasks.py,
+scheduler_daemon.py) and the standalone tools (query_calendar.py,
+ai_task_scheduler.py), kept free of the Notion and OpenAI imports.
+"""
+import json
+import os
+
+CALENDAR_ID = "a252aec5fae47d681a372f6e37da3ccf0d9d352c3c8e31bde70b3b666a198da3@group.calendar.google.com"
+# JSON object mapping Notion "Assigned To" names to calendar ids; unmapped tasks go to CALENDAR_ID
+ASSIGNEE_CALENDARS_FILE = os.getenv("SCHEDULER_ASSIGNEE_CALENDARS",
+                                    "/home/moneybot/scheduler/googlecal/assignee_calendars.json")
+# Calendars worked on at the same time; each calendar's API and SQLite work runs on its own thread
+MAX_CALENDAR_WORKERS = 4
+# Read calendars from the local incrementally-synced event store
+USE_EVENT_STORE = True
+
+
+def load_assignee_calendars(path=ASSIGNEE_CALENDARS_FILE):
+    """Reads the {"assignee name": "calendar id"} mapping; empty when there is no mapping file."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Could not read assignee calendars from {path}: {e}")
+        return {}
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Resident scheduler: keeps a snapshot of every configured calendar (CALENDAR_ID
+plus the SCHEDULER_ASSIGNEE_CALENDARS mapping), the task list, analysis cache
+and API clients in memory and replans only what changed.
+
+Changes arrive from Calendar push notifications (one events().watch channel
+per calendar, pointed at the webhook below), from cheap incremental Notion
+polls, or from POST /notion. Bursts are debounced, then only the affected
+tasks are re-analyzed and reconciled with their existing blocks, calendar by
+calendar and against that calendar's own tasks (see reconcile.py):
+  - tasks whose scheduling fields changed in Notion,
+  - tasks that left the active set or moved to another assignee (their
+    future blocks on calendars they no longer belong to are removed),
+  - after a calendar change, tasks that lost their blocks or whose block now
+    overlaps another event on a changed day.
+
+Every endpoint can point at a local stand-in: NOTION_API_URL,
+GOOGLE_CALENDAR_API_ENDPOINT and OPENAI_BASE_URL.
+"""
+import datetime
+import json
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import repo_path  # noqa: F401  (must precede the notion, chatgpt and common imports)
+from chatgpt.analysis_cache import AnalysisCache
+from notion.notion_tasks import fetch_active_tasks
+from common.clients import get_calendar_service
+from common import instrumentation, rate_limit
+from planner import task_key
+from reconcile import owned_events
+from scheduler_config import load_assignee_calendars
+from schedule_tasks import (
+    MST, analyze_active_tasks, group_tasks_by_calendar, load_calendar_snapshot, schedule_tasks, sort_tasks,
+)
+
+# Address and port the webhook server listens on
+WEBHOOK_HOST = os.getenv("SCHEDULER_WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("SCHEDULER_WEBHOOK_PORT", "8080"))
+# Public HTTPS URL Google should push calendar notifications to; no watch channel is opened when unset
+WEBHOOK_URL = os.getenv("SCHEDULER_WEBHOOK_URL")
+# Shared secret echoed back by Google in X-Goog-Channel-Token
+WEBHOOK_TOKEN = os.getenv("SCHEDULER_WEBHOOK_TOKEN")
+# Requested lifetime of a watch channel, and how long before expiry it is renewed
+WATCH_TTL_SECONDS = 7 * 24 * 3600
+WATCH_RENEW_MARGIN_SECONDS = 3600
+# How often Notion is polled for edited pages
+NOTION_POLL_SECONDS = 60
+# How often calendars without an open watch channel are re-synced
+CALENDAR_POLL_SECONDS = 300
+# Changes are applied once no new change has arrived for this long
+DEBOUNCE_SECONDS = 5
+# Task fields whose change means the task's blocks must be replanned
+PLAN_FIELDS = ("name", "status", "priority", "due", "build_time", "dependencies", "url", "assigned_to")
+
+
+def plan_fields(task):
+    return tuple(task.get(field) for field in PLAN_FIELDS)
+
+
+class SchedulerDaemon:
+    """
+    Change-driven scheduling loop over every configured calendar. All Calendar
+    calls happen on the thread running serve_forever().
+    """
+
+    def __init__(self, host=WEBHOOK_HOST, port=WEBHOOK_PORT):
+        self.host = host
+        self.port = port
+        self.assignee_calendars = load_assignee_calendars()
+        self.calendar_ids = list(group_tasks_by_calendar([], self.assignee_calendars))
+        self.snapshots = {}             # calendar id -> CalendarSnapshot
+        self.tasks = {}                 # Notion page id -> task
+        self.notion_synced = False      # True once a Notion fetch succeeded; until then self.tasks means nothing
+        self.cache = AnalysisCache()
+        self.channels = {}              # calendar id -> open events().watch channel
+        self.server = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._dirty_calendars = set()
+        self._changed = {}              # page id -> task before the change (None when new)
+        self._removed = {}              # page id -> task that left the active set
+        self._poll_notion_now = False
+        self._full_pass = True          # every calendar still needs its first reconciliation
+        self._last_change = 0.0
+
+    # --- Change intake (any thread) ---
+
+    def notify_calendar_change(self, calendar_id=None):
+        """Marks `calendar_id` (every calendar when None) for a re-sync."""
+        with self._lock:
+            self._dirty_calendars.update([calendar_id] if calendar_id else self.calendar_ids)
+            self._last_change = time.monotonic()
+        self._wake.set()
+
+    def calendar_for_channel(self, channel_id):
+        """Calendar watched by channel `channel_id`, or None for an unknown (stale) channel."""
+        with self._lock:
+            return next((calendar_id for calendar_id, channel in self.channels.items()
+                         if channel["id"] == channel_id), None)
+
+    def request_notion_poll(self):
+        with self._lock:
+            self._poll_notion_now = True
+        self._wake.set()
+
+    # --- Loop (scheduler thread) ---
+
+    def poll_notion(self):
+        """
+        Fetches edited Notion pages and records which active tasks changed or
+        went away. Returns False when the fetch failed; the last known tasks
+        are kept, never read as "no active tasks".
+        """
+        try:
+            current = {task["id"]: task for task in fetch_active_tasks()}
+        except Exception as e:
+            print(f"❌ Error polling Notion: {e}")
+            return False
+        with self._lock:
+            self.notion_synced = True
+            for page_id, task in current.items():
+                previous = self.tasks.get(page_id)
+                if previous is None or plan_fields(previous) != plan_fields(task):
+                    self._changed.setdefault(page_id, previous)
+                    self._last_change = time.monotonic()
+            for page_id, task in self.tasks.items():
+                if page_id not in current:
+                    self._removed[page_id] = task
+                    self._changed.pop(page_id, None)
+                    self._last_change = time.monotonic()
+            self.tasks = current
+            changed, removed = len(self._changed), len(self._removed)
+        if changed or removed:
+            print(f"📝 Notion changes: {changed} changed, {removed} removed tasks.")
+        return True
+
+    def _displaced_tasks(self, snapshot, tasks, changed_days):
+        """Tasks without a future block, or whose block overlaps another event on a changed day."""
+        now = datetime.datetime.now(tz=MST)
+        owned = owned_events(snapshot, now)
+        displaced = {}
+        for task in tasks:
+            page_id = task["id"]
+            entries = owned.get(task_key(task))
+            if not entries:
+                displaced[page_id] = task
+                continue
+            for start, end, _ in entries:
+                if start.date() not in changed_days:
+                    continue
+                overlapping = [iv for iv in snapshot.busy_intervals_for_day(start.date())
+                               if iv[0] < end and iv[1] > start]
+                if len(overlapping) > 1:
+                    print(f"⚠️ '{task['name']}' block at {start} now overlaps another event; replanning it.")
+                    displaced[page_id] = task
+                    break
+        return displaced
+
+    @instrumentation.traced("daemon.replan")
+    def replan(self):
+        """
+        Applies pending changes and schedules only the affected tasks, one
+        calendar at a time. The first pass reconciles every calendar, so blocks
+        of tasks that finished while the daemon was down are cleaned up.
+        Nothing is reconciled before Notion has been fetched successfully:
+        with no known tasks every block would look orphaned.
+        """
+        with self._lock:
+            if not self.notion_synced:
+                print("⏸ Notion has not been fetched yet; leaving the calendars untouched.")
+                return
+            dirty, changed, removed, full = self._dirty_calendars, self._changed, self._removed, self._full_pass
+            self._dirty_calendars, self._changed, self._removed, self._full_pass = set(), {}, {}, False
+
+        started = time.monotonic()
+        groups = group_tasks_by_calendar(self.tasks.values(), self.assignee_calendars)
+        # Calendars a changed or removed task was on before the change may hold blocks to drop
+        previous = [task for task in [*changed.values(), *removed.values()] if task is not None]
+        vacated = {calendar_id for calendar_id, group in
+                   group_tasks_by_calendar(previous, self.assignee_calendars).items() if group}
+        replanned = set()
+        for calendar_id, group in groups.items():
+            snapshot = self.snapshots[calendar_id]
+            candidates = {task["id"]: task for task in group if task["id"] in changed}
+            if calendar_id in dirty:
+                changed_days = snapshot.refresh()
+                print(f"🔄 Calendar {calendar_id} changed on {len(changed_days)} days.")
+                if changed_days:
+                    candidates.update(self._displaced_tasks(snapshot, group, changed_days))
+
+            if candidates or full or calendar_id in vacated:
+                # Reconciliation keeps the candidates' still-valid blocks and drops blocks of tasks
+                # no longer active on this calendar
+                tasks = sort_tasks(candidates.values())
+                schedule_tasks(analyze_active_tasks(tasks, snapshot, self.cache) if tasks else [], snapshot,
+                               active_tasks=group)
+                replanned.update(candidates)
+        print(f"♻️ Replanned {len(replanned)} of {len(self.tasks)} tasks in {time.monotonic() - started:.2f}s.")
+
+    def start_watch(self, calendar_id):
+        """Opens (or renews) the push channel of `calendar_id` when WEBHOOK_URL is set."""
+        if not WEBHOOK_URL:
+            return
+        body = {"id": str(uuid.uuid4()), "type": "web_hook", "address": WEBHOOK_URL,
+                "params": {"ttl": str(WATCH_TTL_SECONDS)}}
+        if WEBHOOK_TOKEN:
+            body["token"] = WEBHOOK_TOKEN
+        try:
+            request = get_calendar_service().events().watch(calendarId=calendar_id, body=body)
+            channel = rate_limit.call("calendar", request.execute)
+        except Exception as e:
+            print(f"❌ Error opening watch channel for calendar {calendar_id}: {e}")
+            return
+        with self._lock:
+            previous, self.channels[calendar_id] = self.channels.get(calendar_id), channel
+        if previous:
+            self.stop_watch(previous)
+        print(f"👀 Watching calendar {calendar_id} via channel {channel['id']} until {channel.get('expiration')}.")
+
+    def stop_watch(self, channel):
+        try:
+            request = get_calendar_service().channels().stop(
+                body={"id": channel["id"], "resourceId": channel["resourceId"]})
+            rate_limit.call("calendar", request.execute)
+        except Exception as e:
+            print(f"⚠️ Could not stop watch channel {channel['id']}: {e}")
+
+    def _expiring_watches(self):
+        """Calendars whose channel expires within WATCH_RENEW_MARGIN_SECONDS."""
+        return [calendar_id for calendar_id, channel in self.channels.items() if channel.get("expiration")
+                and int(channel["expiration"]) / 1000.0 - time.time() < WATCH_RENEW_MARGIN_SECONDS]
+
+    def serve_forever(self):
+        """Starts the webhook server, runs one full pass, then replans on changes until stop()."""
+        self.server = HTTPServer((self.host, self.port), WebhookHandler)
+        self.server.scheduler = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"🚀 Scheduler daemon listening on {self.host}:{self.server.server_port}.")
+
+        self.snapshots = {calendar_id: load_calendar_snapshot(calendar_id) for calendar_id in self.calendar_ids}
+        self.poll_notion()
+        for calendar_id in self.calendar_ids:
+            self.start_watch(calendar_id)
+        self.replan()
+        instrumentation.export()
+
+        next_notion_poll = time.monotonic() + NOTION_POLL_SECONDS
+        next_calendar_poll = time.monotonic() + CALENDAR_POLL_SECONDS
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                with self._lock:
+                    # Changes wait (and pile up) until Notion has been fetched once
+                    pending = self.notion_synced and bool(
+                        self._dirty_calendars or self._changed or self._removed or self._full_pass)
+                    poll_now, self._poll_notion_now = self._poll_notion_now, False
+                    quiet_until = self._last_change + DEBOUNCE_SECONDS
+                if poll_now or now >= next_notion_poll:
+                    self.poll_notion()
+                    next_notion_poll = time.monotonic() + NOTION_POLL_SECONDS
+                    continue
+                unwatched = [calendar_id for calendar_id in self.calendar_ids if calendar_id not in self.channels]
+                if unwatched and now >= next_calendar_poll:
+                    for calendar_id in unwatched:
+                        self.notify_calendar_change(calendar_id)
+                    next_calendar_poll = now + CALENDAR_POLL_SECONDS
+                    continue
+                for calendar_id in self._expiring_watches():
+                    self.start_watch(calendar_id)
+                if pending and now >= quiet_until:
+                    self.replan()
+                    instrumentation.export()
+                    continue
+                wake_at = min(next_notion_poll, quiet_until if pending else next_notion_poll)
+                if unwatched:
+                    wake_at = min(wake_at, next_calendar_poll)
+                self._wake.wait(max(0.0, wake_at - time.monotonic()))
+                self._wake.clear()
+        finally:
+            for channel in list(self.channels.values()):
+                self.stop_watch(channel)
+            self.server.shutdown()
+            self.server.server_close()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """
+    POST from Google Calendar push notifications (X-Goog-* headers),
+    POST /notion to trigger a Notion poll, GET /healthz for status.
+    """
+
+    def do_POST(self):
+        scheduler = self.server.scheduler
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        state = self.headers.get("X-Goog-Resource-State")
+        if self.path.rstrip("/") == "/notion":
+            scheduler.request_notion_poll()
+        elif state:
+            if WEBHOOK_TOKEN and self.headers.get("X-Goog-Channel-Token") != WEBHOOK_TOKEN:
+                self._reply(403, {"error": "bad channel token"})
+                return
+            calendar_id = scheduler.calendar_for_channel(self.headers.get("X-Goog-Channel-ID"))
+            if scheduler.channels and calendar_id is None:
+                # A stale channel from before a renewal or restart
+                self._reply(200, {"ignored": True})
+                return
+            if state != "sync":  # "sync" only confirms a new channel
+                scheduler.notify_calendar_change(calendar_id)
+        else:
+            self._reply(404, {"error": "unknown endpoint"})
+            return
+        self._reply(200, {"ok": True})
+
+    def do_GET(self):
+        scheduler = self.server.scheduler
+        if self.path.rstrip("/") != "/healthz":
+            self._reply(404, {"error": "unknown endpoint"})
+            return
+        self._reply(200, {
+            "tasks": len(scheduler.tasks),
+            "notion_synced": scheduler.notion_synced,
+            "channels": {calendar_id: channel["id"] for calendar_id, channel in scheduler.channels.items()},
+            "cache": scheduler.cache.stats(),
+        })
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    daemon = SchedulerDaemon()
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        daemon.stop()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+import base64
+import datetime
+import hashlib
+import os
+import uuid
+
+from calendar_snapshot import MST, parse_event_times
+from event_store import connect
+from reconcile import event_page_id
+
+# Which calendar blocks belong to which Notion task, and the state of each scheduling run
+TASK_EVENT_STORE_PATH = os.getenv("SCHEDULER_TASK_EVENTS_PATH", "/home/moneybot/scheduler/googlecal/task_events.db")
+# Blocks that ended longer ago than this are dropped from the index
+RETENTION_DAYS = 7
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS task_events (
+    calendar_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    page_id TEXT NOT NULL,
+    start_ts REAL NOT NULL,
+    end_ts REAL NOT NULL,
+    state TEXT NOT NULL,
+    run_id TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (calendar_id, event_id)
+);
+CREATE INDEX IF NOT EXISTS task_events_by_page ON task_events (calendar_id, page_id);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    calendar_id TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_by_calendar ON runs (calendar_id, started_at);
+"""
+
+
+def event_id_for(calendar_id, page_id, start, end, run_id):
+    """
+    Deterministic Calendar event id (base32hex, as the API requires) for one
+    planned block. Re-sending the insert after a crash or a lost response
+    reuses the id, so Google answers 409 instead of creating a duplicate.
+    """
+    key = f"{calendar_id}|{page_id}|{start.isoformat()}|{end.isoformat()}|{run_id}"
+    return base64.b32hexencode(hashlib.sha1(key.encode()).digest()).decode().lower().rstrip("=")
+
+
+def _now():
+    return datetime.datetime.now(tz=MST).isoformat()
+
+
+class TaskEventStore:
+    """
+    SQLite index of the blocks the scheduler wrote: page id -> event ids and
+    planned ranges, plus one row per scheduling run.
+
+    Inserts are recorded as "pending" before they are sent and marked
+    "written" once the API confirms them. A run that dies half way leaves
+    its run row unfinished; the next start_run() on that calendar resumes
+    it, so re-planned blocks get the same deterministic event ids.
+    """
+
+    def __init__(self, path=TASK_EVENT_STORE_PATH):
+        self.conn = connect(path, SCHEMA)
+
+    def start_run(self, calendar_id):
+        """Returns (run id, resumed): the unfinished run on this calendar, or a new one."""
+        row = self.conn.execute(
+            "SELECT run_id, finished_at FROM runs WHERE calendar_id = ? ORDER BY started_at DESC LIMIT 1",
+            (calendar_id,),
+        ).fetchone()
+        if row and row[1] is None:
+            return row[0], True
+        run_id = uuid.uuid4().hex
+        with self.conn:
+            self.conn.execute("INSERT INTO runs (run_id, calendar_id, started_at) VALUES (?, ?, ?)",
+                              (run_id, calendar_id, _now()))
+        return run_id, False
+
+    def finish_run(self, run_id):
+        """Marks the run complete, forgets inserts it never got confirmed and prunes old blocks."""
+        cutoff = datetime.datetime.now(tz=MST) - datetime.timedelta(days=RETENTION_DAYS)
+        with self.conn:
+            self.conn.execute("DELETE FROM task_events WHERE run_id = ? AND state = 'pending'", (run_id,))
+            self.conn.execute("DELETE FROM task_events WHERE end_ts < ?", (cutoff.timestamp(),))
+            self.conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (_now(), run_id))
+
+    def event_pages(self, calendar_id):
+        """Maps event id -> page id for every block recorded on the calendar."""
+        rows = self.conn.execute("SELECT event_id, page_id FROM task_events WHERE calendar_id = ?", (calendar_id,))
+        return dict(rows)
+
+    def pending(self, run_id):
+        """Event ids of inserts sent (or about to be) in `run_id` and not yet confirmed."""
+        rows = self.conn.execute("SELECT event_id FROM task_events WHERE run_id = ? AND state = 'pending'", (run_id,))
+        return [event_id for (event_id,) in rows]
+
+    def record_pending(self, calendar_id, run_id, blocks):
+        """Records inserts about to be sent: `blocks` are (event id, page id, start, end)."""
+        now = _now()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO task_events "
+                "(calendar_id, event_id, page_id, start_ts, end_ts, state, run_id, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 'pending', ?, ?)",
+                [(calendar_id, event_id, page_id, start.timestamp(), end.timestamp(), run_id, now)
+                 for event_id, page_id, start, end in blocks],
+            )
+
+    def confirm(self, calendar_id, event_ids):
+        """Marks pending inserts that turned out to be on the calendar as written."""
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE task_events SET state = 'written', updated_at = ? WHERE calendar_id = ? AND event_id = ?",
+                [(_now(), calendar_id, event_id) for event_id in event_ids],
+            )
+
+    def apply_results(self, calendar_id, results):
+        """
+        Updates the index from CalendarWriteBatch.flush() results in one
+        transaction: confirmed inserts and patches are stored with their
+        current range, deleted blocks and failed inserts are dropped.
+        """
+        now = _now()
+        with self.conn:
+            for result in results:
+                event_id = result.get("event_id")
+                if result["ok"] and result["op"] in ("insert", "patch"):
+                    event = result["response"] or {}
+                    page_id = event_page_id(event)
+                    if not page_id:
+                        continue
+                    start, end = parse_event_times(event)
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO task_events "
+                        "(calendar_id, event_id, page_id, start_ts, end_ts, state, run_id, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, 'written', "
+                        "(SELECT run_id FROM task_events WHERE calendar_id = ? AND event_id = ?), ?)",
+                        (calendar_id, event["id"], page_id, start.timestamp(), end.timestamp(),
+                         calendar_id, event["id"], now),
+                    )
+                elif event_id and (result["ok"] or result["op"] == "insert"):
+                    self.conn.execute("DELETE FROM task_events WHERE calendar_id = ? AND event_id = ?",
+                                      (calendar_id, event_id))
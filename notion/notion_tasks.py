@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+import datetime
+import json
+import os
+from urllib.parse import unquote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from common import instrumentation, rate_limit
+
+# Notion API version
+NOTION_VERSION = "2022-06-28"
+# Default database ID (from your schema)
+DATABASE_ID = "6b493da2-f61e-4e6b-a6ae-0af71f753d33"
+# Base URL, overridable to point at a local stand-in server
+NOTION_API_URL = os.getenv("NOTION_API_URL", "https://api.notion.com/v1")
+# Same env file the shell scripts source for NOTION_API_KEY
+NOTION_ENV_FILE = "/home/moneybot/.notion_env"
+# Largest page size the Notion API accepts for database queries
+PAGE_SIZE = 100
+# Local copy of the active tasks plus the last_edited_time checkpoint
+TASK_CACHE_PATH = os.getenv("NOTION_TASK_CACHE_PATH", "/home/moneybot/scheduler/notion/task_cache.json")
+# Re-download every active task this often so archived/deleted pages drop out of the cache
+FULL_REFRESH_HOURS = 24
+# Properties read by project_page; only these are requested from Notion
+TASK_PROPERTIES = [
+    "Project name", "Priority", "Status", "Dates", "Total Build Time", "Description",
+    "Tags", "Dependencies", "Complexity", "Assigned To",
+]
+
+_session = None
+
+
+def load_api_key(env_file=NOTION_ENV_FILE):
+    """Reads NOTION_API_KEY from the environment, falling back to the .notion_env file."""
+    api_key = os.getenv("NOTION_API_KEY")
+    if api_key:
+        return api_key
+    try:
+        with open(env_file) as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("export "):
+                    line = line[len("export "):]
+                if line.startswith("NOTION_API_KEY="):
+                    return line.split("=", 1)[1].strip().strip("\"'")
+    except OSError as e:
+        print(f"❌ Could not read {env_file}: {e}")
+    return None
+
+
+def get_session():
+    """Returns the shared, connection-pooled Notion session, creating it on first use."""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({
+            "Authorization": f"Bearer {load_api_key()}",
+            "Notion-Version": NOTION_VERSION,
+            "Content-Type": "application/json",
+        })
+        _session = session
+    return _session
+
+
+def build_filter(title=None, owner=None, status=None, not_status=None, priority=None, dates=None,
+                 due_before=None, due_after=None, edited_since=None):
+    """
+    Builds a Notion query filter, mirroring the flags of query_notion_database.sh.
+    Returns None when no condition is given.
+    """
+    filters = []
+    if title:
+        filters.append({"property": "Project name", "title": {"contains": title}})
+    if owner:
+        filters.append({"property": "Owner", "people": {"contains": owner}})
+    if status:
+        filters.append({"property": "Status", "status": {"equals": status}})
+    if not_status:
+        filters.append({"property": "Status", "status": {"does_not_equal": not_status}})
+    if priority:
+        filters.append({"property": "Priority", "select": {"equals": priority}})
+    if dates:
+        filters.append({"property": "Dates", "date": {"equals": dates}})
+    if due_before:
+        filters.append({"property": "Dates", "date": {"on_or_before": due_before}})
+    if due_after:
+        filters.append({"property": "Dates", "date": {"on_or_after": due_after}})
+    if edited_since:
+        filters.append({"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": edited_since}})
+    if len(filters) > 1:
+        return {"and": filters}
+    return filters[0] if filters else None
+
+
+def _request(method, endpoint, url, **kwargs):
+    """One Notion API request; raises for error statuses so rate_limit can retry 429s and 5xx."""
+    response = method(url, **kwargs)
+    instrumentation.count("api_requests", service="notion", endpoint=endpoint)
+    instrumentation.count("bytes", len(response.content), service="notion", direction="received")
+    response.raise_for_status()
+    return response
+
+
+def fetch_property_ids(database_id=DATABASE_ID, session=None):
+    """Maps property names to the ids that filter_properties expects."""
+    session = session or get_session()
+    response = rate_limit.call("notion", _request, session.get, "databases.retrieve",
+                               f"{NOTION_API_URL}/databases/{database_id}")
+    # Ids come back percent-encoded; unquote so requests encodes them exactly once
+    return {name: unquote(prop["id"]) for name, prop in response.json().get("properties", {}).items()}
+
+
+def iter_database_pages(query=None, database_id=DATABASE_ID, session=None, property_ids=None):
+    """
+    Yields every page matching `query`, following has_more/next_cursor so
+    databases larger than one page are returned in full. When `property_ids`
+    is given, only those properties are returned for each page.
+    """
+    session = session or get_session()
+    body = dict(query or {})
+    body["page_size"] = PAGE_SIZE
+    params = {"filter_properties": property_ids} if property_ids else None
+    while True:
+        data = json.dumps(body)
+        instrumentation.count("bytes", len(data), service="notion", direction="sent")
+        response = rate_limit.call("notion", _request, session.post, "databases.query",
+                                   f"{NOTION_API_URL}/databases/{database_id}/query", params=params, data=data)
+        result = response.json()
+        yield from result.get("results", [])
+        if not result.get("has_more") or not result.get("next_cursor"):
+            break
+        body["start_cursor"] = result["next_cursor"]
+
+
+def _prop(page, name, *path):
+    value = page.get("properties", {}).get(name)
+    for key in path:
+        if isinstance(value, list):
+            value = value[key] if len(value) > key else None
+        elif isinstance(value, dict):
+            value = value.get(key)
+        else:
+            return None
+    return value
+
+
+def _or(value, default):
+    # Same fallback semantics as jq's `//` operator
+    return default if value is None or value is False else value
+
+
+def _names(items, key):
+    return ", ".join((item.get(key) or "") for item in (items or []))
+
+
+def project_page(page):
+    """Projects a Notion page onto the task fields the scheduler uses."""
+    return {
+        "id": page.get("id"),
+        "name": _or(_prop(page, "Project name", "title", 0, "plain_text"), "Untitled"),
+        "priority": _or(_prop(page, "Priority", "select", "name"), "No Priority"),
+        "status": _or(_prop(page, "Status", "status", "name"), "No Status"),
+        "due": _or(_prop(page, "Dates", "date", "start"), "No Due Date"),
+        "build_time": _or(_prop(page, "Total Build Time", "number"), 0),
+        "url": page.get("url"),
+        "description": _or(_prop(page, "Description", "rich_text", 0, "plain_text"), ""),
+        "tags": _names(_prop(page, "Tags", "multi_select"), "name"),
+        "dependencies": _names(_prop(page, "Dependencies", "relation"), "id"),
+        "complexity": _or(_prop(page, "Complexity", "select", "name"), "Unknown"),
+        "assigned_to": _names(_prop(page, "Assigned To", "people"), "name"),
+    }
+
+
+def iter_tasks(query=None, property_ids=None):
+    """Yields projected tasks as each page of query results arrives."""
+    for page in iter_database_pages(query, property_ids=property_ids):
+        yield project_page(page), page.get("last_edited_time")
+
+
+def _sort_tasks(tasks):
+    # Same order generate_todo_list.sh produced (jq sort_by(.priority, .due))
+    return sorted(tasks, key=lambda task: (task["priority"], task["due"]))
+
+
+def fetch_tasks(query=None):
+    """Returns every task matching `query`, ordered like generate_todo_list.sh output."""
+    return _sort_tasks(task for task, _ in iter_tasks(query))
+
+
+def load_task_cache(path=TASK_CACHE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_task_cache(cache, path=TASK_CACHE_PATH):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, path)
+
+
+@instrumentation.traced("notion_fetch")
+def fetch_active_tasks(cache_path=TASK_CACHE_PATH):
+    """
+    Returns every task that is not Done, downloading as little as possible.
+
+    The first run (and one run every FULL_REFRESH_HOURS) fetches all non-Done
+    pages with the status filter pushed down to Notion. Other runs only fetch
+    pages edited since the stored last_edited_time checkpoint and merge them
+    into the cached set, dropping any that became Done.
+    """
+    cache = load_task_cache(cache_path)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    refreshed_at = cache.get("refreshed_at")
+    full_refresh = (
+        not cache.get("checkpoint")
+        or not refreshed_at
+        or now - datetime.datetime.fromisoformat(refreshed_at) > datetime.timedelta(hours=FULL_REFRESH_HOURS)
+    )
+
+    property_ids = cache.get("property_ids")
+    if not property_ids:
+        try:
+            names = fetch_property_ids()
+            property_ids = [names[name] for name in TASK_PROPERTIES if name in names]
+        except Exception as e:
+            print(f"⚠️ Could not read database properties, fetching all of them: {e}")
+            property_ids = None
+
+    if full_refresh:
+        query = {"filter": build_filter(not_status="Done")}
+        tasks = {}
+    else:
+        query = {"filter": build_filter(edited_since=cache["checkpoint"])}
+        tasks = cache.get("tasks", {})
+
+    checkpoint = cache.get("checkpoint")
+    fetched = 0
+    for task, last_edited in iter_tasks(query, property_ids):
+        fetched += 1
+        if task["status"].lower() == "done":
+            tasks.pop(task["id"], None)
+        else:
+            tasks[task["id"]] = task
+        if last_edited and (not checkpoint or last_edited > checkpoint):
+            checkpoint = last_edited
+
+    if not checkpoint:
+        # Notion rounds last_edited_time down to the minute, so never start past the run's minute
+        checkpoint = now.replace(second=0, microsecond=0).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    cache.update({
+        "checkpoint": checkpoint,
+        "property_ids": property_ids,
+        "tasks": tasks,
+    })
+    if full_refresh:
+        cache["refreshed_at"] = now.isoformat()
+    save_task_cache(cache, cache_path)
+    instrumentation.count("cache_requests", cache="notion_tasks", result="miss" if full_refresh else "hit")
+    print(f"📥 {'Full' if full_refresh else 'Incremental'} Notion fetch: {fetched} pages, "
+          f"{len(tasks)} active tasks.")
+    return _sort_tasks(tasks.values())
+
+
+if __name__ == "__main__":
+    print(json.dumps(fetch_tasks(), indent=2))
@@ -0,0 +1,38 @@
+import datetime
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# googlecal scripts import their siblings directly; the other packages are imported from the repo root
+sys.path[:0] = [ROOT, os.path.join(ROOT, "googlecal")]
+
+from bench.fakes import FakeCalendarService
+from calendar_snapshot import CalendarSnapshot
+from planner import MST
+from reconcile import PAGE_ID_PROPERTY
+
+# A Monday, so the first planning day is a working day
+MONDAY = datetime.date(2030, 1, 7)
+# Planning starts before working hours on MONDAY
+NOW = datetime.datetime(2030, 1, 7, 8, 0, tzinfo=MST)
+
+
+def at(day_offset, hour, minute=0):
+    """MST datetime `day_offset` days after MONDAY."""
+    day = MONDAY + datetime.timedelta(days=day_offset)
+    return datetime.datetime.combine(day, datetime.time(hour, minute)).replace(tzinfo=MST)
+
+
+def calendar_event(summary, start, end, page_id=None, event_id=None):
+    """A Calendar API event; `page_id` tags it as a scheduler-owned block of that task."""
+    event = {"summary": summary, "start": {"dateTime": start.isoformat()}, "end": {"dateTime": end.isoformat()}}
+    if page_id:
+        event["extendedProperties"] = {"private": {PAGE_ID_PROPERTY: page_id}}
+    if event_id:
+        event["id"] = event_id
+    return event
+
+
+def load_snapshot(events=(), horizon_days=7):
+    return CalendarSnapshot(FakeCalendarService(events), "test-calendar", start_date=MONDAY,
+                            horizon_days=horizon_days).load()
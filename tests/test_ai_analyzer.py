@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from chatgpt.ai_analyzer import JsonObjectStream, chunk_tasks
+from chatgpt.prompt_context import count_tokens, encode_json
+
+TRICKY = [
+    {"name": "Fix {braces} in templates", "task_type": "focus"},
+    {"name": "Quote \"}\" and a backslash \\", "task_type": "admin", "meta": {"nested": {"depth": 2}}},
+    {"name": "Unicode é and \\\" escaped quote", "task_type": "focus"},
+]
+
+
+def feed_all(text, step):
+    stream = JsonObjectStream()
+    objects = []
+    for offset in range(0, len(text), step):
+        objects.extend(stream.feed(text[offset:offset + step]))
+    return objects
+
+
+@pytest.mark.parametrize("step", [1, 3, 7, 10_000])
+def test_objects_survive_any_split_of_the_stream(step):
+    text = "```json\n" + json.dumps(TRICKY, indent=2) + "\n```"
+    assert feed_all(text, step) == TRICKY
+
+
+def test_prose_and_separators_between_objects_are_skipped():
+    text = 'Here you go: [{"a": 1}, then {"b": "}"}] done'
+    assert feed_all(text, 4) == [{"a": 1}, {"b": "}"}]
+
+
+def test_truncated_output_keeps_the_complete_objects():
+    text = json.dumps(TRICKY)
+    cut = text[:text.index("Unicode") + 3]
+    assert feed_all(cut, 5) == TRICKY[:2]
+
+
+def test_objects_are_returned_as_soon_as_they_close():
+    stream = JsonObjectStream()
+    assert stream.feed('[{"a": "x{') == []
+    assert stream.feed('"}, {"b"') == [{"a": "x{"}]
+    assert stream.feed(': 2}]') == [{"b": 2}]
+
+
+def test_a_malformed_object_is_dropped_and_parsing_continues():
+    assert feed_all('[{"a": 1,}, {"b": 2}]', 3) == [{"b": 2}]
+
+
+def test_chunk_tasks_respects_the_token_budget_and_task_cap():
+    tasks = [{"name": f"Task {number}", "description": "x" * 200} for number in range(10)]
+    cost = count_tokens(encode_json(tasks[0]))
+    chunks = chunk_tasks(tasks, token_budget=cost * 3, max_tasks=2)
+    assert [len(chunk) for chunk in chunks] == [2, 2, 2, 2, 2]
+    chunks = chunk_tasks(tasks, token_budget=cost * 3, max_tasks=10)
+    assert [len(chunk) for chunk in chunks] == [3, 3, 3, 1]
+    assert [task for chunk in chunks for task in chunk] == tasks
+
+
+def test_a_task_over_budget_still_gets_its_own_chunk():
+    tasks = [{"name": "small"}, {"name": "big", "description": "x" * 4000}, {"name": "small too"}]
+    assert [len(chunk) for chunk in chunk_tasks(tasks, token_budget=50, max_tasks=10)] == [1, 1, 1]
@@ -0,0 +1,23 @@
+import pytest
+
+from chatgpt.analysis_cache import AnalysisCache, content_hash
+from chatgpt.prompt_context import PROMPT_TASK_FIELDS
+
+TASK = {"name": "Write report", "description": "Quarterly numbers", "priority": "High", "due": "2030-01-31",
+        "status": "In progress", "build_time": 2, "tags": "docs", "complexity": "Low", "url": "u1"}
+
+
+@pytest.mark.parametrize("field", PROMPT_TASK_FIELDS)
+def test_every_prompt_field_changes_the_key(field):
+    assert content_hash({**TASK, field: "edited"}) != content_hash(TASK)
+
+
+def test_fields_outside_the_prompt_keep_the_key():
+    assert content_hash({**TASK, "url": "u2"}) == content_hash(TASK)
+
+
+def test_edited_tags_miss_the_cache(tmp_path):
+    cache = AnalysisCache(str(tmp_path / "cache.json"))
+    cache.put(TASK, {"task_type": "focus", "build_time": 2})
+    assert cache.get(TASK) == {"task_type": "focus", "build_time": 2}
+    assert cache.get({**TASK, "tags": "meeting"}) is None
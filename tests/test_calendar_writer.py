@@ -0,0 +1,109 @@
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from bench.fakes import FakeCalendarService, FakeEvents, FakeRequest
+from calendar_writer import CalendarWriteBatch
+from common import rate_limit
+from conftest import at, calendar_event
+
+CALENDAR = "test-calendar"
+
+
+def http_error(status):
+    return HttpError(httplib2.Response({"status": status}), b'{"error": {}}')
+
+
+class GoogleLikeEvents(FakeEvents):
+    def insert(self, calendarId, body, **kwargs):
+        return FakeRequest(self.calendar, "calendar.events.insert", lambda: self.calendar.insert_event(dict(body)))
+
+
+class GoogleLikeService(FakeCalendarService):
+    """
+    Rejects an insert whose id already exists with 409, like Google, and
+    throttles (429) the first `throttled` inserts of each summary in `flaky`.
+    """
+
+    def __init__(self, events=(), flaky=(), throttled=1):
+        super().__init__(events)
+        self.flaky = {summary: throttled for summary in flaky}
+
+    def events(self):
+        return GoogleLikeEvents(self)
+
+    def insert_event(self, event):
+        if self.flaky.get(event.get("summary")):
+            self.flaky[event["summary"]] -= 1
+            raise http_error(429)
+        if event.get("id") in self.events_by_id:
+            raise http_error(409)
+        return self.put_event(event)
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    """A fresh, roomy calendar limiter and no backoff sleeps."""
+    monkeypatch.setattr(rate_limit, "_limiters", {})
+    monkeypatch.setitem(rate_limit.SERVICE_LIMITS, "calendar", {"rate": 1000.0, "burst": 1000, "max_concurrency": 8})
+    monkeypatch.setattr(rate_limit, "backoff_delay", lambda attempt, retry_after=None: 0)
+
+
+def block(summary, hour):
+    return calendar_event(summary, at(0, hour), at(0, hour + 1))
+
+
+def test_writes_go_out_in_batches_of_at_most_the_limit():
+    service = GoogleLikeService()
+    writer = CalendarWriteBatch(service, CALENDAR)
+    for number in range(120):
+        writer.insert(block(f"Task {number}", 9))
+    results = writer.flush()
+    assert len(results) == 120 and all(result["ok"] for result in results)
+    assert service.counter.calls["calendar.batch"] == 3
+    assert writer.api_calls == 3
+    assert len(writer) == 0
+
+
+def test_throttled_items_are_resent_without_the_rest_of_the_batch():
+    service = GoogleLikeService(flaky=["B"])
+    writer = CalendarWriteBatch(service, CALENDAR)
+    outcomes = []
+    for summary in "ABC":
+        writer.insert(block(summary, 9), on_done=lambda response, error: outcomes.append((response["summary"], error)))
+    results = writer.flush()
+    assert [result["ok"] for result in results] == [True, True, True]
+    # One callback per item, with its final outcome only
+    assert sorted(outcomes) == [("A", None), ("B", None), ("C", None)]
+    assert service.counter.calls["calendar.batch"] == 2
+    assert service.counter.calls["calendar.events.insert[batched]"] == 4
+
+
+def test_items_still_throttled_after_max_retries_fail():
+    service = GoogleLikeService(flaky=["B"], throttled=rate_limit.MAX_RETRIES + 1)
+    writer = CalendarWriteBatch(service, CALENDAR)
+    writer.insert(block("B", 9))
+    (result,) = writer.flush()
+    assert not result["ok"]
+    assert rate_limit.http_status(result["error"]) == 429
+    assert service.counter.calls["calendar.batch"] == rate_limit.MAX_RETRIES + 1
+
+
+def test_409_on_an_insert_with_its_own_id_counts_as_success():
+    existing = dict(block("A", 9), id="abc123")
+    service = GoogleLikeService([existing])
+    writer = CalendarWriteBatch(service, CALENDAR)
+    writer.insert(dict(block("A", 9), id="abc123"))
+    (result,) = writer.flush()
+    assert result["ok"] and result["event_id"] == "abc123"
+    assert result["response"]["summary"] == "A"
+
+
+def test_other_client_errors_are_reported_without_retrying():
+    service = GoogleLikeService()
+    writer = CalendarWriteBatch(service, CALENDAR)
+    writer.delete("missing")
+    writer.insert(block("A", 9))
+    results = writer.flush()
+    assert [result["ok"] for result in results] == [False, True]
+    assert service.counter.calls["calendar.batch"] == 1
@@ -0,0 +1,82 @@
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from bench.fakes import FakeCalendarService
+from conftest import at, calendar_event
+from event_store import EventStore
+
+CALENDAR = "test-calendar"
+
+
+class ExpiringTokenService(FakeCalendarService):
+    """Answers 410 Gone to the next list call that carries a syncToken."""
+
+    expire_next_token = False
+
+    def list_events(self, time_min, time_max, max_results, page_token, sync_token):
+        if sync_token and self.expire_next_token:
+            self.expire_next_token = False
+            raise HttpError(httplib2.Response({"status": 410}), b'{"error": {"code": 410}}')
+        return super().list_events(time_min, time_max, max_results, page_token, sync_token)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return EventStore(str(tmp_path / "events.db"))
+
+
+def stored(store):
+    return sorted(event["summary"] for event in store.load(CALENDAR, at(0, 0), at(7, 0)))
+
+
+def test_first_sync_copies_the_whole_calendar(store):
+    service = FakeCalendarService([calendar_event("Standup", at(0, 9), at(0, 10)),
+                                   calendar_event("Review", at(1, 14), at(1, 15))])
+    api_calls, changed = store.sync(service, CALENDAR)
+    assert (api_calls, len(changed)) == (1, 2)
+    assert stored(store) == ["Review", "Standup"]
+    assert [e["summary"] for e in store.load(CALENDAR, at(1, 0), at(2, 0))] == ["Review"]
+
+
+def test_later_syncs_fetch_only_the_changes(store):
+    service = FakeCalendarService([calendar_event("Standup", at(0, 9), at(0, 10), event_id="a"),
+                                   calendar_event("Review", at(1, 14), at(1, 15), event_id="b"),
+                                   calendar_event("Demo", at(2, 9), at(2, 10), event_id="c")])
+    store.sync(service, CALENDAR)
+
+    service.events().patch(CALENDAR, "a", {"summary": "Standup (moved)"}).execute()
+    service.events().delete(CALENDAR, "b").execute()
+    service.events().insert(CALENDAR, calendar_event("Retro", at(3, 9), at(3, 10))).execute()
+    _, changed = store.sync(service, CALENDAR)
+
+    assert sorted(event["id"] for event in changed if event.get("status") != "cancelled") == ["a", "fake1"]
+    assert [event["id"] for event in changed if event.get("status") == "cancelled"] == ["b"]
+    assert stored(store) == ["Demo", "Retro", "Standup (moved)"]
+
+    _, changed = store.sync(service, CALENDAR)
+    assert changed == []
+
+
+def test_expired_sync_token_falls_back_to_a_full_resync(store):
+    service = ExpiringTokenService([calendar_event("Standup", at(0, 9), at(0, 10), event_id="a"),
+                                    calendar_event("Review", at(1, 14), at(1, 15), event_id="b")])
+    store.sync(service, CALENDAR)
+    service.events().delete(CALENDAR, "b").execute()
+    service.expire_next_token = True
+
+    api_calls, changed = store.sync(service, CALENDAR)
+    # The rejected incremental call plus the full listing
+    assert api_calls == 2
+    assert [event["id"] for event in changed] == ["a"]
+    assert stored(store) == ["Standup"]
+
+    # The resync stored a fresh token, so the next run is incremental again
+    _, changed = store.sync(service, CALENDAR)
+    assert changed == []
+
+
+def test_calendars_are_kept_apart(store):
+    store.sync(FakeCalendarService([calendar_event("Standup", at(0, 9), at(0, 10))]), CALENDAR)
+    store.sync(FakeCalendarService([calendar_event("Other", at(0, 9), at(0, 10))]), "other-calendar")
+    assert stored(store) == ["Standup"]
@@ -0,0 +1,81 @@
+import datetime
+import json
+
+import pytest
+
+from bench.fakes import FakeNotion
+from common import rate_limit
+from notion import notion_tasks
+
+OLDEST = "2030-01-05T16:00:00.000Z"
+EARLIER = "2030-01-06T10:00:00.000Z"
+LATER = "2030-01-07T09:30:00.000Z"
+
+
+def page(number, name, status="In progress", edited=EARLIER):
+    page_id = f"00000000-0000-0000-0000-{number:012d}"
+    return {"object": "page", "id": page_id, "url": "", "last_edited_time": edited, "properties": {
+        "Project name": {"type": "title", "title": [{"plain_text": name}]},
+        "Status": {"type": "status", "status": {"name": status}},
+    }}
+
+
+@pytest.fixture
+def notion(monkeypatch):
+    """The fake Notion database, with the module pointed at it and a fresh session."""
+    fake = FakeNotion(property_names=notion_tasks.TASK_PROPERTIES)
+    monkeypatch.setenv("NOTION_API_KEY", "test")
+    monkeypatch.setattr(notion_tasks, "NOTION_API_URL", fake.base_url)
+    monkeypatch.setattr(notion_tasks, "_session", None)
+    monkeypatch.setattr(rate_limit, "_limiters", {})
+    yield fake
+    fake.close()
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "task_cache.json")
+
+
+def names(tasks):
+    return sorted(task["name"] for task in tasks)
+
+
+def test_first_run_fetches_every_active_task(notion, cache_path):
+    notion.pages = [page(1, "Write report"), page(2, "Old work", status="Done", edited=LATER)]
+    assert names(notion_tasks.fetch_active_tasks(cache_path)) == ["Write report"]
+    with open(cache_path) as f:
+        cache = json.load(f)
+    # Done pages are filtered out by Notion, so only active pages move the checkpoint
+    assert cache["checkpoint"] == EARLIER
+    assert notion.counter.calls["notion.databases.retrieve"] == 1
+
+
+def test_later_runs_merge_only_the_edited_pages(notion, cache_path):
+    notion.pages = [page(1, "Write report", edited=OLDEST), page(2, "Review PR"), page(3, "Plan sprint")]
+    notion_tasks.fetch_active_tasks(cache_path)
+
+    notion.pages = [
+        # Edited before the checkpoint: not downloaded again, so the cached copy stays
+        page(1, "Write report (not refetched)", edited=OLDEST),
+        page(2, "Review PR", status="Done", edited=LATER),
+        page(3, "Plan sprint v2", edited=LATER),
+        page(4, "New task", edited=LATER),
+    ]
+    assert names(notion_tasks.fetch_active_tasks(cache_path)) == ["New task", "Plan sprint v2", "Write report"]
+    assert notion.counter.calls["notion.databases.query"] == 2
+    # Property ids are cached with the tasks
+    assert notion.counter.calls["notion.databases.retrieve"] == 1
+
+
+def test_stale_cache_gets_a_full_refresh(notion, cache_path):
+    notion.pages = [page(1, "Write report"), page(2, "Deleted later")]
+    notion_tasks.fetch_active_tasks(cache_path)
+    cache = notion_tasks.load_task_cache(cache_path)
+    stale = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=notion_tasks.FULL_REFRESH_HOURS + 1)
+    cache["refreshed_at"] = stale.isoformat()
+    notion_tasks.save_task_cache(cache, cache_path)
+
+    # Deleted pages never show up as edits; only a full refresh drops them
+    notion.pages = [page(1, "Write report")]
+    assert names(notion_tasks.fetch_active_tasks(cache_path)) == ["Write report"]
@@ -0,0 +1,94 @@
+from conftest import NOW, at, load_snapshot
+from optimizer import dependency_order, optimize_plan, pack, plan_metrics
+from planner import CapacityLedger, task_sort_key
+
+
+def make_ledger(horizon_days=7):
+    return CapacityLedger.from_snapshot(load_snapshot(horizon_days=horizon_days), horizon_days, NOW)
+
+
+def task(task_id, build_time, priority="Medium", due="2030-01-31", dependencies=""):
+    return {"id": task_id, "name": task_id.title(), "status": "Not started", "priority": priority,
+            "due": due, "build_time": build_time, "dependencies": dependencies}
+
+
+def blocks_of(chunks, task_id):
+    return [(chunk["start"], chunk["end"]) for chunk in chunks if chunk["task"]["id"] == task_id]
+
+
+def test_dependency_order_puts_dependencies_first():
+    first = task("first", 1, priority="Medium")
+    second = task("second", 1, priority="High", dependencies="first")
+    other = task("other", 1, priority="No Priority")
+    order = dependency_order([second, other, first], task_sort_key)
+    assert [t["id"] for t in order] == ["first", "second", "other"]
+
+
+def test_dependency_order_ignores_unknown_dependencies():
+    lone = task("lone", 1, dependencies="finished-page")
+    assert dependency_order([lone], task_sort_key) == [lone]
+
+
+def test_dependency_order_keeps_tasks_in_a_cycle():
+    a = task("a", 1, priority="High", dependencies="b")
+    b = task("b", 1, dependencies="a")
+    assert [t["id"] for t in dependency_order([b, a], task_sort_key)] == ["a", "b"]
+
+
+def test_pack_starts_dependents_after_their_dependencies_finish():
+    first = task("first", 2)
+    second = task("second", 1, dependencies="first")
+    chunks, unplaced = pack([first, second], make_ledger())
+    assert unplaced == {}
+    assert blocks_of(chunks, "first") == [(at(0, 9), at(0, 11))]
+    assert blocks_of(chunks, "second") == [(at(0, 11), at(0, 12))]
+
+
+def test_pack_counts_booked_blocks_of_dependencies():
+    # The dependency is already on the calendar on Tuesday; its dependent may not start before that ends
+    fixed = [{"task": task("first", 1), "start": at(1, 10), "end": at(1, 11)}]
+    chunks, _ = pack([task("second", 1, dependencies="first")], make_ledger(), fixed)
+    assert blocks_of(chunks, "second") == [(at(1, 11), at(1, 12))]
+
+
+def test_pack_leaves_dependents_of_unplaced_tasks_unplaced():
+    too_big = task("too-big", 20)
+    after = task("after", 1, dependencies="too-big")
+    chunks, unplaced = pack([too_big, after], make_ledger(horizon_days=1))
+    assert blocks_of(chunks, "after") == []
+    assert set(unplaced) == {"too-big", "after"}
+
+
+def test_plan_metrics_counts_lateness_and_dependency_violations():
+    first = task("first", 1, due="2030-01-07")
+    second = task("second", 1, dependencies="first")
+    chunks = [
+        {"task": first, "start": at(1, 9), "end": at(1, 10)},
+        {"task": second, "start": at(0, 9), "end": at(0, 10)},
+    ]
+    metrics = plan_metrics([first, second], chunks, {}, 120)
+    assert metrics["late_tasks"] == 1
+    # Due Monday means the end of Monday's working day
+    assert metrics["total_lateness_hours"] == 17.0
+    assert metrics["dependency_violations"] == 1
+    assert metrics["utilization"] == 1.0
+
+
+def test_optimize_plan_meets_deadlines_greedy_order_misses():
+    # Priority-first would book the long task first and make the urgent one late
+    long_task = task("long", 6, priority="High", due="2030-01-18")
+    urgent = task("urgent", 2, priority="Medium", due="2030-01-07")
+    ledger = make_ledger()
+    chunks, unplaced = optimize_plan([long_task, urgent], ledger, time_budget=0.05)
+    assert unplaced == {}
+    metrics = plan_metrics([long_task, urgent], chunks, unplaced, ledger.capacity_minutes())
+    assert metrics["late_tasks"] == 0
+    assert metrics["dependency_violations"] == 0
+
+
+def test_optimize_plan_respects_dependencies_on_booked_blocks():
+    booked = task("booked", 1)
+    dependent = task("dependent", 2, due="2030-01-07", dependencies="booked")
+    fixed = [{"task": booked, "start": at(2, 14), "end": at(2, 15)}]
+    chunks, _ = optimize_plan([dependent], make_ledger(), time_budget=0.05, fixed=fixed)
+    assert min(start for start, _ in blocks_of(chunks, "dependent")) >= at(2, 15)
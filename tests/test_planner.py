@@ -0,0 +1,98 @@
+from conftest import NOW, at, calendar_event, load_snapshot
+from planner import DAILY_MAX_HOURS, MIN_CHUNK_MINUTES, CapacityLedger, plan_tasks, task_key
+
+
+def make_ledger(events=(), horizon_days=7, **kwargs):
+    return CapacityLedger.from_snapshot(load_snapshot(events, horizon_days), horizon_days, NOW, **kwargs)
+
+
+def minutes(start, end):
+    return int((end - start).total_seconds() // 60)
+
+
+def test_allocate_books_earliest_free_time():
+    ledger = make_ledger([calendar_event("Standup", at(0, 9), at(0, 10))])
+    assert ledger.allocate(60) == (at(0, 10), at(0, 11))
+    assert ledger.allocate(60) == (at(0, 11), at(0, 12))
+    # Lunch is never free
+    assert ledger.allocate(60) == (at(0, 13), at(0, 14))
+
+
+def test_allocate_returns_a_partial_block_when_the_slot_is_shorter():
+    ledger = make_ledger()
+    assert ledger.allocate(240) == (at(0, 9), at(0, 12))
+
+
+def test_allocate_respects_not_before():
+    ledger = make_ledger()
+    assert ledger.allocate(60, not_before=at(1, 14, 30)) == (at(1, 14, 30), at(1, 15, 30))
+
+
+def test_allocate_stops_at_daily_capacity():
+    ledger = make_ledger()
+    monday = []
+    block = ledger.allocate(60)
+    while block[0].date() == NOW.date():
+        monday.append(block)
+        block = ledger.allocate(60)
+    assert sum(minutes(start, end) for start, end in monday) == int(DAILY_MAX_HOURS * 60)
+    assert block == (at(1, 9), at(1, 10))
+
+
+def test_allocate_returns_none_when_the_horizon_is_full():
+    ledger = make_ledger(horizon_days=1)
+    assert ledger.allocate(int(DAILY_MAX_HOURS * 60)) == (at(0, 9), at(0, 12))
+    assert ledger.allocate(int(DAILY_MAX_HOURS * 60)) == (at(0, 13), at(0, 16, 30))
+    assert ledger.allocate(MIN_CHUNK_MINUTES) is None
+
+
+def test_allocate_whole_needs_an_unbroken_block():
+    ledger = make_ledger(horizon_days=1)
+    assert ledger.allocate_whole(300) is None
+    assert ledger.allocate_whole(240) == (at(0, 13), at(0, 17))
+    assert ledger.allocate_whole(60, deadline=at(0, 9, 30)) is None
+
+
+def test_reserve_and_release_round_trip():
+    ledger = make_ledger(horizon_days=1)
+    before = ledger.capacity_minutes()
+    assert ledger.fits(at(0, 9), at(0, 11))
+    ledger.reserve(at(0, 9), at(0, 11))
+    assert not ledger.fits(at(0, 10), at(0, 11))
+    assert ledger.capacity_minutes() == before - 120
+    ledger.release(at(0, 9), at(0, 11))
+    assert ledger.capacity_minutes() == before
+    assert ledger.allocate(180) == (at(0, 9), at(0, 12))
+
+
+def test_excluded_events_count_as_free():
+    ledger = make_ledger([calendar_event("Old block", at(0, 9), at(0, 12), event_id="old")], exclude={"old"})
+    assert ledger.allocate(60) == (at(0, 9), at(0, 10))
+
+
+def test_booked_events_use_up_their_day():
+    # Six hours of another task's blocks leave only 30 minutes of Monday's capacity
+    events = [calendar_event("Other task", at(0, 9), at(0, 12), event_id="a"),
+              calendar_event("Other task", at(0, 13), at(0, 16), event_id="b")]
+    ledger = make_ledger(events, booked={"a", "b"})
+    assert ledger.allocate(60) == (at(0, 16), at(0, 16, 30))
+    assert ledger.allocate(60) == (at(1, 9), at(1, 10))
+
+
+def test_plan_tasks_places_higher_priority_first():
+    low = {"id": "low", "name": "Low", "priority": "Medium", "due": "2030-01-08", "build_time": 4}
+    high = {"id": "high", "name": "High", "priority": "High", "due": "2030-01-20", "build_time": 4}
+    chunks, unplaced = plan_tasks([low, high], make_ledger(horizon_days=1))
+    assert [(chunk["task"]["id"], chunk["start"], chunk["end"]) for chunk in chunks] == [
+        ("high", at(0, 9), at(0, 12)),
+        ("high", at(0, 13), at(0, 14)),
+        ("low", at(0, 14), at(0, 16, 30)),
+    ]
+    assert unplaced == {"low": 1.5}
+
+
+def test_task_key_prefers_page_id_then_url():
+    url = "https://www.notion.so/Build-thing-0123456789abcdef0123456789abcdef"
+    assert task_key({"id": "page", "name": "Task", "url": url}) == "page"
+    assert task_key({"name": "Task", "url": url}) == "01234567-89ab-cdef-0123-456789abcdef"
+    assert task_key({"name": "Task", "url": ""}) == "Task"
@@ -0,0 +1,98 @@
+import datetime
+import random
+
+import pytest
+
+from conftest import at
+from planner import LUNCH_END, LUNCH_START, WORK_END, WORK_START
+from query_calendar import AvailabilityIndex
+
+DAYS = 7
+CALENDARS = ["ann", "bob", "cat"]
+
+
+def random_events(rng, count):
+    """(start, end) intervals on whole minutes, some overlapping each other and midnight."""
+    events = []
+    for _ in range(count):
+        start = rng.randrange(DAYS * 24 * 60)
+        events.append((at(0, 0) + datetime.timedelta(minutes=start),
+                       at(0, 0) + datetime.timedelta(minutes=start + rng.randrange(5, 240))))
+    return events
+
+
+def minute_time(offset):
+    return at(0, 0) + datetime.timedelta(minutes=offset)
+
+
+def brute_working(offset):
+    moment = minute_time(offset)
+    clock = moment.time()
+    return (moment.weekday() < 5 and WORK_START <= clock < WORK_END
+            and not LUNCH_START <= clock < LUNCH_END)
+
+
+def brute_busy_count(calendars, events, offset):
+    moment = minute_time(offset)
+    return sum(1 for calendar_id in calendars for start, end in events[calendar_id] if start <= moment < end)
+
+
+def brute_runs(flags):
+    runs, start = [], None
+    for offset, flag in enumerate(flags + [False]):
+        if flag and start is None:
+            start = offset
+        elif not flag and start is not None:
+            runs.append((minute_time(start), minute_time(offset)))
+            start = None
+    return runs
+
+
+@pytest.fixture(params=[1, 2, 3])
+def calendars(request):
+    rng = random.Random(request.param)
+    events = {calendar_id: random_events(rng, 25) for calendar_id in CALENDARS}
+    index = AvailabilityIndex(at(0, 0), DAYS)
+    for calendar_id, intervals in events.items():
+        index.add_calendar(calendar_id, intervals)
+    return index, events
+
+
+def test_free_windows_match_brute_force(calendars):
+    index, events = calendars
+    chosen = ["ann", "bob"]
+    flags = [brute_working(offset) and not brute_busy_count(chosen, events, offset)
+             for offset in range(DAYS * 24 * 60)]
+    assert index.free_windows(chosen) == brute_runs(flags)
+    assert index.free_windows(chosen, min_minutes=45) == [
+        (start, end) for start, end in brute_runs(flags) if end - start >= datetime.timedelta(minutes=45)]
+
+
+def test_overlaps_match_brute_force(calendars):
+    index, events = calendars
+    flags = [brute_busy_count(CALENDARS, events, offset) >= 2 for offset in range(DAYS * 24 * 60)]
+    assert index.overlaps(CALENDARS) == brute_runs(flags)
+
+
+@pytest.mark.parametrize("minutes, align", [(30, 1), (60, 15), (120, 30)])
+def test_earliest_fit_matches_brute_force(calendars, minutes, align):
+    index, events = calendars
+    free = [brute_working(offset) and not brute_busy_count(CALENDARS, events, offset)
+            for offset in range(DAYS * 24 * 60)]
+    expected = next(((minute_time(start), minute_time(start + minutes))
+                     for start in range(0, len(free) - minutes + 1, align)
+                     if all(free[start:start + minutes])), None)
+    assert index.earliest_fit(CALENDARS, minutes, align=align) == expected
+
+
+def test_is_free_and_bounds():
+    index = AvailabilityIndex(at(0, 0), DAYS)
+    index.add_calendar("ann", [(at(0, 10), at(0, 11))])
+    assert index.is_free(["ann"], at(0, 9), at(0, 10))
+    assert not index.is_free(["ann"], at(0, 10, 30), at(0, 11, 30))
+    assert index.free_windows(["ann"], not_before=at(0, 9, 30), until=at(0, 14)) == [
+        (at(0, 9, 30), at(0, 10)), (at(0, 11), at(0, 12)), (at(0, 13), at(0, 14))]
+    with pytest.raises(KeyError):
+        index.free_windows(["bob"])
+    with pytest.raises(ValueError):
+        index.is_free(["ann"], at(DAYS, 9), at(DAYS, 10))
@@ -0,0 +1,113 @@
+import httplib2
+import pytest
+import requests
+from googleapiclient.errors import HttpError
+
+from common import rate_limit
+from common.rate_limit import RateLimiter, classify_error
+
+
+def google_error(status, reason=""):
+    return HttpError(httplib2.Response({"status": status, "retry-after": "7"} if status == 429
+                                       else {"status": status}),
+                     f'{{"error": {{"errors": [{{"reason": "{reason}"}}]}}}}'.encode())
+
+
+def requests_error(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return requests.HTTPError(response=response)
+
+
+def test_bucket_allows_a_burst_then_waits_for_refill():
+    limiter = RateLimiter("test", rate=10.0, burst=2, max_concurrency=8)
+    assert limiter._try_acquire(1) == 0
+    assert limiter._try_acquire(1) == 0
+    assert limiter._try_acquire(1) == pytest.approx(0.1, abs=0.02)
+
+
+def test_costs_above_the_bucket_wait_for_a_full_bucket_and_leave_debt():
+    limiter = RateLimiter("test", rate=10.0, burst=10, max_concurrency=8)
+    assert limiter._try_acquire(50) == 0
+    assert limiter.tokens == pytest.approx(-40, abs=0.5)
+    # The debt is paid off before the next call: 41 tokens at 10/s
+    assert limiter._try_acquire(1) == pytest.approx(4.1, abs=0.1)
+
+
+def test_concurrency_limit_blocks_until_a_release():
+    limiter = RateLimiter("test", rate=1000.0, burst=1000, max_concurrency=2)
+    assert limiter._try_acquire(1) == 0
+    assert limiter._try_acquire(1) == 0
+    assert limiter._try_acquire(1) > 0
+    limiter.release()
+    assert limiter._try_acquire(1) == 0
+
+
+def test_throttling_halves_concurrency_and_successes_grow_it_back():
+    limiter = RateLimiter("test", rate=1000.0, burst=1000, max_concurrency=8)
+    limiter.acquire()
+    limiter.release(throttled=True, retry_after=30)
+    assert limiter.concurrency == 4
+    assert limiter.tokens == 0
+    # Retry-After pauses the whole service
+    assert limiter._try_acquire(1) == pytest.approx(30, abs=0.5)
+
+    limiter.paused_until = 0.0
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.concurrency == 5
+
+
+@pytest.mark.parametrize("error, expected", [
+    (google_error(429), (True, True, 7.0)),
+    (google_error(403, "rateLimitExceeded"), (True, True, None)),
+    (google_error(403, "forbidden"), (False, False, None)),
+    (google_error(503), (True, False, None)),
+    (google_error(404), (False, False, None)),
+    (requests_error(429, {"Retry-After": "2"}), (True, True, 2.0)),
+    (requests_error(429, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}), (True, True, None)),
+    (requests_error(400), (False, False, None)),
+    (requests.ConnectionError("reset"), (True, False, None)),
+    (ValueError("bad input"), (False, False, None)),
+])
+def test_classify_error(error, expected):
+    assert classify_error(error) == expected
+
+
+def test_backoff_never_undercuts_retry_after():
+    for attempt in range(6):
+        delay = rate_limit.backoff_delay(attempt)
+        assert 0 <= delay <= min(rate_limit.BACKOFF_MAX_SECONDS, rate_limit.BACKOFF_BASE_SECONDS * 2 ** attempt)
+    assert rate_limit.backoff_delay(0, retry_after=5) >= 5
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_limiters", {})
+    monkeypatch.setattr(rate_limit, "backoff_delay", lambda attempt, retry_after=None: 0)
+
+
+def test_call_retries_transient_errors(no_sleep):
+    failures = [google_error(503), requests.ConnectionError("reset")]
+
+    def flaky():
+        if failures:
+            raise failures.pop(0)
+        return "ok"
+
+    assert rate_limit.call("test", flaky) == "ok"
+    assert rate_limit.get_limiter("test").in_flight == 0
+
+
+def test_call_raises_permanent_errors_at_once(no_sleep):
+    calls = []
+
+    def forbidden():
+        calls.append(1)
+        raise google_error(403, "forbidden")
+
+    with pytest.raises(HttpError):
+        rate_limit.call("test", forbidden)
+    assert len(calls) == 1
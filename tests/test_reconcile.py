@@ -0,0 +1,107 @@
+from conftest import NOW, at, calendar_event, load_snapshot
+from planner import CapacityLedger, plan_tasks
+from reconcile import Reconciliation, event_task_key
+
+PAGE = "11111111-1111-1111-1111-111111111111"
+OTHER_PAGE = "22222222-2222-2222-2222-222222222222"
+
+
+def task(build_time, name="Write report", status="In progress", page_id=PAGE):
+    return {"id": page_id, "name": name, "status": status, "priority": "High", "due": "2030-01-31",
+            "build_time": build_time, "url": ""}
+
+
+def reconcile(tasks, events, now=NOW, active_tasks=None):
+    """Runs one reconciliation the way CalendarScheduler does; returns (ops, reconciliation, ledger)."""
+    snapshot = load_snapshot(events)
+    active_keys = {t["id"] for t in active_tasks} if active_tasks is not None else None
+    reconciliation = Reconciliation(tasks, snapshot, now=now, active_keys=active_keys)
+    ledger = CapacityLedger.from_snapshot(snapshot, now=now, exclude=reconciliation.movable_ids(),
+                                          booked=reconciliation.booked_ids())
+    reconciliation.hold(ledger)
+    left = [rest for rest in (reconciliation.settle(t, ledger) for t in tasks) if rest is not None]
+    chunks, _ = plan_tasks(left, ledger)
+    ops = reconciliation.ops_for(tasks, chunks) + reconciliation.orphan_ops()
+    return ops, reconciliation, ledger
+
+
+def summary(ops):
+    return [(op["op"], op["event"] and op["event"]["id"], op["start"], op["end"]) for op in ops]
+
+
+def test_event_task_key_reads_tag_then_description():
+    tagged = calendar_event("Write report", at(0, 9), at(0, 10), page_id=PAGE)
+    legacy = {"summary": "Write report",
+              "description": "Task URL: https://www.notion.so/Write-report-11111111111111111111111111111111"}
+    assert event_task_key(tagged) == PAGE
+    assert event_task_key(legacy) == PAGE
+    assert event_task_key({"summary": "Lunch with Ann"}) is None
+
+
+def test_valid_block_is_kept():
+    block = calendar_event("Write report", at(0, 9), at(0, 11), page_id=PAGE, event_id="b1")
+    ops, reconciliation, _ = reconcile([task(2)], [block])
+    assert ops == []
+    assert reconciliation.counts["kept"] == 1
+    assert [(c["start"], c["end"]) for c in reconciliation.kept_chunks()] == [(at(0, 9), at(0, 11))]
+
+
+def test_shrunk_estimate_shortens_the_block():
+    block = calendar_event("Write report", at(0, 9), at(0, 11), page_id=PAGE, event_id="b1")
+    ops, _, ledger = reconcile([task(1)], [block])
+    assert summary(ops) == [("patch", "b1", at(0, 9), at(0, 10))]
+    # The released hour is free again
+    assert ledger.fits(at(0, 10), at(0, 11))
+
+
+def test_renamed_task_patches_the_summary():
+    block = calendar_event("Old name", at(0, 9), at(0, 11), page_id=PAGE, event_id="b1")
+    ops, _, _ = reconcile([task(2, name="New name")], [block])
+    assert summary(ops) == [("patch", "b1", at(0, 9), at(0, 11))]
+    assert ops[0]["task"]["name"] == "New name"
+
+
+def test_grown_estimate_inserts_only_the_difference():
+    block = calendar_event("Write report", at(0, 9), at(0, 11), page_id=PAGE, event_id="b1")
+    ops, _, _ = reconcile([task(3)], [block])
+    assert summary(ops) == [("insert", None, at(0, 11), at(0, 12))]
+
+
+def test_overlapped_block_is_moved():
+    block = calendar_event("Write report", at(0, 9), at(0, 10), page_id=PAGE, event_id="b1")
+    meeting = calendar_event("Meeting", at(0, 9), at(0, 10))
+    ops, _, _ = reconcile([task(1)], [block, meeting])
+    assert summary(ops) == [("patch", "b1", at(0, 10), at(0, 11))]
+
+
+def test_done_task_blocks_are_deleted():
+    block = calendar_event("Write report", at(0, 9), at(0, 11), page_id=PAGE, event_id="b1")
+    ops, _, _ = reconcile([task(2, status="Done")], [block])
+    assert summary(ops) == [("delete", "b1", None, None)]
+
+
+def test_blocks_of_inactive_tasks_are_deleted():
+    block = calendar_event("Gone", at(1, 9), at(1, 10), page_id=OTHER_PAGE, event_id="b2")
+    ops, _, _ = reconcile([], [block], active_tasks=[task(2)])
+    assert summary(ops) == [("delete", "b2", None, None)]
+
+
+def test_blocks_of_other_active_tasks_are_left_alone_and_charged():
+    other = [calendar_event("Other", at(0, 9), at(0, 12), page_id=OTHER_PAGE, event_id="o1"),
+             calendar_event("Other", at(0, 13), at(0, 16, 30), page_id=OTHER_PAGE, event_id="o2")]
+    active = [task(1), task(6.5, name="Other", page_id=OTHER_PAGE)]
+    ops, reconciliation, _ = reconcile([task(1)], other, active_tasks=active)
+    assert reconciliation.booked_ids() == {"o1", "o2"}
+    # Monday is already at DAILY_MAX_HOURS, so the new block goes on Tuesday
+    assert summary(ops) == [("insert", None, at(1, 9), at(1, 10))]
+
+
+def test_block_under_way_counts_towards_the_estimate():
+    now = at(0, 10)
+    block = calendar_event("Write report", at(0, 9), at(0, 11), page_id=PAGE, event_id="b1")
+    ops, reconciliation, _ = reconcile([task(2)], [block], now=now)
+    # One hour left of the running block; the other hour of the estimate is planned after it
+    assert summary(ops) == [("insert", None, at(0, 11), at(0, 12))]
+    assert reconciliation.movable_ids() == set()
+    assert (now, at(0, 11)) in [(c["start"], c["end"]) for c in reconciliation.kept_chunks()]
+    assert reconciliation.in_progress == {PAGE: 60}
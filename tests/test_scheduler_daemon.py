@@ -0,0 +1,159 @@
+import pytest
+
+import schedule_tasks
+import scheduler_daemon
+from bench.fakes import FakeCalendarService
+from calendar_snapshot import CalendarSnapshot
+from common import clients
+from conftest import MONDAY, at, calendar_event
+from scheduler_config import CALENDAR_ID
+
+PAGE = "11111111-1111-1111-1111-111111111111"
+
+
+def task(page_id=PAGE, name="Write report", build_time=1, assigned_to=""):
+    return {"id": page_id, "name": name, "status": "In progress", "priority": "High", "due": "2030-01-31",
+            "build_time": build_time, "dependencies": "", "url": "", "assigned_to": assigned_to}
+
+
+@pytest.fixture
+def calendar(monkeypatch):
+    """The scheduler's calendar, holding one block of PAGE, written to for real (no dry run)."""
+    service = FakeCalendarService([calendar_event("Write report", at(1, 9), at(1, 10), page_id=PAGE,
+                                                  event_id="blk1")])
+    clients.set_calendar_service(service)
+    monkeypatch.setattr(schedule_tasks, "DRY_RUN", False)
+    monkeypatch.setattr(schedule_tasks, "USE_AI_MODE", False)
+    monkeypatch.setattr(schedule_tasks, "USE_TASK_EVENT_STORE", False)
+    return service
+
+
+def make_daemon(service, assignee_calendars=None):
+    """A daemon with its snapshots loaded, without the webhook server or the loop."""
+    daemon = scheduler_daemon.SchedulerDaemon("127.0.0.1", 0)
+    daemon.assignee_calendars = assignee_calendars or {}
+    daemon.calendar_ids = list(schedule_tasks.group_tasks_by_calendar([], daemon.assignee_calendars))
+    daemon.snapshots = {calendar_id: CalendarSnapshot(service, calendar_id, start_date=MONDAY).load()
+                        for calendar_id in daemon.calendar_ids}
+    return daemon
+
+
+def fetch_returning(tasks):
+    return lambda: [dict(t) for t in tasks]
+
+
+def fetch_failing():
+    raise ConnectionError("Notion is down")
+
+
+def test_failed_first_poll_leaves_the_calendar_alone(monkeypatch, calendar):
+    monkeypatch.setattr(scheduler_daemon, "fetch_active_tasks", fetch_failing)
+    daemon = make_daemon(calendar)
+    assert daemon.poll_notion() is False
+    daemon.replan()
+    assert "blk1" in calendar.events_by_id
+    assert calendar.counter.calls["calendar.events.delete"] == 0
+
+    # The first successful poll runs the full pass with the real task list
+    monkeypatch.setattr(scheduler_daemon, "fetch_active_tasks", fetch_returning([task()]))
+    assert daemon.poll_notion() is True
+    daemon.replan()
+    assert "blk1" in calendar.events_by_id
+    assert calendar.counter.calls["calendar.events.delete"] == 0
+
+
+def test_failed_later_poll_keeps_the_known_tasks(monkeypatch, calendar):
+    monkeypatch.setattr(scheduler_daemon, "fetch_active_tasks", fetch_returning([task()]))
+    daemon = make_daemon(calendar)
+    daemon.poll_notion()
+    daemon.replan()
+    monkeypatch.setattr(scheduler_daemon, "fetch_active_tasks", fetch_failing)
+    assert daemon.poll_notion() is False
+    assert list(daemon.tasks) == [PAGE]
+    assert daemon._removed == {}
+
+
+OTHER = "22222222-2222-2222-2222-222222222222"
+
+
+@pytest.fixture
+def planned(monkeypatch):
+    """Records each reconciliation instead of running it: (calendar, candidate ids, active ids)."""
+    calls = []
+
+    def record(tasks, snapshot, active_tasks):
+        calls.append((snapshot.calendar_id, sorted(t["id"] for t in tasks), sorted(t["id"] for t in active_tasks)))
+
+    monkeypatch.setattr(scheduler_daemon, "schedule_tasks", record)
+    monkeypatch.setattr(scheduler_daemon, "analyze_active_tasks", lambda tasks, snapshot, cache: tasks)
+    return calls
+
+
+def poll(monkeypatch, daemon, tasks):
+    monkeypatch.setattr(scheduler_daemon, "fetch_active_tasks", fetch_returning(tasks))
+    assert daemon.poll_notion() is True
+
+
+def test_first_pass_reconciles_every_calendar(monkeypatch, calendar, planned):
+    daemon = make_daemon(calendar, {"Ana": "ana-calendar"})
+    poll(monkeypatch, daemon, [task(), task(OTHER, "Review PR", assigned_to="Ana")])
+    daemon.replan()
+    assert planned == [(CALENDAR_ID, [PAGE], [PAGE]), ("ana-calendar", [OTHER], [OTHER])]
+
+    # Nothing pending: nothing to reconcile
+    planned.clear()
+    daemon.replan()
+    assert planned == []
+
+
+def test_only_changed_tasks_are_candidates(monkeypatch, calendar, planned):
+    daemon = make_daemon(calendar)
+    poll(monkeypatch, daemon, [task(), task(OTHER, "Review PR")])
+    daemon.replan()
+    planned.clear()
+
+    poll(monkeypatch, daemon, [task(build_time=2), task(OTHER, "Review PR")])
+    daemon.replan()
+    assert planned == [(CALENDAR_ID, [PAGE], sorted([PAGE, OTHER]))]
+
+
+def test_removed_task_triggers_a_reconcile_without_candidates(monkeypatch, calendar, planned):
+    daemon = make_daemon(calendar)
+    poll(monkeypatch, daemon, [task(), task(OTHER, "Review PR")])
+    daemon.replan()
+    planned.clear()
+
+    poll(monkeypatch, daemon, [task(OTHER, "Review PR")])
+    daemon.replan()
+    assert planned == [(CALENDAR_ID, [], [OTHER])]
+
+
+def test_reassigned_task_reconciles_the_old_and_the_new_calendar(monkeypatch, calendar, planned):
+    daemon = make_daemon(calendar, {"Ana": "ana-calendar"})
+    poll(monkeypatch, daemon, [task()])
+    daemon.replan()
+    planned.clear()
+
+    poll(monkeypatch, daemon, [task(assigned_to="Ana")])
+    daemon.replan()
+    assert planned == [(CALENDAR_ID, [], []), ("ana-calendar", [PAGE], [PAGE])]
+
+
+def test_calendar_change_picks_up_displaced_tasks(monkeypatch, calendar, planned):
+    calendar.put_event(calendar_event("Review PR", at(3, 9), at(3, 10), page_id=OTHER, event_id="blk2"))
+    daemon = make_daemon(calendar)
+    poll(monkeypatch, daemon, [task(), task(OTHER, "Review PR")])
+    daemon.replan()
+    planned.clear()
+
+    # A meeting lands on PAGE's block; OTHER's block on another day is untouched
+    calendar.put_event(calendar_event("Meeting", at(1, 9), at(1, 10), event_id="mtg"))
+    daemon.notify_calendar_change(CALENDAR_ID)
+    daemon.replan()
+    assert planned == [(CALENDAR_ID, [PAGE], sorted([PAGE, OTHER]))]
+
+    # A change notification with no actual change replans nothing
+    planned.clear()
+    daemon.notify_calendar_change(CALENDAR_ID)
+    daemon.replan()
+    assert planned == []
@@ -0,0 +1,81 @@
+import pytest
+
+from chatgpt import ai_analyzer
+from chatgpt.analysis_cache import AnalysisCache
+from chatgpt.task_rules import classify_task, default_build_time
+
+
+@pytest.mark.parametrize("task, task_type, confidence", [
+    ({"name": "Investigate flaky tests", "tags": "Research"}, "research", 0.95),
+    ({"name": "Create onboarding flow"}, "design", 0.85),
+    ({"name": "Quarterly numbers", "tags": "misc, Bug"}, "focus", 0.8),
+    ({"name": "Investigate login", "tags": "feature"}, "research", 0.5),
+    ({"name": "Quarterly numbers"}, "focus", 0.4),
+])
+def test_classification_and_its_confidence(task, task_type, confidence):
+    rule = classify_task(task)
+    assert (rule["task_type"], rule["confidence"]) == (task_type, confidence)
+
+
+@pytest.mark.parametrize("build_time, complexity, expected", [
+    (0, "", 4),
+    (0.16667, "Low", 3),
+    (None, "high", 6),
+    (10, "low", 10),
+])
+def test_placeholder_build_times_are_estimated_from_complexity(build_time, complexity, expected):
+    task = {"name": "Design the schema", "build_time": build_time, "complexity": complexity}
+    assert classify_task(task)["build_time"] == expected
+
+
+def test_default_build_time_falls_back_to_focus():
+    assert default_build_time("research") == 3
+    assert default_build_time(None) == 1
+
+
+CONFIDENT = {"name": "Investigate flaky tests", "tags": "research", "build_time": 0, "status": "Backlog"}
+UNSURE = {"name": "Quarterly numbers", "build_time": 0, "status": "Backlog"}
+UNSURE_TOO = {"name": "Vendor call", "build_time": 0, "status": "Backlog"}
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """Stands in for the model: answers UNSURE only and records what it was sent."""
+    sent = []
+
+    async def request_analysis_stream(tasks, calendar_events):
+        sent.extend(task["name"] for task in tasks)
+        answer = {"name": UNSURE["name"], "task_type": "design", "build_time": 5, "suggested_solution": "x"}
+        yield range(len(tasks)), [answer] if UNSURE in tasks else []
+
+    monkeypatch.setattr(ai_analyzer, "request_analysis_stream", request_analysis_stream)
+    return sent
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnalysisCache(str(tmp_path / "cache.json"))
+
+
+def test_only_low_confidence_tasks_reach_the_model(model, cache):
+    analyzed = ai_analyzer.analyze_tasks([CONFIDENT, UNSURE, UNSURE_TOO], [], cache)
+    assert model == ["Quarterly numbers", "Vendor call"]
+    assert [(task["task_type"], task["build_time"]) for task in analyzed] == [
+        ("research", 3),   # rules, offline
+        ("design", 5),     # the model's answer
+        ("focus", 1),      # left out by the model: back to the rules
+    ]
+
+
+def test_model_answers_are_cached_for_the_next_run(model, cache):
+    ai_analyzer.analyze_tasks([UNSURE], [], cache)
+    model.clear()
+    (analyzed,) = ai_analyzer.analyze_tasks([UNSURE], [], cache)
+    assert model == []
+    assert analyzed["task_type"] == "design"
+
+
+def test_suggest_solutions_sends_confident_tasks_too(monkeypatch, model, cache):
+    monkeypatch.setattr(ai_analyzer, "SUGGEST_SOLUTIONS", True)
+    ai_analyzer.analyze_tasks([CONFIDENT, UNSURE], [], cache)
+    assert model == ["Investigate flaky tests", "Quarterly numbers"]